@@ -5,6 +5,7 @@ import os
 import tempfile
 from sqlalchemy.orm import Session
 from backend.database.models import Participant, Response
+from backend.services.blob_store import blob_store
 from typing import List, Dict, Any, Optional
 import json
 import datetime
@@ -14,9 +15,7 @@ from collections import Counter
 
 AGENT_FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR = os.path.dirname(AGENT_FILE_DIR)
-PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
 BASE_PROJECT_DATA_PATH = os.path.join(BACKEND_DIR, "data", "projects")
-CHAT_RESPONSES_DIR = os.path.join(PROJECT_ROOT, "frontend", "static", "chat_responses")
 
 # Basic English stop words
 STOP_WORDS = set([
@@ -36,10 +35,10 @@ STOP_WORDS = set([
 
 class ResponseCollectorTool(BaseTool):
     name: str = "ResponseCollector"
-    description: str = "Collects responses from participants and saves them as markdown files"
+    description: str = "Collects responses from participants and saves them as markdown transcripts"
     
     def _run(self, chat_content: str, participant_name: str, project_id: int) -> str:
-        """Process and store the collected chat response as a markdown file
+        """Process and store the collected chat response as a markdown transcript
         
         Args:
             chat_content: The full chat conversation content
@@ -47,19 +46,9 @@ class ResponseCollectorTool(BaseTool):
             project_id: ID of the project
             
         Returns:
-            Path to the saved markdown file
+            Blob reference ("blob:<sha256>") of the saved transcript
         """
         try:
-            # Ensure the chat responses directory exists
-            os.makedirs(CHAT_RESPONSES_DIR, exist_ok=True)
-            
-            # Create a unique filename
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_participant_name = "".join(c for c in participant_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            safe_participant_name = safe_participant_name.replace(' ', '_')
-            filename = f"project_{project_id}_{safe_participant_name}_{timestamp}.md"
-            file_path = os.path.join(CHAT_RESPONSES_DIR, filename)
-            
             # Create markdown content
             markdown_content = f"""# Chat Response - {participant_name}
 
@@ -78,13 +67,8 @@ class ResponseCollectorTool(BaseTool):
 *Generated automatically by RetroMeet Response Collector*
 """
             
-            # Write to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            # Return relative path from static directory
-            relative_path = f"chat_responses/{filename}"
-            return relative_path
+            # Store compressed and content-addressed; identical transcripts are stored once
+            return blob_store.put_text(markdown_content)
             
         except Exception as e:
             print(f"[ResponseCollectorTool] ERROR saving chat response: {e}")
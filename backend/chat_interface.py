@@ -1,6 +1,7 @@
 import gradio as gr
 import requests
 import os
+import uuid
 import openai
 from typing import List, Dict, Any
 from dotenv import load_dotenv
@@ -36,6 +37,7 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
         participant_name_to_id_map = {p["name"]: p["id"] for p in project_participants_details}
 
     participant_all_responses = {} # Accumulate responses here
+    participant_session_ids = {} # Chat session id per participant; turns are stored server-side under it
 
     # Get participants from the provided list or API
     def get_participants(attempt_api_call_if_no_details: bool = False):
@@ -89,6 +91,25 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
             print(f"Exception in submit_response: {e}")
             return f"Error: {str(e)}"
     
+    # Append a single chat turn to the API so nothing is lost if the browser closes mid-chat
+    def append_chat_turn(participant_name: str, question: str, role: str, content: str):
+        session_id = participant_session_ids.get(participant_name)
+        if not session_id:
+            session_id = participant_session_ids[participant_name] = uuid.uuid4().hex
+        try:
+            turn_response = requests.post(f"{api_url}/responses/chat/turns", json={
+                "session_id": session_id,
+                "participant_name": participant_name,
+                "project_id": current_project_id,
+                "question": question,
+                "role": role,
+                "content": content
+            })
+            if turn_response.status_code != 200:
+                print(f"Warning: Failed to store chat turn: {turn_response.text}")
+        except Exception as e:
+            print(f"Exception in append_chat_turn: {e}")
+    
     # Function to get AI response using OpenAI API
     def get_ai_response(participant_name, question, user_message):
         try:
@@ -153,9 +174,10 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
                 if collected_responses:
                     print(f"All questions answered for {participant_name}. Collected {len(collected_responses)} responses.")
                     
-                    # Format the chat content from the history
-                    chat_content = ""
+                    # The conversation was stored turn by turn and the API renders it from the session;
+                    # the locally formatted content is sent too in case some turns could not be stored
                     try:
+                        chat_content = ""
                         for entry in collected_responses:
                             chat_content += f"**Question:** {entry['question']}\n\n"
                             chat_content += f"**User Response:** {entry['answer']}\n\n"
@@ -169,18 +191,15 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
                             role = "User" if msg.get("role") == "user" else "Assistant"
                             chat_content += f"**{role}:** {msg.get('content', '')}\n\n"
                         
-                        print(f"Formatted chat content length: {len(chat_content)}")
-                        
-                        # Call the API to save the chat response
-                        api_url = "http://localhost:8000/responses/chat"
                         payload = {
                             "participant_name": participant_name,
                             "project_id": current_project_id,  # Use the dynamic project ID for this session
+                            "session_id": participant_session_ids.get(participant_name),
                             "chat_content": chat_content,
                             "question": "Retrospective Chat Session"
                         }
                         
-                        response = requests.post(api_url, json=payload)
+                        response = requests.post(f"{api_url}/responses/chat", json=payload)
                         if response.status_code == 200:
                             print(f"Successfully saved chat response for {participant_name}")
                         else:
@@ -219,8 +238,10 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
                     "answer": message
                 })
 
+        append_chat_turn(participant_name, current_question_on_entry, "user", message)
         response_result = submit_response(participant_name, current_question_on_entry, message)
         ai_response = get_ai_response(participant_name, current_question_on_entry, message)
+        append_chat_turn(participant_name, current_question_on_entry, "assistant", ai_response)
         bot_msg = f"{ai_response}\n\nType 'next' when you're ready for the next question."
         return bot_msg, current_question_on_entry
     
@@ -268,6 +289,8 @@ def create_chat_interface(api_url: str = "http://localhost:8000", project_id: in
                 # Clear any old responses for this participant when they are selected
                 if participant_name_selected in participant_all_responses:
                     del participant_all_responses[participant_name_selected]
+                # Each selection starts a new chat session
+                participant_session_ids[participant_name_selected] = uuid.uuid4().hex
                 return initial_history, first_question_text, "" # history, current_question_state, msg_textbox_value
             return [], RETRO_QUESTIONS[0], "" # Clear history, reset question state, clear msg
 
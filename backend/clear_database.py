@@ -20,7 +20,8 @@ else:
         "responses",
         "project_participants",
         "participants",
-        "projects"
+        "projects",
+        "table_versions"  # read endpoints must not answer 304 for cleared data
     ]
 
     try:
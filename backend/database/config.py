@@ -0,0 +1,133 @@
+"""
+Engine configuration per database backend.
+
+SQLite is tuned for concurrent use by the API, the Gradio chat and background
+refinement: WAL journaling so readers never block the writer, a busy timeout so
+writers queue instead of failing with "database is locked", and larger page
+cache / mmap windows. Server databases (PostgreSQL, MySQL) get a pre-pinged,
+recycled connection pool. Every knob can be overridden through environment
+variables.
+"""
+
+import os
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Async drivers substituted for the sync ones when building the async engine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"WARN: Invalid integer for {name}={value!r}, using default {default}")
+        return default
+
+
+# SQLite pragmas applied on every new DBAPI connection
+SQLITE_JOURNAL_MODE = os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = _env_int("DB_SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_MMAP_SIZE = _env_int("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)  # 256 MiB
+SQLITE_CACHE_SIZE = _env_int("DB_SQLITE_CACHE_SIZE", -64000)  # negative = KiB, i.e. ~64 MiB
+
+# Pool sizing; DB_POOL_SIZE / DB_MAX_OVERFLOW defaults depend on the backend (see engine_options)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def to_async_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """Keyword arguments for `create_engine` / `create_async_engine` suited to the given URL."""
+    if is_sqlite(url):
+        if _is_sqlite_memory(url):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool.
+            return {"connect_args": {"check_same_thread": False}}
+        # SQLite serialises writers anyway, so a modest pool is enough. Every
+        # connection holds its own page cache, which is what makes reads fast.
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                # Python's sqlite3 timeout (seconds); mirrors busy_timeout for the BEGIN it issues
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            },
+            "pool_size": _env_int("DB_POOL_SIZE", 8),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 16),
+            "pool_timeout": POOL_TIMEOUT,
+        }
+        if is_async:
+            # Pin the pool class so the sizing above applies to aiosqlite as well
+            options["poolclass"] = AsyncAdaptedQueuePool
+        return options
+
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 10),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """The pragma name/value pairs applied to each SQLite connection, in order."""
+    return {
+        "journal_mode": SQLITE_JOURNAL_MODE,
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": SQLITE_MMAP_SIZE,
+        "cache_size": SQLITE_CACHE_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine) -> None:
+    """Register a connect hook that applies the SQLite production pragmas."""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Apply backend-specific connection setup to a freshly created engine.
+
+    For an AsyncEngine pass its `sync_engine`; the connect hook fires there.
+    """
+    if engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(engine)
+    return engine
@@ -1,21 +1,55 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
+from backend.database.config import engine_options, configure_engine, to_async_url
+
 load_dotenv()
 
 # Use SQLite by default, but allow configuration via environment variables
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./retromeet.db")
+# Async routers use the same database through an asyncio driver (aiosqlite, asyncpg, ...)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
 
-engine = create_engine(DATABASE_URL)
+# WAL, busy timeout, cache and pool sizing are applied per backend (see config.py)
+engine = configure_engine(create_engine(DATABASE_URL, **engine_options(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# The async engine is created on first use so scripts that only need the sync
+# engine do not require an async driver to be installed.
+_async_engine: Optional[AsyncEngine] = None
+_AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True)
+        )
+        configure_engine(_async_engine.sync_engine)
+    return _async_engine
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        # expire_on_commit=False so committed objects can still be serialised without lazy I/O
+        _AsyncSessionLocal = async_sessionmaker(
+            get_async_engine(), class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _AsyncSessionLocal
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
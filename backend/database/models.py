@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, Boolean, String, Text, DateTime, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import datetime
@@ -9,7 +9,7 @@ class Participant(Base):
     __tablename__ = "participants"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), nullable=False, unique=True, index=True)  # Identity key used by chat ingest
     avatar_path = Column(String(255), nullable=True) # Stores path relative to PROJECT_ROOT
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
@@ -23,12 +23,15 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False, unique=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    archived_at = Column(DateTime, nullable=True)  # Set when transcripts/summary were packed into an archive
 
     # Many-to-many relationship with participants
     participant_associations = relationship("ProjectParticipant", back_populates="project")
 
 class ProjectParticipant(Base):
     __tablename__ = "project_participants"
+    # One membership row per (project, participant); ingest relies on it for upserts
+    __table_args__ = (UniqueConstraint("project_id", "participant_id", name="uq_project_participant"),)
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -53,3 +56,123 @@ class Response(Base):
     
     participant = relationship("Participant", back_populates="responses")
     project = relationship("Project")
+
+class ChatTurn(Base):
+    __tablename__ = "chat_turns"
+    # Turns are read back per session in insertion order
+    __table_args__ = (Index("ix_chat_turns_session_id_id", "session_id", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(64), nullable=False)
+    participant_id = Column(Integer, ForeignKey("participants.id"), nullable=False, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    question = Column(String(255), nullable=False)
+    role = Column(String(20), nullable=False)  # "user" or "assistant"
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    participant = relationship("Participant")
+    project = relationship("Project")
+
+class TableVersion(Base):
+    """Per-table change counter, bumped in the same transaction as every write (see table_versions.py)"""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class VideoRender(Base):
+    """A participant's current avatar video for a project (see render_service.py)"""
+    __tablename__ = "video_renders"
+    __table_args__ = (UniqueConstraint("project_id", "participant_id", name="uq_video_render_participant"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    participant_id = Column(Integer, ForeignKey("participants.id"), nullable=False, index=True)
+    render_key = Column(String(64), nullable=False, index=True)  # content hash of all render inputs
+    avatar_sha256 = Column(String(64), nullable=False)
+    renderer = Column(String(32), nullable=False)
+    status = Column(String(20), nullable=False)  # pending, ready, failed, cancelled or stale
+    video_path = Column(String(255), nullable=True)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class MeetingReel(Base):
+    """A project's meeting reel: title cards and participant videos joined into one file (see reel_service.py)"""
+    __tablename__ = "meeting_reels"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, unique=True)
+    reel_key = Column(String(64), nullable=False)  # hash of the segment keys, in order
+    segment_keys = Column(Text, nullable=False)  # JSON list of the card and render keys
+    status = Column(String(20), nullable=False)  # pending, ready or failed
+    video_path = Column(String(255), nullable=True)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class PipelineStage(Base):
+    """Last run of one stage of the processing pipeline (see pipeline_service.py)"""
+    __tablename__ = "pipeline_stages"
+    __table_args__ = (Index("ix_pipeline_stages_run", "project_id", "participant_id", "stage"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    participant_id = Column(Integer, nullable=True)  # None for project-wide stages (the reel)
+    stage = Column(String(32), nullable=False)
+    input_hash = Column(String(64), nullable=True)  # inputs of the last successful or attempted run
+    status = Column(String(20), nullable=False)  # pending, running, done, skipped, failed or blocked
+    output = Column(Text, nullable=True)  # JSON
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    options = Column(Text, nullable=True)  # JSON voice, engine and renderer of the run
+    owner_id = Column(String(64), nullable=True)  # API process running it while its lease holds
+    lease_expires_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# Jobs counted as in flight; at most one per (job_type, job_key), enforced by uq_jobs_active_key
+ACTIVE_JOB_CONDITION = "status IN ('queued', 'running')"
+
+class Job(Base):
+    """Heavy work queued for `python -m backend.worker` (see job_queue.py)"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_claim", "status", "job_type", "id"),
+        Index("ix_jobs_key", "job_type", "job_key"),
+        Index(
+            "uq_jobs_active_key", "job_type", "job_key", unique=True,
+            sqlite_where=text(ACTIVE_JOB_CONDITION), postgresql_where=text(ACTIVE_JOB_CONDITION),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(16), nullable=False)  # llm, tts or render
+    job_key = Column(String(128), nullable=False)  # identical work in flight shares one job
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), nullable=False)  # queued, running, done, failed or cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    progress = Column(Float, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    worker_id = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class ChatLink(Base):
+    """Requested and actual state of the hosted Gradio chat, shared by all API processes (see chat_link_service.py)"""
+    __tablename__ = "chat_links"
+
+    id = Column(Integer, primary_key=True, index=True)
+    slot = Column(String(64), nullable=False, unique=True)  # one per Gradio port
+    project_id = Column(Integer, nullable=True)
+    participants = Column(Text, nullable=True)  # JSON list of {id, name, avatar_path}
+    desired = Column(String(20), nullable=False, default="stopped")  # running or stopped
+    generation = Column(Integer, nullable=False, default=0)  # bumped by every start or stop request
+    status = Column(String(20), nullable=False, default="stopped")  # requested, starting, running, error or stopped
+    url = Column(String(255), nullable=True)
+    error = Column(Text, nullable=True)
+    owner_id = Column(String(64), nullable=True)  # the process hosting the chat
+    lease_expires_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
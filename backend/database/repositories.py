@@ -0,0 +1,205 @@
+"""
+Async data access for projects, participants and responses.
+
+These functions take an `AsyncSession` (see `get_async_db`) and never rely on
+lazy relationship loading, which is not available under asyncio: everything a
+router needs is selected explicitly.
+
+Every write bumps the version counters of the tables it touches in the same
+transaction, which is what the conditional GETs of the read endpoints rely on.
+"""
+
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database.models import ChatTurn, MeetingReel, Participant, PipelineStage, Project, ProjectParticipant, Response, VideoRender
+from backend.database.table_versions import (
+    PARTICIPANTS, PROJECT_PARTICIPANTS, PROJECTS, RESPONSES, abump_table_versions,
+)
+
+
+# --- Projects ---
+
+async def list_projects_with_counts(db: AsyncSession) -> Sequence[Tuple[Project, int]]:
+    """All projects with their participant counts, in a single query."""
+    stmt = (
+        select(Project, func.count(ProjectParticipant.id))
+        .outerjoin(ProjectParticipant, ProjectParticipant.project_id == Project.id)
+        .group_by(Project.id)
+        .order_by(Project.id)
+    )
+    return (await db.execute(stmt)).all()
+
+async def get_project(db: AsyncSession, project_id: int) -> Optional[Project]:
+    return await db.get(Project, project_id)
+
+async def count_project_participants(db: AsyncSession, project_id: int) -> int:
+    stmt = select(func.count(ProjectParticipant.id)).where(ProjectParticipant.project_id == project_id)
+    return (await db.execute(stmt)).scalar_one()
+
+async def create_project(db: AsyncSession, name: str) -> Project:
+    project = Project(name=name)
+    db.add(project)
+    await abump_table_versions(db, PROJECTS)
+    await db.commit()
+    await db.refresh(project)
+    return project
+
+async def delete_project(db: AsyncSession, project_id: int) -> None:
+    """Delete a project and all its participant associations"""
+    await db.execute(delete(ProjectParticipant).where(ProjectParticipant.project_id == project_id))
+    await db.execute(delete(VideoRender).where(VideoRender.project_id == project_id))
+    await db.execute(delete(MeetingReel).where(MeetingReel.project_id == project_id))
+    await db.execute(delete(PipelineStage).where(PipelineStage.project_id == project_id))
+    await db.execute(delete(ChatTurn).where(ChatTurn.project_id == project_id))
+    await db.execute(delete(Project).where(Project.id == project_id))
+    await abump_table_versions(db, PROJECTS, PROJECT_PARTICIPANTS)
+    await db.commit()
+
+async def list_project_participants(
+    db: AsyncSession, project_id: int
+) -> Sequence[Tuple[Participant, datetime.datetime]]:
+    stmt = (
+        select(Participant, ProjectParticipant.joined_at)
+        .join(ProjectParticipant, Participant.id == ProjectParticipant.participant_id)
+        .where(ProjectParticipant.project_id == project_id)
+    )
+    return (await db.execute(stmt)).all()
+
+async def get_project_participant(
+    db: AsyncSession, project_id: int, participant_id: int
+) -> Optional[ProjectParticipant]:
+    stmt = select(ProjectParticipant).where(
+        ProjectParticipant.project_id == project_id,
+        ProjectParticipant.participant_id == participant_id,
+    )
+    return (await db.execute(stmt)).scalars().first()
+
+async def add_participant_to_project(db: AsyncSession, project_id: int, participant_id: int) -> ProjectParticipant:
+    association = ProjectParticipant(project_id=project_id, participant_id=participant_id)
+    db.add(association)
+    await abump_table_versions(db, PROJECT_PARTICIPANTS)
+    await db.commit()
+    return association
+
+async def remove_participant_from_project(db: AsyncSession, association: ProjectParticipant) -> None:
+    await db.delete(association)
+    await abump_table_versions(db, PROJECT_PARTICIPANTS)
+    await db.commit()
+
+async def get_project_member_ids(db: AsyncSession, project_id: int, participant_ids: List[int]) -> Set[int]:
+    """The subset of `participant_ids` that are members of the project"""
+    stmt = select(ProjectParticipant.participant_id).where(
+        ProjectParticipant.project_id == project_id,
+        ProjectParticipant.participant_id.in_(participant_ids),
+    )
+    return set((await db.execute(stmt)).scalars().all())
+
+async def bulk_add_participants_to_project(db: AsyncSession, project_id: int, participant_ids: List[int]) -> None:
+    """Insert memberships with a single executemany; the caller commits."""
+    if not participant_ids:
+        return
+    joined_at = datetime.datetime.utcnow()
+    await db.execute(
+        insert(ProjectParticipant),
+        [{"project_id": project_id, "participant_id": pid, "joined_at": joined_at} for pid in participant_ids],
+    )
+    await abump_table_versions(db, PROJECT_PARTICIPANTS)
+
+async def bulk_remove_participants_from_project(db: AsyncSession, project_id: int, participant_ids: List[int]) -> None:
+    """Delete memberships in one statement; the caller commits."""
+    if not participant_ids:
+        return
+    await db.execute(delete(ProjectParticipant).where(
+        ProjectParticipant.project_id == project_id,
+        ProjectParticipant.participant_id.in_(participant_ids),
+    ))
+    await abump_table_versions(db, PROJECT_PARTICIPANTS)
+
+
+# --- Participants ---
+
+async def list_participants(db: AsyncSession) -> Sequence[Participant]:
+    return (await db.execute(select(Participant))).scalars().all()
+
+async def get_participant(db: AsyncSession, participant_id: int) -> Optional[Participant]:
+    return await db.get(Participant, participant_id)
+
+async def get_participant_ids_by_name(db: AsyncSession, names: List[str]) -> Dict[str, int]:
+    stmt = select(Participant.name, Participant.id).where(Participant.name.in_(names))
+    return {name: pid for name, pid in (await db.execute(stmt)).all()}
+
+async def get_existing_participant_ids(db: AsyncSession, participant_ids: List[int]) -> Set[int]:
+    stmt = select(Participant.id).where(Participant.id.in_(participant_ids))
+    return set((await db.execute(stmt)).scalars().all())
+
+async def bulk_create_participants(db: AsyncSession, rows: List[Dict[str, Optional[str]]]) -> None:
+    """Insert participants (dicts with name and avatar_path) with a single executemany; the caller commits."""
+    if not rows:
+        return
+    created_at = datetime.datetime.utcnow()
+    await db.execute(insert(Participant), [{**row, "created_at": created_at} for row in rows])
+    await abump_table_versions(db, PARTICIPANTS)
+
+async def create_participant(db: AsyncSession, name: str, avatar_path: Optional[str] = None) -> Participant:
+    participant = Participant(name=name, avatar_path=avatar_path)
+    db.add(participant)
+    await abump_table_versions(db, PARTICIPANTS)
+    await db.commit()
+    await db.refresh(participant)
+    return participant
+
+async def update_participant(
+    db: AsyncSession, participant: Participant, name: str, avatar_path: Optional[str] = None
+) -> Participant:
+    participant.name = name
+    if avatar_path and avatar_path != participant.avatar_path:
+        participant.avatar_path = avatar_path
+        # Their videos were rendered from the previous avatar
+        await db.execute(
+            update(VideoRender)
+            .where(VideoRender.participant_id == participant.id, VideoRender.status != "stale")
+            .values(status="stale", updated_at=datetime.datetime.utcnow())
+        )
+    await abump_table_versions(db, PARTICIPANTS)
+    await db.commit()
+    await db.refresh(participant)
+    return participant
+
+async def delete_participant(db: AsyncSession, participant_id: int) -> None:
+    """Delete a participant, removing them from all projects.
+
+    Their responses are kept with the participant reference cleared, as the
+    ORM relationship did for the sync implementation.
+    """
+    await db.execute(delete(ProjectParticipant).where(ProjectParticipant.participant_id == participant_id))
+    await db.execute(delete(VideoRender).where(VideoRender.participant_id == participant_id))
+    await db.execute(delete(PipelineStage).where(PipelineStage.participant_id == participant_id))
+    await db.execute(delete(ChatTurn).where(ChatTurn.participant_id == participant_id))
+    await db.execute(update(Response).where(Response.participant_id == participant_id).values(participant_id=None))
+    await db.execute(delete(Participant).where(Participant.id == participant_id))
+    await abump_table_versions(db, PARTICIPANTS, PROJECT_PARTICIPANTS, RESPONSES)
+    await db.commit()
+
+
+# --- Responses ---
+
+async def list_project_responses(db: AsyncSession, project_id: int) -> Sequence[Tuple[Response, Participant]]:
+    """Responses for a project together with their participant rows"""
+    stmt = (
+        select(Response, Participant)
+        .join(Participant, Participant.id == Response.participant_id)
+        .where(Response.project_id == project_id)
+    )
+    return (await db.execute(stmt)).all()
+
+async def get_response(db: AsyncSession, response_id: int) -> Optional[Tuple[Response, Participant]]:
+    stmt = (
+        select(Response, Participant)
+        .join(Participant, Participant.id == Response.participant_id)
+        .where(Response.id == response_id)
+    )
+    return (await db.execute(stmt)).first()
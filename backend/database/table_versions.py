@@ -0,0 +1,70 @@
+"""
+Per-table version counters for conditional GETs.
+
+Every write to a tracked table bumps that table's counter in the same
+transaction, so a reader can tell whether anything changed with one
+primary-key lookup instead of re-running the query. Counters live in the
+database, so every API process sees the same versions.
+
+A counter row is created on first bump with a random starting value; if the
+table is ever cleared and counting starts over, old ETags still cannot match.
+"""
+
+from typing import Dict, Iterable, Sequence
+import random
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.database.models import TableVersion
+from backend.database.upsert import insert_ignore
+
+PROJECTS = "projects"
+PARTICIPANTS = "participants"
+PROJECT_PARTICIPANTS = "project_participants"
+RESPONSES = "responses"
+
+
+def _seed_statement(dialect_name: str, tables: Sequence[str]):
+    return insert_ignore(
+        dialect_name,
+        TableVersion,
+        [{"table_name": table, "version": random.randrange(1 << 30)} for table in tables],
+        index_elements=["table_name"],
+    )
+
+def _bump_statement(tables: Sequence[str]):
+    return (
+        update(TableVersion)
+        .where(TableVersion.table_name.in_(tables))
+        .values(version=TableVersion.version + 1)
+    )
+
+
+def bump_table_versions(db: Session, *tables: str) -> None:
+    """Mark tables as changed. Call before the write's commit; the caller commits."""
+    tables = sorted(set(tables))
+    db.execute(_seed_statement(db.get_bind().dialect.name, tables))
+    db.execute(_bump_statement(tables))
+
+async def abump_table_versions(db: AsyncSession, *tables: str) -> None:
+    """Async variant of `bump_table_versions`"""
+    tables = sorted(set(tables))
+    await db.execute(_seed_statement(db.get_bind().dialect.name, tables))
+    await db.execute(_bump_statement(tables))
+
+
+def get_table_versions(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    """Current versions of the given tables; tables never written report 0"""
+    tables = sorted(set(tables))
+    stmt = select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    versions = dict(db.execute(stmt).all())
+    return {table: versions.get(table, 0) for table in tables}
+
+async def aget_table_versions(db: AsyncSession, tables: Iterable[str]) -> Dict[str, int]:
+    """Async variant of `get_table_versions`"""
+    tables = sorted(set(tables))
+    stmt = select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    versions = dict((await db.execute(stmt)).all())
+    return {table: versions.get(table, 0) for table in tables}
@@ -0,0 +1,35 @@
+"""
+Dialect-aware INSERT helpers used for single-transaction upserts.
+
+SQLite and PostgreSQL support `INSERT ... ON CONFLICT DO NOTHING`; MySQL gets
+the equivalent `INSERT IGNORE`.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import insert
+from sqlalchemy.sql.dml import Insert
+
+
+def insert_ignore(
+    dialect_name: str,
+    model,
+    values: Union[Dict[str, Any], List[Dict[str, Any]]],
+    index_elements: Sequence[str],
+    index_where: Optional[Any] = None,
+) -> Insert:
+    """Build an INSERT that silently skips rows conflicting on `index_elements`.
+
+    `index_elements` must match a unique constraint or unique index on the table;
+    for a partial unique index, pass its predicate as `index_where`. MySQL has no
+    partial indexes, so there such an insert never conflicts.
+    """
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model).values(values).on_conflict_do_nothing(index_elements=list(index_elements), index_where=index_where)
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model).values(values).on_conflict_do_nothing(index_elements=list(index_elements), index_where=index_where)
+    if dialect_name in ("mysql", "mariadb"):
+        return insert(model).values(values).prefix_with("IGNORE")
+    raise NotImplementedError(f"insert_ignore is not supported for dialect '{dialect_name}'")
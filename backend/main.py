@@ -6,19 +6,28 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
-from backend.database.database import engine
+import datetime
+from backend.database.config import is_sqlite
+from backend.database.database import DATABASE_URL, engine
 from backend.database.models import Base
-from backend.routers import participants, responses, chat, projects, topics, summary
+from backend.routers import participants, responses, chat, projects, topics, summary, media, pipeline
+from backend.services.static_assets import CachedStaticFiles
+from backend.services.render_service import recover_interrupted_renders, render_scheduler
+from backend.services.reel_service import recover_interrupted_reels
+from backend.services.pipeline_service import pipeline as processing_pipeline
+from backend.services.chat_link_service import chat_host
 import gradio as gr
 from backend.chat_interface import create_chat_interface
+from backend.migrate_db import run_migrations
 
-# Create the database tables
+# Create the database tables, then bring a database created by an older version up to date
 Base.metadata.create_all(bind=engine)
+if is_sqlite(DATABASE_URL) and not run_migrations():
+    raise RuntimeError("Database migration failed, see the errors above")
 
 # Create the FastAPI app
 app = FastAPI(title="RetroMeet API")
@@ -32,10 +41,10 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Mount static files
+# Mount static files (precompressed text assets, strong ETags, immutable hashed files)
 import pathlib
 STATIC_DIR = pathlib.Path(__file__).parent.parent / "frontend" / "static"
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+app.mount("/static", CachedStaticFiles(directory=str(STATIC_DIR)), name="static")
 
 # Set up templates
 templates_dir = os.path.join(PROJECT_ROOT, "frontend", "templates")
@@ -48,6 +57,8 @@ app.include_router(responses.router)
 app.include_router(chat.router)
 app.include_router(topics.router)
 app.include_router(summary.router)
+app.include_router(media.router)
+app.include_router(pipeline.router)
 
 # Create and mount the Gradio chat interface
 # You might need to pass initial parameters to create_chat_interface
@@ -60,6 +71,22 @@ app = gr.mount_gradio_app(app, gradio_chat_app_instance, path="/retrospective_ch
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.on_event("startup")
+def resume_pipelines():
+    # Renders and reels left pending by the previous run are reported as failed, not pending forever
+    started_at = datetime.datetime.utcnow()
+    recover_interrupted_renders(started_at)
+    recover_interrupted_reels(started_at)
+    processing_pipeline.resume()
+    # Every API process competes for hosting the participant chat
+    chat_host.start()
+
+@app.on_event("shutdown")
+def shutdown_render_pool():
+    chat_host.shutdown()
+    processing_pipeline.shutdown()
+    render_scheduler.shutdown()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
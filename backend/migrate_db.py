@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 """
-Database migration script to add chat_response_file_path column to responses table
+Database migration script for existing databases:
+- adds the chat_response_file_path column to the responses table
+- enforces one project_participants row per (project, participant)
+- makes participant names unique (duplicates are renamed, never deleted)
+- adds the archived_at column to the projects table
+- allows one queued or running job per (job_type, job_key)
+- adds the run options and lease columns to the pipeline_stages table
 """
 
 import os
@@ -18,7 +24,7 @@ sys.path.append(backend_dir)
 load_dotenv(os.path.join(project_root, '.env'))
 
 # Import database models
-from backend.database.models import Base
+from backend.database.models import ACTIVE_JOB_CONDITION, Base
 from backend.database.database import engine, DATABASE_URL
 
 def migrate_database():
@@ -33,7 +39,7 @@ def migrate_database():
             
             if 'chat_response_file_path' in columns:
                 print("Column 'chat_response_file_path' already exists in responses table.")
-                return
+                return True
             
             # Add the new column
             print("Adding 'chat_response_file_path' column to responses table...")
@@ -47,20 +53,140 @@ def migrate_database():
     
     return True
 
+def migrate_unique_memberships():
+    """Remove duplicate project memberships and add the unique index used by ingest upserts"""
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(text(
+                "DELETE FROM project_participants WHERE id NOT IN ("
+                "SELECT MIN(id) FROM project_participants GROUP BY project_id, participant_id)"
+            ))
+            if result.rowcount:
+                print(f"Removed {result.rowcount} duplicate project membership rows.")
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_project_participant "
+                "ON project_participants (project_id, participant_id)"
+            ))
+            conn.commit()
+            print("Unique index on project_participants (project_id, participant_id) is in place.")
+    except Exception as e:
+        print(f"Error during membership migration: {e}")
+        return False
+    
+    return True
+
+def migrate_unique_participant_names():
+    """Rename duplicate participant names and add the unique name index used for identity resolution"""
+    try:
+        with engine.connect() as conn:
+            duplicates = conn.execute(text(
+                "SELECT id, name FROM participants WHERE id NOT IN ("
+                "SELECT MIN(id) FROM participants GROUP BY name) ORDER BY id"
+            )).fetchall()
+            taken = {name for (name,) in conn.execute(text("SELECT name FROM participants"))}
+            for participant_id, name in duplicates:
+                # The suffixed name may itself be in use; keep counting until it is free
+                new_name, suffix = f"{name} ({participant_id})", 2
+                while new_name in taken:
+                    new_name, suffix = f"{name} ({participant_id}-{suffix})", suffix + 1
+                taken.add(new_name)
+                print(f"Renaming duplicate participant {participant_id}: '{name}' -> '{new_name}'")
+                conn.execute(
+                    text("UPDATE participants SET name = :name WHERE id = :id"),
+                    {"name": new_name, "id": participant_id}
+                )
+            # Replace the old non-unique index, if any, with a unique one
+            conn.execute(text("DROP INDEX IF EXISTS ix_participants_name"))
+            conn.execute(text("CREATE UNIQUE INDEX ix_participants_name ON participants (name)"))
+            conn.commit()
+            print("Unique index on participants (name) is in place.")
+    except Exception as e:
+        print(f"Error during participant name migration: {e}")
+        return False
+    
+    return True
+
+def migrate_project_archived_at():
+    """Add the archived_at column to the projects table"""
+    try:
+        with engine.connect() as conn:
+            columns = [row[1] for row in conn.execute(text("PRAGMA table_info(projects)")).fetchall()]
+            if 'archived_at' not in columns:
+                print("Adding 'archived_at' column to projects table...")
+                conn.execute(text("ALTER TABLE projects ADD COLUMN archived_at DATETIME"))
+                conn.commit()
+    except Exception as e:
+        print(f"Error during projects migration: {e}")
+        return False
+    
+    return True
+
+def migrate_active_job_index():
+    """Cancel duplicate in-flight jobs and add the partial unique index used by enqueue_job"""
+    try:
+        with engine.connect() as conn:
+            if not conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'jobs'")).fetchall():
+                return True
+            result = conn.execute(text(
+                f"UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP "
+                f"WHERE {ACTIVE_JOB_CONDITION} AND id NOT IN ("
+                f"SELECT MIN(id) FROM jobs WHERE {ACTIVE_JOB_CONDITION} GROUP BY job_type, job_key)"
+            ))
+            if result.rowcount:
+                print(f"Cancelled {result.rowcount} duplicate queued or running jobs.")
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_active_key "
+                f"ON jobs (job_type, job_key) WHERE {ACTIVE_JOB_CONDITION}"
+            ))
+            conn.commit()
+            print("Unique index on active jobs (job_type, job_key) is in place.")
+    except Exception as e:
+        print(f"Error during jobs migration: {e}")
+        return False
+    
+    return True
+
+def migrate_pipeline_leases():
+    """Add the options, owner_id and lease_expires_at columns to the pipeline_stages table"""
+    try:
+        with engine.connect() as conn:
+            columns = [row[1] for row in conn.execute(text("PRAGMA table_info(pipeline_stages)")).fetchall()]
+            for name, column_type in (("options", "TEXT"), ("owner_id", "VARCHAR(64)"), ("lease_expires_at", "DATETIME")):
+                if columns and name not in columns:
+                    print(f"Adding '{name}' column to pipeline_stages table...")
+                    conn.execute(text(f"ALTER TABLE pipeline_stages ADD COLUMN {name} {column_type}"))
+            conn.commit()
+    except Exception as e:
+        print(f"Error during pipeline_stages migration: {e}")
+        return False
+    
+    return True
+
 def create_tables():
     """Create all tables if they don't exist"""
     print("Creating tables if they don't exist...")
     Base.metadata.create_all(bind=engine)
     print("Tables created successfully!")
 
+def run_migrations():
+    """Run every migration in order; each is idempotent, so this is safe on every startup"""
+    return (
+        migrate_database()
+        and migrate_unique_memberships()
+        and migrate_unique_participant_names()
+        and migrate_project_archived_at()
+        and migrate_active_job_index()
+        and migrate_pipeline_leases()
+    )
+
 if __name__ == "__main__":
     print("Starting database migration...")
     
     # Create tables first
     create_tables()
     
-    # Run migration
-    if migrate_database():
+    # Run migrations
+    if run_migrations():
         print("Database migration completed successfully!")
     else:
         print("Database migration failed!")
@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+import json
+from pydantic import BaseModel
+from backend.database.database import get_db
+from backend.database.models import Participant, Project
+from backend.services.media_streaming import media_file_response, video_links
+from backend.services.reel_service import ReelService
+from backend.services.render_service import RenderService, cancel_render, render_status
+from backend.services.tts_service import (
+    TTSError, TTSService, cached_speech, get_engine, speech_cache_key, speech_job_status, submit_speech,
+    TTS_ENGINE, TTS_VOICE,
+)
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+class SpeechRequest(BaseModel):
+    voice: Optional[str] = None
+    engine: Optional[str] = None
+
+class SpeechStatus(BaseModel):
+    key: str
+    status: str  # ready, pending, failed or unknown
+    audio_path: Optional[str] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+@router.post("/projects/{project_id}/participants/{participant_id}/speech", response_model=SpeechStatus)
+def synthesize_participant_speech(
+    project_id: int,
+    participant_id: int,
+    request: SpeechRequest = SpeechRequest(),
+    db: Session = Depends(get_db)
+):
+    """Voice a participant's refined speech. Returns the cached track at once, otherwise queues synthesis (202)."""
+    try:
+        get_engine(request.engine)
+    except TTSError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    text = TTSService(db).get_speech_text(participant_id, project_id)
+    if not text:
+        raise HTTPException(status_code=404, detail="No refined speech for this participant in this project")
+    
+    cached = cached_speech(text, request.voice, request.engine)
+    if cached:
+        return SpeechStatus(key=cached.key, status="ready", audio_path=cached.path, duration=cached.duration)
+    
+    submit_speech(text, request.voice, request.engine)
+    key = speech_cache_key(text, request.voice or TTS_VOICE, request.engine or TTS_ENGINE)
+    return JSONResponse(status_code=202, content=SpeechStatus(key=key, status="pending").model_dump())
+
+@router.get("/speech/{key}", response_model=SpeechStatus)
+def get_speech_status(key: str):
+    """Poll a synthesis job started by the speech endpoint"""
+    return SpeechStatus(key=key, **speech_job_status(key))
+
+class VideoRequest(BaseModel):
+    voice: Optional[str] = None
+    engine: Optional[str] = None
+    renderer: Optional[str] = None
+
+class RenderStatus(BaseModel):
+    key: str
+    status: str  # pending, rendering, ready, failed, cancelled, stale or unknown
+    renderer: Optional[str] = None
+    progress: Optional[float] = None
+    video_path: Optional[str] = None
+    poster_path: Optional[str] = None
+    stream_path: Optional[str] = None  # HLS playlist, when segmenting is enabled
+    error: Optional[str] = None
+
+def _row_status(row) -> RenderStatus:
+    """A participant's render row, with live progress while it is in the pool"""
+    if row.status == "stale":
+        return RenderStatus(key=row.render_key, status="stale", renderer=row.renderer)
+    live = render_status(row.render_key)
+    if live["status"] == "unknown":
+        # Not in this process's pool: trust the row (renders a restart interrupted were failed at startup)
+        live = {"status": row.status, "progress": None, "error": row.error}
+        if row.status == "ready":
+            live.update(video_links(row.render_key))
+    return RenderStatus(key=row.render_key, renderer=row.renderer, **live)
+
+@router.post("/projects/{project_id}/participants/{participant_id}/video", response_model=RenderStatus)
+def render_participant_video(
+    project_id: int,
+    participant_id: int,
+    request: VideoRequest = VideoRequest(),
+    db: Session = Depends(get_db)
+):
+    """Render a participant's avatar speaking their speech. Returns a cached video at once, otherwise queues the render (202)."""
+    try:
+        get_engine(request.engine)
+    except TTSError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    participant = db.query(Participant).filter(Participant.id == participant_id).first()
+    if not participant:
+        raise HTTPException(status_code=404, detail="Participant not found")
+    
+    text = TTSService(db).get_speech_text(participant_id, project_id)
+    if not text:
+        raise HTTPException(status_code=404, detail="No refined speech for this participant in this project")
+    
+    service = RenderService(db)
+    try:
+        spec = service.build_spec(participant, text, request.voice, request.engine, request.renderer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    row = service.request_render(project_id, participant, spec)
+    status = _row_status(row)
+    if status.status == "ready":
+        return status
+    return JSONResponse(status_code=202, content=status.model_dump())
+
+@router.get("/projects/{project_id}/participants/{participant_id}/video", response_model=RenderStatus)
+def get_participant_video(project_id: int, participant_id: int, db: Session = Depends(get_db)):
+    """The participant's current render for a project; "stale" once their avatar or speech changed"""
+    row = RenderService(db).get_render(project_id, participant_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="No video has been rendered for this participant in this project")
+    return _row_status(row)
+
+@router.get("/renders/{key}", response_model=RenderStatus)
+def get_render_status(key: str):
+    """Poll a render by key"""
+    return RenderStatus(key=key, **render_status(key))
+
+@router.post("/renders/{key}/cancel", response_model=RenderStatus)
+def cancel_render_endpoint(key: str):
+    """Cancel a queued or running render"""
+    if not cancel_render(key):
+        raise HTTPException(status_code=404, detail="No render in progress with this key")
+    return RenderStatus(key=key, **render_status(key))
+
+class ReelStatus(BaseModel):
+    key: str
+    status: str  # pending, ready or failed
+    segments: int
+    video_path: Optional[str] = None
+    poster_path: Optional[str] = None
+    stream_path: Optional[str] = None
+    error: Optional[str] = None
+
+def _reel_status(row) -> ReelStatus:
+    links = video_links(row.reel_key) if row.status == "ready" else {}
+    return ReelStatus(
+        key=row.reel_key,
+        status=row.status,
+        segments=len(json.loads(row.segment_keys)),
+        error=row.error,
+        **links,
+    )
+
+@router.post("/projects/{project_id}/reel", response_model=ReelStatus)
+def build_meeting_reel(project_id: int, request: VideoRequest = VideoRequest(), db: Session = Depends(get_db)):
+    """Render every participant's video in parallel and join them, with title cards, into the project's reel (202 while building)"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        get_engine(request.engine)
+        row = ReelService(db).build_reel(project, request.voice, request.engine, request.renderer)
+    except (TTSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    status = _reel_status(row)
+    if status.status == "ready":
+        return status
+    return JSONResponse(status_code=202, content=status.model_dump())
+
+@router.get("/projects/{project_id}/reel", response_model=ReelStatus)
+def get_meeting_reel(project_id: int, db: Session = Depends(get_db)):
+    """The project's latest reel"""
+    row = ReelService(db).get_reel(project_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="No reel has been built for this project")
+    return _reel_status(row)
+
+@router.api_route("/videos/{filename}", methods=["GET", "HEAD"])
+def get_video_file(filename: str, request: Request):
+    """A generated video (<key>.mp4) or its poster (<key>.jpg), with byte-range support for seeking"""
+    return media_file_response(request, filename)
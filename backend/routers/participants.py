@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
 from pydantic import BaseModel
-from backend.database.database import get_db
+from backend.database.database import get_db, get_async_db
+from backend.database import repositories
 from backend.services.response_service import ResponseService
-from backend.services.avatar_service import AvatarService
+from backend.services.avatar_service import (
+    AVATAR_MAX_BYTES, AVATAR_USES, AvatarService, avatar_catalog, AvatarTooLargeError, InvalidImageError, avatar_url_for,
+    avatar_urls_for,
+)
+from backend.services.participant_identity import participant_identity_cache
+from backend.database.table_versions import PARTICIPANTS
+from backend.services.http_cache import is_not_modified, json_response, not_modified_response, read_etag
 import io
 
 router = APIRouter(prefix="/participants", tags=["participants"])
@@ -17,61 +27,161 @@ class ParticipantResponse(BaseModel):
     id: int
     name: str
     avatar_path: Optional[str] = None
+    avatar_thumbnail_path: Optional[str] = None
 
 class AvatarResponse(BaseModel):
     filename: str
 
+class AvatarCatalogItem(BaseModel):
+    filename: str
+    url: str
+    size: int
+    sha256: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    variants: Dict[str, str] = {}
+
+class AvatarCatalogPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: List[AvatarCatalogItem]
+
+class ParticipantBulkCreate(BaseModel):
+    participants: List[ParticipantCreate]
+
+class ParticipantBulkItemResult(BaseModel):
+    name: str
+    status: str  # created | exists | duplicate | invalid
+    participant_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class ParticipantBulkCreateResponse(BaseModel):
+    results: List[ParticipantBulkItemResult]
+
 @router.get("/", response_model=List[ParticipantResponse])
-def get_participants(db: Session = Depends(get_db)):
+async def get_participants(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all participants in the system"""
-    from backend.database.models import Participant
-    participants = db.query(Participant).all()
-    return [
+    # The avatar catalog stats (and on a cold start hashes) files, so it runs off the event loop
+    etag = await read_etag(request, db, (PARTICIPANTS,), await run_in_threadpool(avatar_catalog.version))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    participants = await repositories.list_participants(db)
+    thumbnails = await run_in_threadpool(avatar_urls_for, [p.avatar_path for p in participants], "grid")
+    return json_response(request, [
         ParticipantResponse(
             id=p.id,
             name=p.name,
-            avatar_path=p.avatar_path
+            avatar_path=p.avatar_path,
+            avatar_thumbnail_path=thumbnail
         )
-        for p in participants
-    ]
+        for p, thumbnail in zip(participants, thumbnails)
+    ], etag)
 
 @router.post("/", response_model=ParticipantResponse)
-def create_participant(participant: ParticipantCreate, db: Session = Depends(get_db)):
+async def create_participant(participant: ParticipantCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new participant (not associated with any project yet)"""
-    from backend.database.models import Participant
-    
     avatar_path = None
     if participant.avatar_filename:
         avatar_path = f"/static/avatars/{participant.avatar_filename}"
     
-    db_participant = Participant(
-        name=participant.name,
-        avatar_path=avatar_path
-    )
-    db.add(db_participant)
-    db.commit()
-    db.refresh(db_participant)
+    try:
+        db_participant = await repositories.create_participant(db, name=participant.name, avatar_path=avatar_path)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"A participant named '{participant.name}' already exists")
+    participant_identity_cache.invalidate(name=participant.name)
     
     return ParticipantResponse(
         id=db_participant.id,
         name=db_participant.name,
-        avatar_path=db_participant.avatar_path
+        avatar_path=db_participant.avatar_path,
+        avatar_thumbnail_path=await run_in_threadpool(avatar_url_for, db_participant.avatar_path, "grid")
     )
 
+@router.post("/bulk", response_model=ParticipantBulkCreateResponse)
+async def bulk_create_participants(request: ParticipantBulkCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create many participants in one transaction and report the outcome per item.
+
+    Names that already exist are reported as `exists` with their id, so the
+    call is safe to retry.
+    """
+    results: List[Optional[ParticipantBulkItemResult]] = [None] * len(request.participants)
+    pending = {}  # name -> (index, avatar_path)
+    for index, item in enumerate(request.participants):
+        if not item.name.strip():
+            results[index] = ParticipantBulkItemResult(name=item.name, status="invalid", detail="Name must not be empty")
+        elif len(item.name) > 100:
+            results[index] = ParticipantBulkItemResult(name=item.name, status="invalid", detail="Name is longer than 100 characters")
+        elif item.name in pending:
+            results[index] = ParticipantBulkItemResult(name=item.name, status="duplicate", detail="Name repeated in request")
+        else:
+            avatar_path = f"/static/avatars/{item.avatar_filename}" if item.avatar_filename else None
+            pending[item.name] = (index, avatar_path)
+    
+    existing = await repositories.get_participant_ids_by_name(db, list(pending)) if pending else {}
+    new_rows = [
+        {"name": name, "avatar_path": avatar_path}
+        for name, (_, avatar_path) in pending.items() if name not in existing
+    ]
+    try:
+        await repositories.bulk_create_participants(db, new_rows)
+        created = await repositories.get_participant_ids_by_name(db, [row["name"] for row in new_rows]) if new_rows else {}
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Participants were created concurrently; retry the request")
+    
+    for name, (index, _) in pending.items():
+        if name in existing:
+            results[index] = ParticipantBulkItemResult(name=name, status="exists", participant_id=existing[name])
+        else:
+            participant_identity_cache.invalidate(name=name)
+            results[index] = ParticipantBulkItemResult(name=name, status="created", participant_id=created[name])
+    
+    return ParticipantBulkCreateResponse(results=results)
+
 @router.get("/avatars", response_model=List[str])
 def get_avatars(db: Session = Depends(get_db)):
     """Get list of available avatar filenames"""
     avatar_service = AvatarService(db)
     return avatar_service.get_available_avatars()
 
+@router.get("/avatars/catalog", response_model=AvatarCatalogPage)
+def get_avatar_catalog(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    """Page through uploaded avatars, newest first, with metadata and derivative URLs"""
+    avatar_service = AvatarService(db)
+    total, entries = avatar_service.get_avatar_page(offset, limit)
+    items = [
+        AvatarCatalogItem(
+            filename=entry.filename,
+            url=entry.url,
+            size=entry.size,
+            sha256=entry.sha256,
+            width=entry.width,
+            height=entry.height,
+            thumbnail_url=entry.variants.get(AVATAR_USES["grid"], {}).get("path", entry.url),
+            variants={name: variant["path"] for name, variant in entry.variants.items()},
+        )
+        for entry in entries
+    ]
+    return AvatarCatalogPage(total=total, offset=offset, limit=limit, items=items)
+
 @router.post("/avatars", response_model=AvatarResponse)
 def upload_avatar(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload a new avatar image"""
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    """Upload a new avatar image (PNG, JPEG, GIF or WebP, checked by content)"""
+    if file.size is not None and file.size > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar must be at most {AVATAR_MAX_BYTES} bytes")
     
     avatar_service = AvatarService(db)
-    filename = avatar_service.upload_avatar(file.file.read(), file.filename)
+    try:
+        filename = avatar_service.upload_avatar_stream(file.file)
+    except AvatarTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return AvatarResponse(filename=filename)
 
@@ -83,59 +193,63 @@ def assign_avatar(participant_id: int, avatar: AvatarResponse, db: Session = Dep
     if not participant:
         raise HTTPException(status_code=404, detail="Participant or avatar not found")
     
-    return participant
+    return ParticipantResponse(
+        id=participant.id,
+        name=participant.name,
+        avatar_path=participant.avatar_path,
+        avatar_thumbnail_path=avatar_service.get_avatar_variants(participant.avatar_path)["grid"]
+    )
 
 @router.get("/{participant_id}", response_model=ParticipantResponse)
-def get_participant(participant_id: int, db: Session = Depends(get_db)):
+async def get_participant(participant_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific participant"""
-    from backend.database.models import Participant
-    
-    participant = db.query(Participant).filter(Participant.id == participant_id).first()
+    participant = await repositories.get_participant(db, participant_id)
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
     return ParticipantResponse(
         id=participant.id,
         name=participant.name,
-        avatar_path=participant.avatar_path
+        avatar_path=participant.avatar_path,
+        avatar_thumbnail_path=await run_in_threadpool(avatar_url_for, participant.avatar_path, "grid")
     )
 
 @router.put("/{participant_id}", response_model=ParticipantResponse)
-def update_participant(participant_id: int, participant_data: ParticipantCreate, db: Session = Depends(get_db)):
+async def update_participant(participant_id: int, participant_data: ParticipantCreate, db: AsyncSession = Depends(get_async_db)):
     """Update a participant"""
-    from backend.database.models import Participant
-    
-    participant = db.query(Participant).filter(Participant.id == participant_id).first()
+    participant = await repositories.get_participant(db, participant_id)
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
-    participant.name = participant_data.name
+    avatar_path = None
     if participant_data.avatar_filename:
-        participant.avatar_path = f"/static/avatars/{participant_data.avatar_filename}"
+        avatar_path = f"/static/avatars/{participant_data.avatar_filename}"
     
-    db.commit()
-    db.refresh(participant)
+    old_name = participant.name
+    try:
+        participant = await repositories.update_participant(db, participant, name=participant_data.name, avatar_path=avatar_path)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"A participant named '{participant_data.name}' already exists")
+    participant_identity_cache.invalidate(name=old_name, participant_id=participant_id)
+    participant_identity_cache.invalidate(name=participant_data.name)
     
     return ParticipantResponse(
         id=participant.id,
         name=participant.name,
-        avatar_path=participant.avatar_path
+        avatar_path=participant.avatar_path,
+        avatar_thumbnail_path=await run_in_threadpool(avatar_url_for, participant.avatar_path, "grid")
     )
 
 @router.delete("/{participant_id}")
-def delete_participant(participant_id: int, db: Session = Depends(get_db)):
+async def delete_participant(participant_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a participant (this will remove them from all projects)"""
-    from backend.database.models import Participant, ProjectParticipant
-    
-    participant = db.query(Participant).filter(Participant.id == participant_id).first()
+    participant = await repositories.get_participant(db, participant_id)
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
-    # Remove from all projects first
-    db.query(ProjectParticipant).filter(ProjectParticipant.participant_id == participant_id).delete()
-    
-    # Delete the participant
-    db.delete(participant)
-    db.commit()
+    # Removes project memberships first, then the participant
+    await repositories.delete_participant(db, participant_id)
+    participant_identity_cache.invalidate(name=participant.name, participant_id=participant_id)
     
     return {"message": "Participant deleted successfully"}
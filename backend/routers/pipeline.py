@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+import json
+from pydantic import BaseModel
+from backend.database.database import get_db
+from backend.database.models import Project, ProjectParticipant
+from backend.services.pipeline_service import pipeline
+from backend.services.render_service import RENDERERS
+from backend.services.tts_service import TTSError, get_engine
+
+router = APIRouter(prefix="/pipeline", tags=["pipeline"])
+
+class PipelineRequest(BaseModel):
+    voice: Optional[str] = None
+    engine: Optional[str] = None
+    renderer: Optional[str] = None
+
+class PipelineStarted(BaseModel):
+    project_id: int
+    participants: int  # participant runs started or queued
+
+class StageStatus(BaseModel):
+    participant_id: Optional[int] = None  # None for project stages
+    stage: str
+    status: str  # pending, running, done, skipped, failed or blocked
+    attempts: int
+    output: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+def _check_request(request: PipelineRequest) -> None:
+    try:
+        get_engine(request.engine)
+    except TTSError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.renderer and request.renderer not in RENDERERS:
+        raise HTTPException(status_code=400, detail=f"Unknown renderer '{request.renderer}'")
+
+@router.post("/projects/{project_id}", response_model=PipelineStarted, status_code=202)
+def run_project_pipeline(project_id: int, request: PipelineRequest = PipelineRequest(), db: Session = Depends(get_db)):
+    """Run every participant's stages, then the reel; stages whose inputs did not change are not redone"""
+    if not db.query(Project).filter(Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    _check_request(request)
+    started = pipeline.trigger_project(project_id, **request.model_dump())
+    return JSONResponse(status_code=202, content=PipelineStarted(project_id=project_id, participants=started).model_dump())
+
+@router.post("/projects/{project_id}/participants/{participant_id}", response_model=PipelineStarted, status_code=202)
+def run_participant_pipeline(project_id: int, participant_id: int, request: PipelineRequest = PipelineRequest(), db: Session = Depends(get_db)):
+    """Run one participant's stages (refine, speech, face analysis, video), then the reel"""
+    member = db.query(ProjectParticipant).filter(
+        ProjectParticipant.project_id == project_id, ProjectParticipant.participant_id == participant_id
+    ).first()
+    if not member:
+        raise HTTPException(status_code=404, detail="Participant not found in this project")
+    _check_request(request)
+    pipeline.trigger(project_id, participant_id, **request.model_dump())
+    return JSONResponse(status_code=202, content=PipelineStarted(project_id=project_id, participants=1).model_dump())
+
+@router.get("/projects/{project_id}", response_model=List[StageStatus])
+def get_pipeline_status(project_id: int, db: Session = Depends(get_db)):
+    """The last outcome of every pipeline stage of a project"""
+    return [
+        StageStatus(
+            participant_id=row.participant_id,
+            stage=row.stage,
+            status=row.status,
+            attempts=row.attempts,
+            output=json.loads(row.output) if row.output else None,
+            error=row.error,
+        )
+        for row in pipeline.stages(db, project_id)
+    ]
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
-from backend.database.database import get_db
-from backend.database.models import Project, ProjectParticipant, Participant
+from backend.database.database import get_async_db
+from backend.database import repositories
+from backend.database.table_versions import PARTICIPANTS, PROJECT_PARTICIPANTS, PROJECTS
+from backend.services.avatar_service import avatar_catalog, avatar_urls_for
+from backend.services.http_cache import is_not_modified, json_response, not_modified_response, read_etag
 import datetime
 
 router = APIRouter(prefix="/projects", tags=["projects"])
@@ -21,38 +26,45 @@ class ProjectParticipantResponse(BaseModel):
     id: int
     name: str
     avatar_path: Optional[str] = None
+    avatar_thumbnail_path: Optional[str] = None
     joined_at: datetime.datetime
 
 class AddParticipantRequest(BaseModel):
     participant_id: int
 
+class BulkMembershipRequest(BaseModel):
+    participant_ids: List[int]
+
+class BulkMembershipItemResult(BaseModel):
+    participant_id: int
+    status: str  # added | already_member | removed | not_member | not_found | duplicate
+
+class BulkMembershipResponse(BaseModel):
+    results: List[BulkMembershipItemResult]
+
 @router.get("/", response_model=List[ProjectResponse])
-def get_projects(db: Session = Depends(get_db)):
+async def get_projects(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all projects with participant counts"""
-    projects = db.query(Project).all()
-    
-    result = []
-    for project in projects:
-        participant_count = db.query(ProjectParticipant).filter(
-            ProjectParticipant.project_id == project.id
-        ).count()
-        
-        result.append(ProjectResponse(
+    etag = await read_etag(request, db, (PROJECTS, PROJECT_PARTICIPANTS))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    projects = await repositories.list_projects_with_counts(db)
+    
+    return json_response(request, [
+        ProjectResponse(
             id=project.id,
             name=project.name,
             created_at=project.created_at,
             participants_count=participant_count
-        ))
-    
-    return result
+        )
+        for project, participant_count in projects
+    ], etag)
 
 @router.post("/", response_model=ProjectResponse)
-def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project: ProjectCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new project"""
-    db_project = Project(name=project.name)
-    db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    db_project = await repositories.create_project(db, name=project.name)
     
     return ProjectResponse(
         id=db_project.id,
@@ -62,113 +74,170 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
     )
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-def get_project(project_id: int, db: Session = Depends(get_db)):
+async def get_project(project_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get a specific project"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    etag = await read_etag(request, db, (PROJECTS, PROJECT_PARTICIPANTS))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    project = await repositories.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    participant_count = db.query(ProjectParticipant).filter(
-        ProjectParticipant.project_id == project_id
-    ).count()
+    participant_count = await repositories.count_project_participants(db, project_id)
     
-    return ProjectResponse(
+    return json_response(request, ProjectResponse(
         id=project.id,
         name=project.name,
         created_at=project.created_at,
         participants_count=participant_count
-    )
+    ), etag)
 
 @router.get("/{project_id}/participants", response_model=List[ProjectParticipantResponse])
-def get_project_participants(project_id: int, db: Session = Depends(get_db)):
+async def get_project_participants(project_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all participants for a specific project"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    # Thumbnail paths change when avatar derivatives appear, hence the catalog version
+    # The catalog stats (and on a cold start hashes) files, so it runs off the event loop
+    etag = await read_etag(request, db, (PROJECTS, PARTICIPANTS, PROJECT_PARTICIPANTS), await run_in_threadpool(avatar_catalog.version))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    project = await repositories.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Get participants through the junction table
-    participants = db.query(Participant, ProjectParticipant.joined_at).join(
-        ProjectParticipant, Participant.id == ProjectParticipant.participant_id
-    ).filter(ProjectParticipant.project_id == project_id).all()
+    participants = await repositories.list_project_participants(db, project_id)
+    thumbnails = await run_in_threadpool(avatar_urls_for, [participant.avatar_path for participant, _ in participants], "grid")
     
-    return [
+    return json_response(request, [
         ProjectParticipantResponse(
             id=participant.id,
             name=participant.name,
             avatar_path=participant.avatar_path,
+            avatar_thumbnail_path=thumbnail,
             joined_at=joined_at
         )
-        for participant, joined_at in participants
-    ]
+        for (participant, joined_at), thumbnail in zip(participants, thumbnails)
+    ], etag)
 
 @router.post("/{project_id}/participants", response_model=dict)
-def add_participant_to_project(
+async def add_participant_to_project(
     project_id: int, 
     request: AddParticipantRequest, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add an existing participant to a project"""
     # Check if project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await repositories.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Check if participant exists
-    participant = db.query(Participant).filter(Participant.id == request.participant_id).first()
+    participant = await repositories.get_participant(db, request.participant_id)
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
     # Check if already associated
-    existing = db.query(ProjectParticipant).filter(
-        ProjectParticipant.project_id == project_id,
-        ProjectParticipant.participant_id == request.participant_id
-    ).first()
-    
+    existing = await repositories.get_project_participant(db, project_id, request.participant_id)
     if existing:
         raise HTTPException(status_code=409, detail="Participant already in this project")
     
     # Create association
-    association = ProjectParticipant(
-        project_id=project_id,
-        participant_id=request.participant_id
-    )
-    db.add(association)
-    db.commit()
+    await repositories.add_participant_to_project(db, project_id, request.participant_id)
     
     return {"message": f"Participant {participant.name} added to project {project.name}"}
 
+@router.post("/{project_id}/participants/bulk", response_model=BulkMembershipResponse)
+async def bulk_add_participants_to_project(
+    project_id: int,
+    request: BulkMembershipRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add many existing participants to a project in one transaction"""
+    project = await repositories.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    unique_ids = list(dict.fromkeys(request.participant_ids))
+    known_ids = await repositories.get_existing_participant_ids(db, unique_ids) if unique_ids else set()
+    member_ids = await repositories.get_project_member_ids(db, project_id, unique_ids) if unique_ids else set()
+    to_add = [pid for pid in unique_ids if pid in known_ids and pid not in member_ids]
+    
+    try:
+        await repositories.bulk_add_participants_to_project(db, project_id, to_add)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Memberships were changed concurrently; retry the request")
+    
+    results, seen = [], set()
+    for pid in request.participant_ids:
+        if pid in seen:
+            status = "duplicate"
+        elif pid not in known_ids:
+            status = "not_found"
+        elif pid in member_ids:
+            status = "already_member"
+        else:
+            status = "added"
+        seen.add(pid)
+        results.append(BulkMembershipItemResult(participant_id=pid, status=status))
+    
+    return BulkMembershipResponse(results=results)
+
+@router.post("/{project_id}/participants/bulk-remove", response_model=BulkMembershipResponse)
+async def bulk_remove_participants_from_project(
+    project_id: int,
+    request: BulkMembershipRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Remove many participants from a project in one transaction"""
+    project = await repositories.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    unique_ids = list(dict.fromkeys(request.participant_ids))
+    member_ids = await repositories.get_project_member_ids(db, project_id, unique_ids) if unique_ids else set()
+    
+    await repositories.bulk_remove_participants_from_project(db, project_id, list(member_ids))
+    await db.commit()
+    
+    results, seen = [], set()
+    for pid in request.participant_ids:
+        if pid in seen:
+            status = "duplicate"
+        elif pid in member_ids:
+            status = "removed"
+        else:
+            status = "not_member"
+        seen.add(pid)
+        results.append(BulkMembershipItemResult(participant_id=pid, status=status))
+    
+    return BulkMembershipResponse(results=results)
+
 @router.delete("/{project_id}/participants/{participant_id}")
-def remove_participant_from_project(
+async def remove_participant_from_project(
     project_id: int, 
     participant_id: int, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove a participant from a project"""
-    association = db.query(ProjectParticipant).filter(
-        ProjectParticipant.project_id == project_id,
-        ProjectParticipant.participant_id == participant_id
-    ).first()
-    
+    association = await repositories.get_project_participant(db, project_id, participant_id)
     if not association:
         raise HTTPException(status_code=404, detail="Participant not found in this project")
     
-    db.delete(association)
-    db.commit()
+    await repositories.remove_participant_from_project(db, association)
     
     return {"message": "Participant removed from project"}
 
 @router.delete("/{project_id}")
-def delete_project(project_id: int, db: Session = Depends(get_db)):
+async def delete_project(project_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a project and all its associations"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await repositories.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Delete all project-participant associations
-    db.query(ProjectParticipant).filter(ProjectParticipant.project_id == project_id).delete()
-    
-    # Delete the project
-    db.delete(project)
-    db.commit()
+    await repositories.delete_project(db, project_id)
     
     return {"message": "Project deleted successfully"}
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
-from backend.database.database import get_db
+from backend.database.database import get_db, get_async_db
+from backend.database import repositories
 from backend.services.response_service import ResponseService
-from backend.database.models import Response, Participant
+from backend.services.pipeline_service import PIPELINE_ON_CHAT, pipeline
+from backend.services.chat_turn_service import ChatTurnService, CHAT_TURN_ROLES
+from backend.services.archive_service import read_transcript
+from backend.database.models import Response
+from backend.database.table_versions import PARTICIPANTS, RESPONSES
+from backend.services.http_cache import is_not_modified, json_response, not_modified_response, read_etag
 from datetime import datetime
 
 router = APIRouter(prefix="/responses", tags=["responses"])
@@ -18,9 +26,30 @@ class ResponseCreate(BaseModel):
 class ChatResponseCreate(BaseModel):
     participant_name: str
     project_id: int
-    chat_content: str
+    # The id of a session whose turns were appended via /responses/chat/turns, and/or the full chat
+    # content; stored turns are preferred and the content is the fallback when none were stored
+    chat_content: Optional[str] = None
+    session_id: Optional[str] = None
     question: str = "Chat Response"
 
+class ChatTurnCreate(BaseModel):
+    session_id: str
+    participant_name: str
+    project_id: int
+    question: str
+    role: str  # "user" or "assistant"
+    content: str
+
+class ChatTurnData(BaseModel):
+    id: int
+    session_id: str
+    participant_id: int
+    project_id: int
+    question: str
+    role: str
+    content: str
+    created_at: datetime
+
 class ResponseData(BaseModel):
     id: int
     participant_id: int
@@ -44,54 +73,98 @@ def create_response(response: ResponseCreate, db: Session = Depends(get_db)):
         response_text=response.response_text
     )
     
-    # Fetch participant to get avatar_path for new responses
-    participant_obj = db.query(Participant).filter(Participant.id == processed_response['participant_id']).first()
-    avatar_path = participant_obj.avatar_path if participant_obj else None
-
-    # The pipeline returns a dictionary, so we access its items by key.
-    return ResponseData(
-        id=processed_response['response_id'],
-        participant_id=processed_response['participant_id'],
-        project_id=response.project_id,  # from the original request
-        question=processed_response['question'],
-        original_response=processed_response['original_response'],
-        refined_response=processed_response['refined_response'] or "", # Use empty string as fallback
-        chat_response_file_path=None, # This pipeline doesn't handle file paths
-        participant_name=response.participant_name, # from the original request
-        participant_avatar_path=avatar_path,
-        created_at=datetime.utcnow() # Use current time for the response
-    )
+    # The pipeline returns everything needed for the response, including the avatar path
+    return ResponseData(**{
+        **processed_response,
+        "refined_response": processed_response["refined_response"] or "",  # Use empty string as fallback
+    })
 
 @router.post("/chat", response_model=ResponseData)
 def create_chat_response(response: ChatResponseCreate, db: Session = Depends(get_db)):
     """Create a new chat response for a participant in a project"""
+    chat_content = None
+    if response.session_id:
+        # Render the conversation from the turns stored during the chat
+        chat_content = ChatTurnService(db).render_markdown(response.session_id)
+        if chat_content is None and response.chat_content is None:
+            raise HTTPException(status_code=404, detail="No chat turns found for this session")
+    if chat_content is None:
+        chat_content = response.chat_content
+    if chat_content is None:
+        raise HTTPException(status_code=400, detail="Either chat_content or session_id is required")
+    
     service = ResponseService(db)
     processed_response = service.process_chat_response(
         participant_name=response.participant_name,
         project_id=response.project_id,
-        chat_content=response.chat_content,
+        chat_content=chat_content,
         question=response.question
     )
+    if PIPELINE_ON_CHAT:
+        # Refinement, speech, face analysis, video and reel follow in the background
+        pipeline.trigger(response.project_id, processed_response["participant_id"])
     
-    return ResponseData(
-        id=processed_response.id,
-        participant_id=processed_response.participant_id,
-        project_id=processed_response.project_id,
-        question=processed_response.question,
-        original_response=processed_response.original_response,
-        refined_response=processed_response.refined_response or "",
-        chat_response_file_path=processed_response.chat_response_file_path,
-        participant_name=processed_response.participant.name if processed_response.participant else response.participant_name,
-        participant_avatar_path=processed_response.participant.avatar_path if processed_response.participant else None,
-        created_at=processed_response.created_at
+    return ResponseData(**{
+        **processed_response,
+        "refined_response": processed_response["refined_response"] or "",
+    })
+
+@router.post("/chat/turns", response_model=ChatTurnData)
+def append_chat_turn(turn: ChatTurnCreate, db: Session = Depends(get_db)):
+    """Append one turn of a chat session as soon as it happens"""
+    if turn.role not in CHAT_TURN_ROLES:
+        raise HTTPException(status_code=400, detail=f"role must be one of {', '.join(CHAT_TURN_ROLES)}")
+    
+    stored = ChatTurnService(db).append_turn(
+        session_id=turn.session_id,
+        participant_name=turn.participant_name,
+        project_id=turn.project_id,
+        question=turn.question,
+        role=turn.role,
+        content=turn.content
     )
+    return ChatTurnData(**stored)
+
+@router.get("/chat/sessions/{session_id}", response_model=List[ChatTurnData])
+def get_chat_session_turns(session_id: str, db: Session = Depends(get_db)):
+    """Get all turns of a chat session in order"""
+    turns = ChatTurnService(db).get_turns(session_id=session_id)
+    if not turns:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    return [
+        ChatTurnData(
+            id=t.id,
+            session_id=t.session_id,
+            participant_id=t.participant_id,
+            project_id=t.project_id,
+            question=t.question,
+            role=t.role,
+            content=t.content,
+            created_at=t.created_at
+        )
+        for t in turns
+    ]
+
+@router.get("/chat/sessions/{session_id}/markdown", response_class=PlainTextResponse)
+def get_chat_session_markdown(session_id: str, db: Session = Depends(get_db)):
+    """Render a chat session as markdown"""
+    markdown = ChatTurnService(db).render_markdown(session_id)
+    if markdown is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    return PlainTextResponse(markdown, media_type="text/markdown; charset=utf-8")
 
 @router.get("/project/{project_id}", response_model=List[ResponseData])
-def get_project_responses(project_id: int, db: Session = Depends(get_db)):
+async def get_project_responses(project_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all responses for a specific project"""
-    responses = db.query(Response).join(Participant).filter(Response.project_id == project_id).all()
+    etag = await read_etag(request, db, (RESPONSES, PARTICIPANTS))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     
-    return [
+    responses = await repositories.list_project_responses(db, project_id)
+    
+    return json_response(request, [
         ResponseData(
             id=r.id,
             participant_id=r.participant_id,
@@ -100,19 +173,20 @@ def get_project_responses(project_id: int, db: Session = Depends(get_db)):
             original_response=r.original_response,
             refined_response=r.refined_response or "",
             chat_response_file_path=r.chat_response_file_path,
-            participant_name=r.participant.name if r.participant else f"Participant {r.participant_id}",
-            participant_avatar_path=r.participant.avatar_path if r.participant else None,
+            participant_name=participant.name if participant else f"Participant {r.participant_id}",
+            participant_avatar_path=participant.avatar_path if participant else None,
             created_at=r.created_at
         )
-        for r in responses
-    ]
+        for r, participant in responses
+    ], etag)
 
 @router.get("/{response_id}", response_model=ResponseData)
-def get_response(response_id: int, db: Session = Depends(get_db)):
+async def get_response(response_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific response by ID"""
-    response = db.query(Response).join(Participant).filter(Response.id == response_id).first()
-    if not response:
+    row = await repositories.get_response(db, response_id)
+    if not row:
         raise HTTPException(status_code=404, detail="Response not found")
+    response, participant = row
     
     return ResponseData(
         id=response.id,
@@ -122,7 +196,23 @@ def get_response(response_id: int, db: Session = Depends(get_db)):
         original_response=response.original_response,
         refined_response=response.refined_response or "",
         chat_response_file_path=response.chat_response_file_path,
-        participant_name=response.participant.name if response.participant else f"Participant {response.participant_id}",
-        participant_avatar_path=response.participant.avatar_path if response.participant else None,
+        participant_name=participant.name if participant else f"Participant {response.participant_id}",
+        participant_avatar_path=participant.avatar_path if participant else None,
         created_at=response.created_at
     )
+
+@router.get("/{response_id}/transcript", response_class=PlainTextResponse)
+def get_response_transcript(response_id: int, db: Session = Depends(get_db)):
+    """Get the full markdown chat transcript stored for a response"""
+    row = db.query(Response.chat_response_file_path).filter(Response.id == response_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Response not found")
+    if not row.chat_response_file_path:
+        raise HTTPException(status_code=404, detail="This response has no chat transcript")
+    
+    try:
+        markdown = read_transcript(row.chat_response_file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Transcript file not found")
+    
+    return PlainTextResponse(markdown, media_type="text/markdown; charset=utf-8")
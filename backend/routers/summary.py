@@ -8,6 +8,7 @@ import os
 from backend.database.database import get_db
 from backend.database.models import Response as ResponseModel, Project as ProjectModel
 from backend.agents.crew import create_agents, create_summary_generation_task
+from backend.services.archive_service import read_summary
 from crewai import Crew
 
 router = APIRouter()
@@ -30,6 +31,21 @@ import pathlib
 SUMMARY_DIR = os.path.join(os.path.dirname(__file__), '../../summaries')
 os.makedirs(SUMMARY_DIR, exist_ok=True)
 
+@router.get(
+    "/projects/{project_id}/summary",
+    response_model=ProjectSummaryOutput,
+    tags=["Summary"]
+)
+def get_project_summary(project_id: int):
+    """
+    Returns the saved summary for a project, including summaries of archived projects.
+    """
+    summary = read_summary(project_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No summary saved for project {project_id}")
+    return ProjectSummaryOutput(**summary)
+
+
 @router.put(
     "/projects/{project_id}/summary",
     response_model=ProjectSummaryOutput,
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from backend.database.database import get_db
 from backend.services.response_service import ResponseService
+from backend.services.archive_service import read_transcript
+from backend.services.avatar_service import avatar_url_for
 from backend.agents.crew import create_agents, Task, Crew
 from backend.database.models import Response as DBResponse # Alias to avoid conflict with FastAPI's Response
 from pydantic import BaseModel
@@ -38,9 +40,8 @@ def generate_topics(project_id: int, db: Session = Depends(get_db)):
             all_text += r.refined_response + " "
         if r.chat_response_file_path:
             try:
-                file_path = os.path.join(PROJECT_ROOT, "frontend", "static", r.chat_response_file_path)
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    all_text += f.read() + " "
+                # Handles blob references and legacy static file paths
+                all_text += read_transcript(r.chat_response_file_path) + " "
             except Exception as e:
                 print(f"WARN: Could not read chat file {r.chat_response_file_path}: {e}")
 
@@ -131,7 +132,7 @@ class ParticipantTopicRelevance(BaseModel):
     response_model=List[ParticipantTopicRelevance],
     summary="Get participant responses relevant to a specific topic"
 )
-async def get_responses_for_topic(
+def get_responses_for_topic(
     project_id: int,
     query: TopicRelevanceQuery,
     db: Session = Depends(get_db)
@@ -154,7 +155,7 @@ async def get_responses_for_topic(
         if resp.participant_id not in participant_texts:
             participant_texts[resp.participant_id] = {
                 "name": resp.participant.name, # Assuming relationship is loaded or accessible
-                "avatar_path": resp.participant.avatar_path, # Added avatar path
+                "avatar_path": avatar_url_for(resp.participant.avatar_path, "card"), # Thumbnail for the relevance card
                 "texts": []
             }
         # Prioritize refined_response, fallback to original_response
@@ -0,0 +1,233 @@
+"""
+Per-project archives for transcripts and summaries of closed projects.
+
+An archive is one file per project under backend/data/archives:
+
+    b"RMARC1\\n" | member | member | ... | index | footer
+
+Every member is zlib-compressed on its own, so a single transcript can be read
+with one seek and one read. The index is zlib-compressed JSON mapping member
+names ("response:<id>", "summary") to (offset, length). The 16-byte footer is
+the index offset followed by the magic b"RMARCEND".
+
+Archived responses keep their row; `chat_response_file_path` becomes
+"archive:<project_id>:<response_id>" and `read_transcript` resolves it, so the
+API reads archived and live transcripts the same way.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import datetime
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.database.models import ChatTurn, Project, Response
+from backend.database.table_versions import PROJECTS, RESPONSES, bump_table_versions
+from backend.services.blob_store import BLOB_REF_PREFIX, STATIC_DIR, blob_store, is_blob_ref
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(PROJECT_ROOT, "backend", "data", "archives"))
+SUMMARY_DIR = os.path.join(PROJECT_ROOT, "summaries")
+ARCHIVE_REF_PREFIX = "archive:"
+
+_MAGIC = b"RMARC1\n"
+_FOOTER_MAGIC = b"RMARCEND"
+_FOOTER = struct.Struct("<Q8s")
+
+
+def archive_path(project_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"project_{project_id}.rmarc")
+
+def summary_path(project_id: int) -> str:
+    return os.path.join(SUMMARY_DIR, f"project_{project_id}_summary.json")
+
+def response_member(response_id: int) -> str:
+    return f"response:{response_id}"
+
+
+class ProjectArchive:
+    """Random-access reader for a project archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a RetroMeet archive")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            footer_offset = f.tell()
+            index_offset, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != _FOOTER_MAGIC:
+                raise ValueError(f"{path} has a corrupt footer")
+            f.seek(index_offset)
+            index = json.loads(zlib.decompress(f.read(footer_offset - index_offset)))
+        self.project_id: int = index["project_id"]
+        self.created_at: str = index["created_at"]
+        self.members: Dict[str, Tuple[int, int]] = {name: tuple(entry) for name, entry in index["members"].items()}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def read(self, name: str) -> bytes:
+        if name not in self.members:
+            raise KeyError(f"{name} is not in archive {self.path}")
+        offset, length = self.members[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def read_text(self, name: str) -> str:
+        return self.read(name).decode("utf-8")
+
+
+@lru_cache(maxsize=64)
+def _open_archive(path: str, mtime_ns: int) -> ProjectArchive:
+    # Keyed by mtime so a rewritten archive is re-indexed
+    return ProjectArchive(path)
+
+def open_archive(project_id: int) -> Optional[ProjectArchive]:
+    path = archive_path(project_id)
+    try:
+        return _open_archive(path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def write_archive(project_id: int, members: Dict[str, bytes]) -> str:
+    """Write (or replace) a project's archive atomically and return its path"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(project_id)
+    fd, tmp_path = tempfile.mkstemp(dir=ARCHIVE_DIR, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_MAGIC)
+            index = {}
+            for name, data in members.items():
+                payload = zlib.compress(data, 9)
+                index[name] = [f.tell(), len(payload)]
+                f.write(payload)
+            index_offset = f.tell()
+            f.write(zlib.compress(json.dumps({
+                "version": 1,
+                "project_id": project_id,
+                "created_at": datetime.datetime.utcnow().isoformat(),
+                "members": index,
+            }).encode("utf-8"), 9))
+            f.write(_FOOTER.pack(index_offset, _FOOTER_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def read_transcript(ref: str) -> str:
+    """Read a transcript by any stored reference: archive, blob or legacy static path"""
+    if ref.startswith(ARCHIVE_REF_PREFIX):
+        _, project_id, response_id = ref.split(":", 2)
+        archive = open_archive(int(project_id))
+        if archive is None:
+            raise FileNotFoundError(f"Archive for project {project_id} not found")
+        return archive.read_text(response_member(int(response_id)))
+    return blob_store.read_text(ref)
+
+
+def read_summary(project_id: int) -> Optional[dict]:
+    """Load a project's saved summary from the summaries directory, falling back to its archive"""
+    path = summary_path(project_id)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    archive = open_archive(project_id)
+    if archive is not None and "summary" in archive:
+        return json.loads(archive.read("summary"))
+    return None
+
+
+def find_closed_projects(db: Session, idle_days: int) -> List[int]:
+    """Projects with no responses or chat turns in the last `idle_days` days"""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=idle_days)
+    last_response = dict(
+        db.query(Response.project_id, func.max(Response.created_at)).group_by(Response.project_id).all()
+    )
+    last_turn = dict(
+        db.query(ChatTurn.project_id, func.max(ChatTurn.created_at)).group_by(ChatTurn.project_id).all()
+    )
+    closed = []
+    for project in db.query(Project).all():
+        activity = [t for t in (project.created_at, last_response.get(project.id), last_turn.get(project.id)) if t]
+        if activity and max(activity) < cutoff:
+            closed.append(project.id)
+    return closed
+
+
+def archive_project(db: Session, project_id: int) -> Dict[str, int]:
+    """Pack a project's transcripts and summary into its archive.
+
+    Members of an existing archive are carried over, so archiving again after
+    new responses arrive only adds to it. Source files and blobs no longer
+    referenced by any response are removed once the database points at the
+    archive.
+    """
+    existing = open_archive(project_id)
+    members: Dict[str, bytes] = {}
+    if existing is not None:
+        for name in existing.members:
+            members[name] = existing.read(name)
+
+    responses = db.query(Response).filter(
+        Response.project_id == project_id,
+        Response.chat_response_file_path.isnot(None),
+        ~Response.chat_response_file_path.startswith(ARCHIVE_REF_PREFIX),
+    ).all()
+
+    old_refs = {}
+    for r in responses:
+        try:
+            members[response_member(r.id)] = read_transcript(r.chat_response_file_path).encode("utf-8")
+        except FileNotFoundError:
+            print(f"WARN: Transcript {r.chat_response_file_path} for response {r.id} is missing; not archived")
+            continue
+        old_refs[r.id] = r.chat_response_file_path
+
+    summary_file = summary_path(project_id)
+    if os.path.exists(summary_file):
+        with open(summary_file, "rb") as f:
+            members["summary"] = f.read()
+
+    if not members:
+        return {"transcripts": 0, "summary": 0}
+
+    write_archive(project_id, members)
+
+    for r in responses:
+        if r.id in old_refs:
+            r.chat_response_file_path = f"{ARCHIVE_REF_PREFIX}{project_id}:{r.id}"
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if project is not None:
+        project.archived_at = datetime.datetime.utcnow()
+    bump_table_versions(db, PROJECTS, RESPONSES)
+    db.commit()
+
+    # The database now points at the archive; remove the hot copies
+    for ref in set(old_refs.values()):
+        if db.query(Response.id).filter(Response.chat_response_file_path == ref).first():
+            continue  # still referenced by another project's response (deduplicated blob)
+        if is_blob_ref(ref):
+            blob_store.delete(ref[len(BLOB_REF_PREFIX):])
+        else:
+            legacy_path = os.path.abspath(os.path.join(STATIC_DIR, ref))
+            if legacy_path.startswith(STATIC_DIR + os.sep) and os.path.exists(legacy_path):
+                os.remove(legacy_path)
+    if os.path.exists(summary_file):
+        os.remove(summary_file)
+
+    return {"transcripts": len(old_refs), "summary": int("summary" in members)}
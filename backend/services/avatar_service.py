@@ -1,32 +1,339 @@
 from sqlalchemy.orm import Session
 from backend.database.models import Participant
+from backend.database.table_versions import PARTICIPANTS, bump_table_versions
+from backend.services.face_analysis import schedule_face_analysis
+from backend.services.participant_identity import participant_identity_cache
+from backend.services.render_service import invalidate_avatar_renders
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+import io
+import json
 import os
+import re
 import shutil
-from typing import Optional, List
-import uuid
+import tempfile
+import threading
+
+import cv2
+
+# Uploads larger than this are rejected while streaming, before they hit the disk in full
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_UPLOAD_CHUNK_SIZE = 64 * 1024
+AVATAR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+AVATAR_DIR = os.path.join(PROJECT_ROOT, "frontend", "static", "avatars")
+AVATAR_URL_PREFIX = "/static/avatars/"
+# Derivatives are named by the hash of their own bytes, so their URLs never change meaning
+DERIVED_DIR = os.path.join(AVATAR_DIR, "derived")
+DERIVED_URL_PREFIX = AVATAR_URL_PREFIX + "derived/"
+
+# Variant name -> (longest side in px, square crop). All variants are WebP.
+AVATAR_VARIANTS = {
+    "thumb": (128, True),
+    "medium": (512, False),
+}
+# Which variant each consumer should display; None means the original file
+AVATAR_USES = {
+    "grid": "thumb",
+    "card": "thumb",
+    "profile": "medium",
+    "original": None,
+}
+AVATAR_WEBP_QUALITY = int(os.getenv("AVATAR_WEBP_QUALITY", "82"))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+
+
+class AvatarUploadError(ValueError):
+    """Base class for rejected avatar uploads"""
+
+class AvatarTooLargeError(AvatarUploadError):
+    pass
+
+class InvalidImageError(AvatarUploadError):
+    pass
+
+
+def detect_image_extension(header: bytes) -> Optional[str]:
+    """Identify an image format from its leading bytes (at least 12) and return its file extension"""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def manifest_path(filename: str) -> str:
+    return os.path.join(DERIVED_DIR, f"{filename}.json")
+
+
+def read_manifest(filename: str) -> Optional[dict]:
+    """The derivative manifest of an original avatar, or None if none was generated yet.
+
+    A manifest with an "error" and no variants records that generation failed,
+    so the original is served as uploaded and generation is not retried.
+    """
+    try:
+        with open(manifest_path(filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def generate_derivatives(filename: str) -> dict:
+    """Render the WebP variants of an original avatar and write its manifest.
+
+    Runs in the derivative worker pool. When the original cannot be decoded
+    (OpenCV has no GIF reader, for example) the manifest records the error
+    instead; such avatars are simply served as uploaded.
+    """
+    image = cv2.imread(os.path.join(AVATAR_DIR, filename), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        print(f"WARN: Could not decode avatar {filename}; no derivatives generated")
+        manifest = {"source": filename, "error": "undecodable", "variants": {}}
+        os.makedirs(DERIVED_DIR, exist_ok=True)
+        _atomic_write(manifest_path(filename), json.dumps(manifest).encode("utf-8"))
+        return manifest
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    height, width = image.shape[:2]
+    manifest = {"source": filename, "width": width, "height": height, "variants": {}}
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    for variant, (size, square) in AVATAR_VARIANTS.items():
+        img = image
+        if square:
+            side = min(height, width)
+            top, left = (height - side) // 2, (width - side) // 2
+            img = img[top:top + side, left:left + side]
+        h, w = img.shape[:2]
+        scale = size / max(h, w)
+        if scale < 1:
+            img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, AVATAR_WEBP_QUALITY])
+        if not ok:
+            print(f"WARN: Could not encode {variant} variant of avatar {filename}")
+            continue
+        data = encoded.tobytes()
+        derived_name = f"{hashlib.sha256(data).hexdigest()[:32]}.webp"
+        derived_path = os.path.join(DERIVED_DIR, derived_name)
+        if not os.path.exists(derived_path):
+            _atomic_write(derived_path, data)
+        manifest["variants"][variant] = {
+            "path": DERIVED_URL_PREFIX + derived_name,
+            "width": img.shape[1],
+            "height": img.shape[0],
+            "bytes": len(data),
+        }
+
+    _atomic_write(manifest_path(filename), json.dumps(manifest).encode("utf-8"))
+    return manifest
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+def schedule_derivatives(filename: str) -> Future:
+    """Queue derivative generation for an avatar; concurrent requests for the same file share one job.
+
+    OpenCV releases the GIL while decoding, resizing and encoding, so a small
+    thread pool keeps this work off the request path without extra processes.
+    A job that raised stays pending, so it is not resubmitted on every listing.
+    """
+    global _executor
+    with _pending_lock:
+        future = _pending.get(filename)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatar-derivatives")
+        future = _executor.submit(generate_derivatives, filename)
+        _pending[filename] = future
+
+    def _done(done: Future):
+        if done.exception() is not None:
+            print(f"ERROR: Generating derivatives of avatar {filename} failed: {done.exception()}")
+            return
+        with _pending_lock:
+            _pending.pop(filename, None)
+    future.add_done_callback(_done)
+    return future
+
+
+def avatar_url_for(avatar_path: Optional[str], use: str = "grid") -> Optional[str]:
+    """The URL to display an avatar for a given use (see AVATAR_USES).
+
+    Falls back to the original while derivatives do not exist yet, and queues
+    them so avatars uploaded before derivatives existed are backfilled.
+    """
+    variant = AVATAR_USES[use]
+    if not avatar_path or variant is None or not avatar_path.startswith(AVATAR_URL_PREFIX):
+        return avatar_path
+    filename = avatar_path[len(AVATAR_URL_PREFIX):]
+    entry = avatar_catalog.get(filename)
+    if entry is None:
+        return avatar_path
+    if not entry.derived:
+        schedule_derivatives(filename)
+        return avatar_path
+    derived = entry.variants.get(variant)
+    return derived["path"] if derived else avatar_path
+
+
+def avatar_urls_for(avatar_paths: List[Optional[str]], use: str = "grid") -> List[Optional[str]]:
+    """`avatar_url_for` for many avatars; async handlers run it with run_in_threadpool"""
+    return [avatar_url_for(path, use) for path in avatar_paths]
+
+
+class AvatarEntry(NamedTuple):
+    filename: str
+    url: str
+    size: int
+    sha256: str
+    width: Optional[int]
+    height: Optional[int]
+    variants: Dict[str, dict]
+    mtime_ns: int
+    derived: bool  # a manifest exists, even one recording a failure
+
+
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(AVATAR_UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AvatarCatalog:
+    """In-memory index of the avatar directory.
+
+    The index is rebuilt only when the mtime of the avatar directory or of its
+    derivatives directory changes (uploads, deletes and new manifests all
+    rename files into them), so a lookup costs two stat calls. Rebuilds reuse
+    the entries of unchanged files, so a file is hashed at most once; uploads
+    named by their SHA-256 are never re-hashed.
+    """
+
+    def __init__(self, avatar_dir: str = AVATAR_DIR, derived_dir: str = DERIVED_DIR):
+        self.avatar_dir = avatar_dir
+        self.derived_dir = derived_dir
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._entries: Dict[str, AvatarEntry] = {}
+        self._ordered: List[AvatarEntry] = []
+
+    def _dir_stamp(self):
+        stamp = []
+        for path in (self.avatar_dir, self.derived_dir):
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _rebuild(self) -> None:
+        entries: Dict[str, AvatarEntry] = {}
+        try:
+            scanned = [e for e in os.scandir(self.avatar_dir) if e.is_file() and e.name.lower().endswith(AVATAR_EXTENSIONS)]
+        except FileNotFoundError:
+            scanned = []
+        for dir_entry in scanned:
+            stat = dir_entry.stat()
+            previous = self._entries.get(dir_entry.name)
+            if previous is not None and previous.mtime_ns == stat.st_mtime_ns and previous.size == stat.st_size:
+                if previous.derived:
+                    # Manifests are written once per original, nothing to re-read
+                    entries[dir_entry.name] = previous
+                    continue
+                sha256 = previous.sha256
+            else:
+                stem = os.path.splitext(dir_entry.name)[0]
+                sha256 = stem if _SHA256_NAME.match(stem) else _file_sha256(dir_entry.path)
+            manifest = read_manifest(dir_entry.name)
+            derived = manifest is not None
+            manifest = manifest or {}
+            entries[dir_entry.name] = AvatarEntry(
+                filename=dir_entry.name,
+                url=AVATAR_URL_PREFIX + dir_entry.name,
+                size=stat.st_size,
+                sha256=sha256,
+                width=manifest.get("width"),
+                height=manifest.get("height"),
+                variants=manifest.get("variants", {}),
+                mtime_ns=stat.st_mtime_ns,
+                derived=derived,
+            )
+        self._entries = entries
+        # Newest first, which is what the avatar picker shows
+        self._ordered = sorted(entries.values(), key=lambda e: (-e.mtime_ns, e.filename))
+
+    def _refresh(self) -> None:
+        stamp = self._dir_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp != self._stamp:
+                self._rebuild()
+                self._stamp = stamp
+
+    def version(self) -> tuple:
+        """Changes whenever avatars or their derivatives change; used in HTTP ETags"""
+        return self._dir_stamp()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = None
+
+    def get(self, filename: str) -> Optional[AvatarEntry]:
+        self._refresh()
+        return self._entries.get(filename)
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[AvatarEntry]]:
+        """(total, entries) for a slice of the catalog"""
+        self._refresh()
+        ordered = self._ordered
+        end = None if limit is None else offset + limit
+        return len(ordered), ordered[offset:end]
+
+
+avatar_catalog = AvatarCatalog()
+
 
 class AvatarService:
     def __init__(self, db: Session):
         self.db = db
-        # Define project root and construct absolute path for avatar_dir
-        # Assumes avatar_service.py is in backend/services/
-        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-        self.avatar_dir = os.path.join(project_root, "frontend", "static", "avatars")
-        
-        # Ensure avatar directory exists
-        os.makedirs(self.avatar_dir, exist_ok=True)
+        self.avatar_dir = AVATAR_DIR
     
     def get_available_avatars(self) -> List[str]:
         """Get a list of all available avatar files"""
-        if not os.path.exists(self.avatar_dir):
-            return []
-        
-        avatars = []
-        for file in os.listdir(self.avatar_dir):
-            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                avatars.append(file)
-        
-        return avatars
+        _, entries = avatar_catalog.page()
+        return [entry.filename for entry in entries]
+
+    def get_avatar_page(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[AvatarEntry]]:
+        """A page of the avatar catalog, newest first, with metadata and derivative URLs"""
+        return avatar_catalog.page(offset, limit)
     
     def assign_avatar_to_participant(self, participant_id: int, avatar_filename: str) -> Optional[Participant]:
         """Assign an avatar to a participant"""
@@ -34,26 +341,81 @@ class AvatarService:
         if not participant:
             return None
         
-        avatar_file_path = os.path.join(self.avatar_dir, avatar_filename)
-        if not os.path.exists(avatar_file_path):
+        entry = avatar_catalog.get(avatar_filename)
+        if entry is None:
             return None
         
-        # Store path that works with FastAPI static file serving (/static mount)
-        participant.avatar_path = f"/static/avatars/{avatar_filename}"
+        # Store the original's path (served by the /static mount); variants are
+        # resolved per use with avatar_url_for, see get_avatar_variants
+        participant.avatar_path = f"{AVATAR_URL_PREFIX}{avatar_filename}"
+        # Videos rendered from another avatar are now out of date
+        invalidate_avatar_renders(self.db, participant.id, entry.sha256)
+        bump_table_versions(self.db, PARTICIPANTS)
         self.db.commit()
         self.db.refresh(participant)
+        # Cached identities carry the avatar path
+        participant_identity_cache.invalidate(participant_id=participant.id)
+        # Lip-sync renders need the face geometry; usually already there from the upload
+        schedule_face_analysis(os.path.join(self.avatar_dir, avatar_filename), entry.sha256)
         
         return participant
     
     def upload_avatar(self, file_content: bytes, filename: str) -> str:
-        """Upload a new avatar file"""
-        # Generate a unique filename to avoid conflicts
-        file_ext = os.path.splitext(filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        
-        # Save the file
-        avatar_path = os.path.join(self.avatar_dir, unique_filename)
-        with open(avatar_path, "wb") as f:
-            f.write(file_content)
-        
-        return unique_filename
+        """Upload a new avatar file from bytes already in memory"""
+        return self.upload_avatar_stream(io.BytesIO(file_content))
+
+    def upload_avatar_stream(self, stream: BinaryIO, max_bytes: int = AVATAR_MAX_BYTES) -> str:
+        """Stream an uploaded avatar to disk and return its stored filename.
+
+        The upload is copied in chunks to a temp file while it is hashed, so
+        memory use does not depend on the upload size. The format is taken from
+        the file's magic bytes, not the client's content type or filename. Files
+        are named by their SHA-256, so uploading the same picture again returns
+        the existing file instead of storing a copy.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        header = b""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.avatar_dir, prefix=".upload-")
+        except FileNotFoundError:
+            os.makedirs(self.avatar_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.avatar_dir, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(AVATAR_UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise AvatarTooLargeError(f"Avatar exceeds the {max_bytes} byte limit")
+                    if len(header) < 12:
+                        header += chunk[:12 - len(header)]
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            file_ext = detect_image_extension(header)
+            if file_ext is None:
+                raise InvalidImageError("File must be a PNG, JPEG, GIF or WebP image")
+
+            filename = f"{digest.hexdigest()}{file_ext}"
+            avatar_path = os.path.join(self.avatar_dir, filename)
+            if os.path.exists(avatar_path):
+                os.remove(tmp_path)  # same content already stored
+            else:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, avatar_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if read_manifest(filename) is None:
+            schedule_derivatives(filename)
+        schedule_face_analysis(avatar_path, digest.hexdigest())
+        return filename
+
+    def get_avatar_variants(self, avatar_path: Optional[str]) -> Dict[str, Optional[str]]:
+        """URLs of an avatar for every use in AVATAR_USES"""
+        return {use: avatar_url_for(avatar_path, use) for use in AVATAR_USES}
@@ -0,0 +1,168 @@
+"""
+Content-addressed, compressed storage for chat transcripts and other large texts.
+
+Blobs are keyed by the SHA-256 of their uncompressed content, so storing the
+same text twice is free and names can never collide. Files are compressed with
+zstd when the `zstandard` package is installed and zlib otherwise, and are
+written atomically (temp file + rename). Decoded blobs are kept in a small
+in-process LRU cache; blobs are immutable, so the cache never needs
+invalidation.
+
+Database columns store blob references as "blob:<sha256>". Older rows hold a
+path relative to frontend/static (e.g. "chat_responses/x.md"); `read_text`
+accepts both.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATIC_DIR = os.path.join(PROJECT_ROOT, "frontend", "static")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(PROJECT_ROOT, "backend", "data", "blobs"))
+BLOB_REF_PREFIX = "blob:"
+
+# File extension per codec; reads accept either, writes use the best available
+_ZSTD_EXT = ".zst"
+_ZLIB_EXT = ".zz"
+
+
+def is_blob_ref(ref: Optional[str]) -> bool:
+    return bool(ref) and ref.startswith(BLOB_REF_PREFIX)
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_STORE_DIR, cache_bytes: int = 32 * 1024 * 1024):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cached_size = 0
+        self._lock = threading.Lock()
+
+    # --- paths and codecs ---
+
+    def _path(self, digest: str, ext: str) -> str:
+        # Two levels of fan-out keep directories small
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + ext)
+
+    def _existing_path(self, digest: str) -> Optional[str]:
+        for ext in (_ZSTD_EXT, _ZLIB_EXT):
+            path = self._path(digest, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _compress(data: bytes):
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).compress(data), _ZSTD_EXT
+        return zlib.compress(data, 9), _ZLIB_EXT
+
+    @staticmethod
+    def _decompress(payload: bytes, path: str) -> bytes:
+        if path.endswith(_ZSTD_EXT):
+            if zstandard is None:
+                raise RuntimeError(f"Blob {path} is zstd-compressed but the 'zstandard' package is not installed")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        return zlib.decompress(payload)
+
+    # --- cache ---
+
+    def _cache_get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(digest)
+            if data is not None:
+                self._cache.move_to_end(digest)
+            return data
+
+    def _cache_put(self, digest: str, data: bytes) -> None:
+        if len(data) > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._cache:
+                return
+            self._cache[digest] = data
+            self._cached_size += len(data)
+            while self._cached_size > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_size -= len(evicted)
+
+    # --- public API ---
+
+    def put_bytes(self, data: bytes) -> str:
+        """Store bytes and return their SHA-256 digest. Existing content is not rewritten."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self._existing_path(digest):
+            return digest
+
+        payload, ext = self._compress(data)
+        path = self._path(digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._cache_put(digest, data)
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        data = self._cache_get(digest)
+        if data is not None:
+            return data
+
+        path = self._existing_path(digest)
+        if not path:
+            raise FileNotFoundError(f"Blob {digest} not found")
+        with open(path, "rb") as f:
+            data = self._decompress(f.read(), path)
+        self._cache_put(digest, data)
+        return data
+
+    def delete(self, digest: str) -> None:
+        """Remove a blob. Callers must make sure nothing references it any more."""
+        path = self._existing_path(digest)
+        if path:
+            os.remove(path)
+        with self._lock:
+            data = self._cache.pop(digest, None)
+            if data is not None:
+                self._cached_size -= len(data)
+
+    def exists(self, digest: str) -> bool:
+        return self._existing_path(digest) is not None
+
+    def put_text(self, text: str) -> str:
+        """Store text and return a reference suitable for a database column ("blob:<sha256>")."""
+        return BLOB_REF_PREFIX + self.put_bytes(text.encode("utf-8"))
+
+    def read_text(self, ref: str) -> str:
+        """Read text by blob reference, or by a legacy path relative to frontend/static."""
+        if is_blob_ref(ref):
+            return self.get_bytes(ref[len(BLOB_REF_PREFIX):]).decode("utf-8")
+
+        # Legacy value: a plain file under the static directory
+        path = os.path.abspath(os.path.join(STATIC_DIR, ref))
+        if not path.startswith(STATIC_DIR + os.sep):
+            raise FileNotFoundError(f"Transcript path {ref} is outside the static directory")
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+blob_store = BlobStore()
@@ -0,0 +1,317 @@
+"""
+Chat link state shared by every API process.
+
+The participant chat is a Gradio app with a public share link, run for one
+project at a time on `GRADIO_SERVER_PORT`. With `uvicorn --workers N` any
+process may receive the request to start, stop or report it, so its state
+lives in the slot's `chat_links` row rather than in process memory:
+
+- Endpoints only record what is wanted (project, participants, running or
+  stopped) and bump `generation`; any process answers status from the row.
+- Exactly one process hosts the Gradio server. Every API process runs a
+  `ChatHost` that tries to take the row's lease every
+  `CHAT_RECONCILE_SECONDS` with a conditional UPDATE; the holder renews it,
+  and when the host dies the lease lapses after `CHAT_LEASE_SECONDS` and
+  another process takes over and relaunches the chat.
+- The host compares the row's generation with the one it launched and
+  starts, restarts or stops the chat. The chat thread writes the URL or the
+  error back only while its generation is current, so a superseded launch
+  never overwrites a newer one.
+
+`ChatLinkEvents` pushes every change of the row to the `/chat/events`
+server-sent event stream, so clients get the link the moment it exists
+instead of polling `/chat/status`.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import datetime
+import json
+import os
+import socket
+import threading
+import uuid
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.chat_interface import create_chat_interface
+from backend.database.database import SessionLocal
+from backend.database.models import ChatLink
+from backend.database.upsert import insert_ignore
+
+GRADIO_SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "8081"))
+GRADIO_SERVER_NAME = "0.0.0.0"  # Use 0.0.0.0 for better share=True behavior
+CHAT_LINK_SLOT = f"gradio:{GRADIO_SERVER_PORT}"
+CHAT_LEASE_SECONDS = float(os.getenv("CHAT_LEASE_SECONDS", "15"))
+CHAT_RECONCILE_SECONDS = float(os.getenv("CHAT_RECONCILE_SECONDS", "1"))
+CHAT_EVENTS_POLL_SECONDS = float(os.getenv("CHAT_EVENTS_POLL_SECONDS", "0.25"))
+
+ACTIVE_STATUSES = ("requested", "starting", "running")
+
+
+def get_chat_link(db: Session) -> Optional[ChatLink]:
+    return db.query(ChatLink).filter(ChatLink.slot == CHAT_LINK_SLOT).first()
+
+
+def _ensure_chat_link(db: Session) -> ChatLink:
+    row = get_chat_link(db)
+    if row is None:
+        db.execute(insert_ignore(
+            db.get_bind().dialect.name,
+            ChatLink,
+            {"slot": CHAT_LINK_SLOT, "desired": "stopped", "generation": 0, "status": "stopped", "updated_at": datetime.datetime.utcnow()},
+            index_elements=["slot"],
+        ))
+        db.commit()
+        row = get_chat_link(db)
+    return row
+
+
+def _update_link(db: Session, if_generation: Optional[int] = None, **fields) -> bool:
+    """Update the slot's row; with `if_generation`, only while that generation is current"""
+    query = db.query(ChatLink).filter(ChatLink.slot == CHAT_LINK_SLOT)
+    if if_generation is not None:
+        query = query.filter(ChatLink.generation == if_generation)
+    updated = query.update({**fields, "updated_at": datetime.datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    if updated:
+        chat_link_events.notify()
+    return bool(updated)
+
+
+def request_chat(db: Session, project_id: int, participants: List[Dict[str, Any]]) -> ChatLink:
+    """Ask for the chat to run for a project; a chat already running or starting for it is kept"""
+    row = _ensure_chat_link(db)
+    if row.desired == "running" and row.project_id == project_id and row.status in ACTIVE_STATUSES:
+        return row
+    _update_link(
+        db,
+        project_id=project_id,
+        participants=json.dumps(participants),
+        desired="running",
+        generation=ChatLink.generation + 1,
+        status="requested",
+        url=None,
+        error=None,
+    )
+    db.expire_all()
+    return get_chat_link(db)
+
+
+def request_stop(db: Session) -> None:
+    _ensure_chat_link(db)
+    _update_link(db, desired="stopped", generation=ChatLink.generation + 1, status="stopped", url=None, error=None)
+
+
+class ChatHost:
+    """Per-process contender for hosting the chat; the lease holder runs the Gradio server"""
+
+    def __init__(self):
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._loop_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._chat_thread: Optional[threading.Thread] = None
+        self._app = None
+        self._generation: Optional[int] = None  # generation of the chat launched here
+
+    def start(self) -> None:
+        if self._loop_thread is None:
+            self._loop_thread = threading.Thread(target=self._loop, name="chat-host", daemon=True)
+            self._loop_thread.start()
+
+    def shutdown(self) -> None:
+        """Stop the chat hosted here and hand the lease over at once"""
+        self._stopping.set()
+        self._close_chat()
+        db = SessionLocal()
+        try:
+            db.query(ChatLink).filter(ChatLink.slot == CHAT_LINK_SLOT, ChatLink.owner_id == self.owner_id).update(
+                {ChatLink.owner_id: None, ChatLink.lease_expires_at: None}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _loop(self) -> None:
+        while not self._stopping.wait(CHAT_RECONCILE_SECONDS):
+            try:
+                self._reconcile()
+            except Exception as e:
+                print(f"WARN: Chat host reconciliation failed: {e}")
+
+    def _acquire_lease(self, db: Session) -> bool:
+        now = datetime.datetime.utcnow()
+        acquired = db.query(ChatLink).filter(
+            ChatLink.slot == CHAT_LINK_SLOT,
+            or_(ChatLink.owner_id.is_(None), ChatLink.owner_id == self.owner_id, ChatLink.lease_expires_at < now),
+        ).update({
+            ChatLink.owner_id: self.owner_id,
+            ChatLink.lease_expires_at: now + datetime.timedelta(seconds=CHAT_LEASE_SECONDS),
+        }, synchronize_session=False)
+        db.commit()
+        return bool(acquired)
+
+    def _reconcile(self) -> None:
+        db = SessionLocal()
+        try:
+            _ensure_chat_link(db)
+            if not self._acquire_lease(db):
+                if self._generation is not None:
+                    print(f"WARN: Chat host {self.owner_id} lost its lease; stopping the local chat")
+                    self._close_chat()
+                    self._generation = None
+                return
+            row = get_chat_link(db)
+            if row.generation == self._generation:
+                chat_ended = self._chat_thread is not None and not self._chat_thread.is_alive()
+                if row.desired == "running" and chat_ended and row.status in ACTIVE_STATUSES:
+                    _update_link(db, row.generation, status="stopped", url=None)
+                return
+
+            self._close_chat()
+            self._generation = row.generation
+            if row.desired == "running":
+                _update_link(db, row.generation, status="starting")
+                participants = json.loads(row.participants or "[]")
+                print(f"INFO: Chat host {self.owner_id} starting the chat for project {row.project_id}")
+                self._chat_thread = threading.Thread(
+                    target=self._run_chat, args=(row.generation, row.project_id, participants), name="gradio-chat", daemon=True
+                )
+                self._chat_thread.start()
+        finally:
+            db.close()
+
+    def _close_chat(self) -> None:
+        with self._lock:
+            app, self._app = self._app, None
+            thread, self._chat_thread = self._chat_thread, None
+        if app is not None:
+            try:
+                app.close()
+            except Exception as e:
+                print(f"ERROR: Could not close the Gradio app: {e}")
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+            if thread.is_alive():
+                print("WARN: Chat thread did not terminate in time")
+
+    def _run_chat(self, generation: int, project_id: int, participants: List[Dict[str, Any]]) -> None:
+        """Launch the Gradio app, publish its link, then serve until it is closed"""
+        db = SessionLocal()
+        demo = None
+        try:
+            demo = create_chat_interface(project_id=project_id, project_participants_details=participants)
+            # With share=True, launch returns once the share tunnel is up (share_url is None if it failed)
+            _, local_url, share_url = demo.launch(
+                server_name=GRADIO_SERVER_NAME,
+                server_port=GRADIO_SERVER_PORT,
+                share=True,
+                quiet=False,
+                prevent_thread_lock=True,
+            )
+            with self._lock:
+                if self._generation != generation:
+                    return  # superseded while launching; finally closes it
+                self._app = demo
+
+            if not share_url:
+                print("WARN: Gradio share link could not be created; publishing the local URL")
+            url = share_url or local_url
+            if _update_link(db, generation, status="running", url=url):
+                print(f"INFO: Chat for project {project_id} is running at {url}")
+            demo.block_thread()
+        except Exception as e:
+            print(f"ERROR: Chat for project {project_id} failed: {e}")
+            _update_link(db, generation, status="error", url=None, error=str(e))
+        finally:
+            with self._lock:
+                superseded = self._app is not demo
+            if demo is not None and superseded:
+                try:
+                    demo.close()
+                except Exception:
+                    pass
+            db.close()
+
+
+def link_event(row: Optional[ChatLink]) -> Dict[str, Any]:
+    """The observable state of the chat link"""
+    if row is None:
+        return {"status": "stopped", "project_id": None, "url": None, "error": None, "generation": 0}
+    return {"status": row.status, "project_id": row.project_id, "url": row.url, "error": row.error, "generation": row.generation}
+
+
+def read_link_event() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return link_event(get_chat_link(db))
+    finally:
+        db.close()
+
+
+class ChatLinkEvents:
+    """Pushes changes of the chat link to subscribers in this process (the SSE endpoint).
+
+    Changes written by this process are pushed at once; changes written by the
+    host in another process are seen by re-reading the row every
+    `CHAT_EVENTS_POLL_SECONDS`, only while someone is subscribed.
+    """
+
+    def __init__(self, interval: float = CHAT_EVENTS_POLL_SECONDS):
+        self.interval = interval
+        self._subscribers: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> Tuple[int, asyncio.Queue]:
+        """Register a queue of link events; call from the event loop that reads it"""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._next_id += 1
+            token = self._next_id
+            self._subscribers[token] = (asyncio.get_running_loop(), queue)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="chat-link-events", daemon=True)
+                self._thread.start()
+        return token, queue
+
+    def unsubscribe(self, token: int) -> None:
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def notify(self) -> None:
+        """Re-read the link now instead of at the next poll"""
+        self._wake.set()
+
+    def _watch(self) -> None:
+        last = None
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                event = read_link_event()
+            except Exception as e:
+                print(f"WARN: Could not read the chat link: {e}")
+                continue
+            if event == last:
+                continue
+            last = event
+            with self._lock:
+                subscribers = list(self._subscribers.values())
+            for loop, queue in subscribers:
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                except RuntimeError:
+                    pass  # the subscriber's loop is closed
+
+
+chat_link_events = ChatLinkEvents()
+chat_host = ChatHost()
@@ -0,0 +1,114 @@
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from backend.database.models import ChatTurn, ProjectParticipant
+from backend.database.upsert import insert_ignore
+from backend.database.table_versions import PARTICIPANTS, PROJECT_PARTICIPANTS, bump_table_versions
+from backend.services.participant_identity import participant_identity_cache, resolve_participant
+from typing import Any, Dict, List, Optional
+import datetime
+
+CHAT_TURN_ROLES = ("user", "assistant")
+
+class ChatTurnService:
+    """Stores chat conversations one turn at a time and renders them on demand"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def append_turn(
+        self,
+        session_id: str,
+        participant_name: str,
+        project_id: int,
+        question: str,
+        role: str,
+        content: str,
+    ) -> Dict[str, Any]:
+        """Append a single turn to a chat session in one transaction.
+
+        The participant is resolved (and created if new) and added to the project
+        the same way answer ingest does it.
+        """
+        if role not in CHAT_TURN_ROLES:
+            raise ValueError(f"role must be one of {', '.join(CHAT_TURN_ROLES)}")
+
+        created_at = datetime.datetime.utcnow()
+        try:
+            identity = resolve_participant(self.db, participant_name, create_missing=True)
+            joined = self.db.execute(insert_ignore(
+                self.db.get_bind().dialect.name,
+                ProjectParticipant,
+                {"project_id": project_id, "participant_id": identity.id, "joined_at": created_at},
+                index_elements=["project_id", "participant_id"],
+            )).rowcount
+            result = self.db.execute(insert(ChatTurn).values(
+                session_id=session_id,
+                participant_id=identity.id,
+                project_id=project_id,
+                question=question,
+                role=role,
+                content=content,
+                created_at=created_at,
+            ))
+            turn_id = result.inserted_primary_key[0]
+            # Only a new participant or membership changes those listings (and their ETags)
+            changed = ([PARTICIPANTS] if identity.created else []) + ([PROJECT_PARTICIPANTS] if joined else [])
+            if changed:
+                bump_table_versions(self.db, *changed)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            participant_identity_cache.invalidate(name=participant_name)
+            raise
+
+        return {
+            "id": turn_id,
+            "session_id": session_id,
+            "participant_id": identity.id,
+            "project_id": project_id,
+            "question": question,
+            "role": role,
+            "content": content,
+            "created_at": created_at,
+        }
+
+    def get_turns(
+        self,
+        session_id: Optional[str] = None,
+        participant_id: Optional[int] = None,
+        project_id: Optional[int] = None,
+        question: Optional[str] = None,
+        role: Optional[str] = None,
+    ) -> List[ChatTurn]:
+        """Query turns by any combination of session, participant, project, question and role"""
+        stmt = select(ChatTurn)
+        if session_id is not None:
+            stmt = stmt.where(ChatTurn.session_id == session_id)
+        if participant_id is not None:
+            stmt = stmt.where(ChatTurn.participant_id == participant_id)
+        if project_id is not None:
+            stmt = stmt.where(ChatTurn.project_id == project_id)
+        if question is not None:
+            stmt = stmt.where(ChatTurn.question == question)
+        if role is not None:
+            stmt = stmt.where(ChatTurn.role == role)
+        return list(self.db.execute(stmt.order_by(ChatTurn.id)).scalars().all())
+
+    def render_markdown(self, session_id: str) -> Optional[str]:
+        """Render a session's turns as the markdown chat content used by the response collector"""
+        turns = self.get_turns(session_id=session_id)
+        if not turns:
+            return None
+
+        chat_content = ""
+        current_question = None
+        for turn in turns:
+            if turn.question != current_question:
+                if current_question is not None:
+                    chat_content += "---\n\n"
+                chat_content += f"**Question:** {turn.question}\n\n"
+                current_question = turn.question
+            label = "User Response" if turn.role == "user" else "Assistant Response"
+            chat_content += f"**{label}:** {turn.content}\n\n"
+        chat_content += "---\n\n"
+        return chat_content
@@ -0,0 +1,249 @@
+"""
+Face analysis of avatar images, computed once per avatar and cached.
+
+Every lip-sync render needs the avatar's face box, a few landmarks and the
+mouth region. They depend only on the avatar's content, so they are computed
+once, right after the avatar is uploaded or assigned, and stored under
+backend/data/media/faces/<sha256>.v<version>/ as plain .npy files:
+
+- geometry.npy     float32 (3, 4): (image width, image height, detected, version),
+                   face box and mouth box as (x, y, width, height) in image pixels
+- landmarks.npy    float32 (8, 2): see LANDMARKS
+- mouth_patch.npy  uint8 BGR crop around the mouth, MOUTH_PATCH_SIZE
+- face_patch.npy   uint8 BGR square crop of the face, FACE_PATCH_SIZE
+
+Renders open them with `np.load(mmap_mode="r")`, so worker processes share
+the pages through the OS cache instead of each decoding and analysing the
+image again.
+
+Faces are found with OpenCV's Haar cascade. Drawn avatars often defeat it;
+then the face is assumed where a centred portrait has it and the mouth line
+is searched for as the darkest row in the lower face.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+import os
+import shutil
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from backend.services.media_tools import MEDIA_DATA_DIR
+from backend.services.video_encoder import fit_transform
+
+FACES_DIR = os.path.join(MEDIA_DATA_DIR, "faces")
+ANALYSIS_VERSION = 1
+FACE_WORKERS = int(os.getenv("FACE_ANALYSIS_WORKERS", "1"))
+
+LANDMARKS = ("left_eye", "right_eye", "nose", "mouth_left", "mouth_right", "mouth_top", "mouth_bottom", "chin")
+MOUTH_PATCH_SIZE = (96, 48)  # width, height
+FACE_PATCH_SIZE = 96
+
+_ARRAYS = ("geometry", "landmarks", "mouth_patch", "face_patch")
+
+
+class FaceAnalysis(NamedTuple):
+    image_size: Tuple[int, int]
+    detected: bool  # False when the geometry is the portrait fallback
+    face_box: np.ndarray  # x, y, width, height in image pixels
+    mouth_box: np.ndarray
+    landmarks: np.ndarray
+    mouth_patch: np.ndarray
+    face_patch: np.ndarray
+
+
+def analysis_dir(avatar_sha256: str) -> str:
+    return os.path.join(FACES_DIR, avatar_sha256[:2], f"{avatar_sha256}.v{ANALYSIS_VERSION}")
+
+
+_cascade_local = threading.local()
+
+def _face_cascade():
+    """The Haar face detector, or None where OpenCV lacks it (5.x moved it to contrib).
+
+    CascadeClassifier is not thread-safe, so there is one per thread.
+    """
+    if not hasattr(cv2, "CascadeClassifier"):
+        return None
+    cascade = getattr(_cascade_local, "cascade", None)
+    if cascade is None:
+        path = os.path.join(getattr(getattr(cv2, "data", None), "haarcascades", ""), "haarcascade_frontalface_default.xml")
+        cascade = cv2.CascadeClassifier(path)
+        _cascade_local.cascade = cascade
+    return None if cascade.empty() else cascade
+
+
+def _load_bgr(path: str) -> np.ndarray:
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Could not read avatar {path}")
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        alpha = image[:, :, 3:4].astype(np.float32) / 255.0
+        return (image[:, :, :3] * alpha + 24 * (1 - alpha)).astype(np.uint8)
+    return image
+
+
+def _detect_face(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    cascade = _face_cascade()
+    if cascade is None:
+        return None
+    h, w = gray.shape
+    faces = cascade.detectMultiScale(cv2.equalizeHist(gray), scaleFactor=1.1, minNeighbors=5, minSize=(w // 8, h // 8))
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+
+
+def _portrait_face(w: int, h: int) -> Tuple[int, int, int, int]:
+    """Face box of a centred head-and-shoulders portrait"""
+    face_w = int(w * 0.42)
+    face_h = int(min(h * 0.5, face_w * 1.2))
+    return (w - face_w) // 2, int(h * 0.42) - face_h // 2, face_w, face_h
+
+
+def _find_mouth(gray: np.ndarray, face: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """Mouth box inside a face box, centred on the darkest row of the lower face"""
+    x, y, fw, fh = face
+    mouth_w, mouth_h = max(4, int(fw * 0.42)), max(4, int(fh * 0.2))
+    centre_y = y + int(fh * 0.77)
+
+    top, bottom = y + int(fh * 0.62), min(gray.shape[0], y + int(fh * 0.92))
+    band = gray[top:bottom, x + fw // 4:x + 3 * fw // 4].astype(np.float32)
+    if band.shape[0] >= 5 and band.shape[1] > 0:
+        rows = cv2.GaussianBlur(band.mean(axis=1).reshape(-1, 1), (1, 5), 0).ravel()
+        darkest = int(np.argmin(rows))
+        if rows.max() - rows[darkest] > 12:  # a visible mouth line, not flat skin
+            centre_y = top + darkest
+    return x + (fw - mouth_w) // 2, centre_y - mouth_h // 2, mouth_w, mouth_h
+
+
+def _crop(image: np.ndarray, box: Tuple[int, int, int, int], size: Tuple[int, int], margin: float) -> np.ndarray:
+    x, y, w, h = box
+    mx, my = int(w * margin), int(h * margin)
+    padded = cv2.copyMakeBorder(image, my, my, mx, mx, cv2.BORDER_REPLICATE)
+    crop = padded[max(0, y):max(0, y) + h + 2 * my, max(0, x):max(0, x) + w + 2 * mx]
+    return cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+
+
+def square_box(face_box) -> Tuple[int, int, int, int]:
+    """The square around a face box that `face_patch` is cropped from"""
+    x, y, w, h = (int(v) for v in face_box)
+    side = max(w, h)
+    return x + w // 2 - side // 2, y + h // 2 - side // 2, side, side
+
+
+def analyze_face(image: np.ndarray) -> Dict[str, np.ndarray]:
+    """The arrays of a face analysis for a BGR image"""
+    h, w = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    face = _detect_face(gray)
+    detected = face is not None
+    if face is None:
+        face = _portrait_face(w, h)
+    mouth = _find_mouth(gray, face)
+
+    x, y, fw, fh = face
+    mx, my, mw, mh = mouth
+    landmarks = np.array([
+        (x + fw * 0.32, y + fh * 0.4), (x + fw * 0.68, y + fh * 0.4), (x + fw * 0.5, y + fh * 0.6),
+        (mx, my + mh / 2), (mx + mw, my + mh / 2), (mx + mw / 2, my), (mx + mw / 2, my + mh),
+        (x + fw * 0.5, y + fh),
+    ], np.float32)
+
+    square = square_box(face)
+    return {
+        "geometry": np.array([(w, h, float(detected), ANALYSIS_VERSION), face, mouth], np.float32),
+        "landmarks": landmarks,
+        "mouth_patch": _crop(image, mouth, MOUTH_PATCH_SIZE, 0.25),
+        "face_patch": _crop(image, square, (FACE_PATCH_SIZE, FACE_PATCH_SIZE), 0.0),
+    }
+
+
+def _from_arrays(arrays: Dict[str, np.ndarray]) -> FaceAnalysis:
+    geometry = arrays["geometry"]
+    return FaceAnalysis(
+        image_size=(int(geometry[0, 0]), int(geometry[0, 1])),
+        detected=bool(geometry[0, 2]),
+        face_box=geometry[1],
+        mouth_box=geometry[2],
+        landmarks=arrays["landmarks"],
+        mouth_patch=arrays["mouth_patch"],
+        face_patch=arrays["face_patch"],
+    )
+
+
+def load_face_analysis(avatar_sha256: str) -> Optional[FaceAnalysis]:
+    """The cached analysis of an avatar, memory-mapped, or None if it was not computed yet"""
+    directory = analysis_dir(avatar_sha256)
+    try:
+        return _from_arrays({name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS})
+    except FileNotFoundError:
+        return None
+
+
+def analyze_avatar(avatar_file: str, avatar_sha256: str) -> FaceAnalysis:
+    """Analyse an avatar unless it was already, and return the cached result"""
+    cached = load_face_analysis(avatar_sha256)
+    if cached is not None:
+        return cached
+
+    arrays = analyze_face(_load_bgr(avatar_file))
+    directory = analysis_dir(avatar_sha256)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix=".tmp-")
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+            shutil.rmtree(tmp_dir)  # another worker finished first
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    print(f"INFO: Analysed face of avatar {avatar_sha256[:12]} ({'detected' if arrays['geometry'][0, 2] else 'portrait fallback'})")
+    return load_face_analysis(avatar_sha256)
+
+
+def canvas_box(box: np.ndarray, image_size: Tuple[int, int], width: int, height: int) -> Tuple[int, int, int, int]:
+    """A box in image pixels mapped onto a render canvas made by `fit_image`"""
+    scale, left, top = fit_transform(image_size[0], image_size[1], width, height)
+    x, y, w, h = (float(v) for v in box)
+    cx, cy = int(round(left + x * scale)), int(round(top + y * scale))
+    cw, ch = max(2, int(round(w * scale))), max(2, int(round(h * scale)))
+    cx, cy = min(max(cx, 0), width - cw), min(max(cy, 0), height - ch)
+    return cx, cy, cw, ch
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+def schedule_face_analysis(avatar_file: str, avatar_sha256: str) -> Optional[Future]:
+    """Queue the analysis of an avatar in the background; None if it is already cached"""
+    global _executor
+    if os.path.isdir(analysis_dir(avatar_sha256)):
+        return None
+    with _pending_lock:
+        future = _pending.get(avatar_sha256)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FACE_WORKERS, thread_name_prefix="face-analysis")
+        future = _executor.submit(analyze_avatar, avatar_file, avatar_sha256)
+        _pending[avatar_sha256] = future
+
+    def _done(done: Future):
+        with _pending_lock:
+            _pending.pop(avatar_sha256, None)
+        if done.exception() is not None:
+            print(f"ERROR: Face analysis of avatar {avatar_sha256[:12]} failed: {done.exception()}")
+    future.add_done_callback(_done)
+    return future
@@ -0,0 +1,57 @@
+"""
+Conditional GET and compression for JSON reads.
+
+Read endpoints derive a weak ETag from the version counters of the tables
+they read (see `backend/database/table_versions.py`) plus the request URL.
+When the client's If-None-Match still matches, the endpoint answers 304
+without running its query. Otherwise the body is serialised once and
+gzipped when it is large enough and the client accepts gzip.
+
+Versions are read before the data, so a write that lands in between yields
+a body newer than its ETag; the next poll then simply fetches again.
+"""
+
+from typing import Any, Iterable
+import gzip
+import hashlib
+import json
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database.table_versions import aget_table_versions
+
+GZIP_MIN_BYTES = 1024
+CACHE_CONTROL = "no-cache"  # always revalidate; a 304 is nearly free
+
+
+async def read_etag(request: Request, db: AsyncSession, tables: Iterable[str], *extra: Any) -> str:
+    """Weak ETag for a read of `tables` at the request's URL; `extra` adds other inputs (e.g. file stamps)"""
+    versions = await aget_table_versions(db, tables)
+    key = json.dumps([str(request.url.path), str(request.url.query), sorted(versions.items()), [str(e) for e in extra]])
+    return f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag == "*" or tag.removeprefix("W/") == opaque for tag in tags)
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"})
+
+
+def json_response(request: Request, content: Any, etag: str) -> Response:
+    """Serialise `content` (models or plain data) with the ETag, gzipped when worthwhile"""
+    body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", "").lower():
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,301 @@
+"""
+Database-backed queue of heavy jobs for dedicated worker processes.
+
+With `BACKGROUND_JOBS=worker`, speech refinement (llm), speech synthesis
+(tts) and video renders (render) are not run in the API process: the API
+inserts a row into `jobs` and any number of `python -m backend.worker`
+processes claim and run them, so CPU-bound media work never competes with
+request handling and workers scale independently of the API. With the
+default `BACKGROUND_JOBS=inline`, the API keeps running them on its own pools.
+
+A job is claimed with a conditional UPDATE (queued -> running), so several
+workers on one database never run the same job. Running workers refresh
+`heartbeat_at` and progress every `JOB_HEARTBEAT_SECONDS`; a job whose
+heartbeat is older than `JOB_STALE_SECONDS` belonged to a worker that died and
+is queued again, at most `JOB_MAX_ATTEMPTS` times. Handler errors fail the
+job at once; callers such as the pipeline decide whether to retry.
+
+In the API process, `job_future` turns a job into a Future resolved by a
+single polling thread, so callers wait on workers exactly like on the
+in-process pools.
+"""
+
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set
+import datetime
+import importlib
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.database.database import SessionLocal
+from backend.database.models import ACTIVE_JOB_CONDITION, Job
+from backend.database.upsert import insert_ignore
+
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "inline")  # "worker" hands heavy work to backend/worker.py
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# Job type -> "module:function", resolved in the worker.
+# A handler is called as fn(payload, context) and returns a JSON-able result.
+JOB_HANDLERS: Dict[str, str] = {
+    "llm": "backend.services.response_service:run_refine_job",
+    "tts": "backend.services.tts_service:run_speech_job",
+    "render": "backend.services.render_service:run_render_job",
+}
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobFailed(RuntimeError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def use_workers() -> bool:
+    return BACKGROUND_JOBS == "worker"
+
+
+class JobContext:
+    """Handed to job handlers: progress reporting and a cancellation flag, synced by the heartbeat"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.progress: Optional[float] = None
+        self.cancelled = threading.Event()
+
+    def report(self, progress: float) -> None:
+        self.progress = round(min(max(progress, 0.0), 1.0), 3)
+
+
+def resolve_handler(job_type: str) -> Callable:
+    module_name, _, function_name = JOB_HANDLERS[job_type].partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# --- queueing, in the API process ---
+
+def find_job(db: Session, job_type: str, job_key: str) -> Optional[Job]:
+    """The most recent job for a key"""
+    return db.query(Job).filter(Job.job_type == job_type, Job.job_key == job_key).order_by(Job.id.desc()).first()
+
+
+def enqueue_job(db: Session, job_type: str, job_key: str, payload: dict) -> Job:
+    """Queue a job unless the same work is already queued or running"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type '{job_type}'")
+    job = find_job(db, job_type, job_key)
+    if job is not None and job.status in ACTIVE_STATUSES:
+        return job
+    # The partial unique index on active jobs makes this a no-op when another
+    # process queued the same work since the lookup
+    db.execute(insert_ignore(
+        db.get_bind().dialect.name,
+        Job,
+        {
+            "job_type": job_type, "job_key": job_key, "payload": json.dumps(payload), "status": "queued",
+            "attempts": 0, "cancel_requested": False, "created_at": datetime.datetime.utcnow(),
+        },
+        index_elements=["job_type", "job_key"],
+        index_where=text(ACTIVE_JOB_CONDITION),
+    ))
+    db.commit()
+    return find_job(db, job_type, job_key)
+
+
+def request_cancel(db: Session, job_type: str, job_key: str) -> bool:
+    """Cancel a queued job, or ask the worker running it to stop"""
+    job = find_job(db, job_type, job_key)
+    if job is None or job.status not in ACTIVE_STATUSES:
+        return False
+    if job.status == "queued":
+        job.status, job.finished_at = "cancelled", datetime.datetime.utcnow()
+    else:
+        job.cancel_requested = True
+    db.commit()
+    return True
+
+
+def job_status(job: Job) -> Dict[str, object]:
+    return {"status": job.status, "progress": job.progress, "error": job.error}
+
+
+class JobWatcher:
+    """Resolves Futures for jobs run by workers, polling all watched jobs in one query"""
+
+    def __init__(self, interval: float = JOB_POLL_SECONDS):
+        self.interval = interval
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, job_id: int) -> Future:
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is None:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._futures[job_id] = future
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name="job-watcher", daemon=True)
+                self._thread.start()
+        return future
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                job_ids = list(self._futures)
+                if not job_ids:
+                    self._thread = None
+                    return
+            db = SessionLocal()
+            try:
+                finished = db.query(Job.id, Job.status, Job.result, Job.error).filter(
+                    Job.id.in_(job_ids), Job.status.notin_(ACTIVE_STATUSES)
+                ).all()
+            except Exception as e:
+                print(f"WARN: Could not poll jobs: {e}")
+                finished = []
+            finally:
+                db.close()
+            for job_id, status, result, error in finished:
+                with self._lock:
+                    future = self._futures.pop(job_id, None)
+                if future is None:
+                    continue
+                if status == "done":
+                    future.set_result(json.loads(result) if result else None)
+                elif status == "cancelled":
+                    future.set_exception(JobCancelled(f"Job {job_id} was cancelled"))
+                else:
+                    future.set_exception(JobFailed(error or f"Job {job_id} failed"))
+
+
+job_watcher = JobWatcher()
+
+
+def job_future(job: Job, transform: Optional[Callable] = None) -> Future:
+    """A Future for a queued job's result, optionally mapped through `transform`"""
+    future = job_watcher.watch(job.id)
+    if transform is None:
+        return future
+    mapped = Future()
+    mapped.set_running_or_notify_cancel()
+
+    def _done(done: Future):
+        try:
+            mapped.set_result(transform(done.result()))
+        except BaseException as e:
+            mapped.set_exception(e)
+    future.add_done_callback(_done)
+    return mapped
+
+
+def active_job_future(db: Session, job_type: str, job_key: str) -> Optional[Future]:
+    """A Future for the queued or running job of a key, if any"""
+    job = find_job(db, job_type, job_key)
+    if job is None or job.status not in ACTIVE_STATUSES:
+        return None
+    return job_future(job)
+
+
+# --- claiming and running, in worker processes ---
+
+def claim_jobs(db: Session, job_type: str, worker_id: str, limit: int) -> List[Job]:
+    """Atomically take up to `limit` queued jobs of a type, oldest first"""
+    candidates = db.query(Job.id).filter(Job.job_type == job_type, Job.status == "queued").order_by(Job.id).limit(limit * 2).all()
+    claimed = []
+    for (job_id,) in candidates:
+        if len(claimed) == limit:
+            break
+        now = datetime.datetime.utcnow()
+        updated = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+            Job.status: "running",
+            Job.worker_id: worker_id,
+            Job.attempts: Job.attempts + 1,
+            Job.progress: 0.0,
+            Job.started_at: now,
+            Job.heartbeat_at: now,
+        }, synchronize_session=False)
+        db.commit()
+        if updated:
+            claimed.append(job_id)  # another worker may have won the race for the others
+    return db.query(Job).filter(Job.id.in_(claimed)).order_by(Job.id).all() if claimed else []
+
+
+def finish_job(db: Session, job_id: int, worker_id: str, status: str, result=None, error: Optional[str] = None) -> None:
+    db.query(Job).filter(Job.id == job_id, Job.worker_id == worker_id, Job.status == "running").update({
+        Job.status: status,
+        Job.result: json.dumps(result) if result is not None else None,
+        Job.error: error,
+        Job.progress: 1.0 if status == "done" else Job.progress,
+        Job.finished_at: datetime.datetime.utcnow(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def heartbeat(db: Session, worker_id: str, progress: Dict[int, Optional[float]]) -> Set[int]:
+    """Refresh a worker's running jobs; returns the ids of those asked to cancel"""
+    now = datetime.datetime.utcnow()
+    for job_id, value in progress.items():
+        values = {Job.heartbeat_at: now}
+        if value is not None:
+            values[Job.progress] = value
+        db.query(Job).filter(Job.id == job_id, Job.worker_id == worker_id, Job.status == "running").update(values, synchronize_session=False)
+    db.commit()
+    if not progress:
+        return set()
+    return {job_id for (job_id,) in db.query(Job.id).filter(Job.id.in_(list(progress)), Job.cancel_requested.is_(True))}
+
+
+def release_jobs(db: Session, worker_id: str, job_ids: List[int]) -> int:
+    """Hand unfinished jobs back to the queue on shutdown, without counting the attempt"""
+    if not job_ids:
+        return 0
+    released = db.query(Job).filter(Job.id.in_(job_ids), Job.worker_id == worker_id, Job.status == "running").update({
+        Job.status: "queued",
+        Job.worker_id: None,
+        Job.attempts: Job.attempts - 1,
+        Job.progress: None,
+    }, synchronize_session=False)
+    db.commit()
+    return released
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """Queue again the running jobs whose worker stopped sending heartbeats"""
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(seconds=JOB_STALE_SECONDS)
+    stale = db.query(Job).filter(Job.status == "running", Job.heartbeat_at < cutoff)
+    failed = stale.filter(Job.attempts >= JOB_MAX_ATTEMPTS).update({
+        Job.status: "failed",
+        Job.error: f"Worker stopped responding ({JOB_MAX_ATTEMPTS} attempts)",
+        Job.finished_at: now,
+    }, synchronize_session=False)
+    requeued = db.query(Job).filter(Job.status == "running", Job.heartbeat_at < cutoff).update({
+        Job.status: "queued",
+        Job.worker_id: None,
+        Job.progress: None,
+    }, synchronize_session=False)
+    db.commit()
+    if failed or requeued:
+        print(f"WARN: Requeued {requeued} and failed {failed} jobs of unresponsive workers")
+    return requeued
+
+
+def purge_finished_jobs(db: Session) -> int:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=JOB_RETENTION_HOURS)
+    purged = db.query(Job).filter(Job.status.notin_(ACTIVE_STATUSES), Job.finished_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return purged
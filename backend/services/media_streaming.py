@@ -0,0 +1,189 @@
+"""
+Delivery of generated videos: byte ranges, poster frames and HLS.
+
+Videos are served by `GET /media/videos/<key>.mp4` with HTTP range support,
+so a player fetches the MP4 header (written at the front with +faststart)
+and then only the byte ranges it plays or seeks to. Names are content keys,
+so responses are immutable and carry the key as a strong ETag.
+
+When a render finishes, `finish_video` extracts a poster frame (shown by the
+player before any video byte is fetched) and, with `VIDEO_HLS=1`, cuts the MP4
+into an HLS playlist of `HLS_SEGMENT_SECONDS` segments by stream copy.
+"""
+
+from typing import Dict, Iterator, Optional, Tuple
+import os
+import re
+import shutil
+import tempfile
+
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from backend.services.media_tools import STATIC_DIR, MediaToolError, run_ffmpeg
+
+VIDEO_DIR = os.path.join(STATIC_DIR, "videos")
+VIDEO_URL_PREFIX = "/media/videos/"
+HLS_DIR = os.path.join(VIDEO_DIR, "hls")
+HLS_URL_PREFIX = "/static/videos/hls/"
+VIDEO_HLS = os.getenv("VIDEO_HLS", "0").lower() in ("1", "true", "yes")
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))  # a multiple of VIDEO_KEYFRAME_SECONDS
+POSTER_AT_SECONDS = 0.5
+RANGE_CHUNK_SIZE = 256 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {".mp4": "video/mp4", ".jpg": "image/jpeg"}
+_MEDIA_NAME = re.compile(r"^([0-9a-f]{64})(\.mp4|\.jpg)$")
+
+
+def video_file(key: str) -> str:
+    return os.path.join(VIDEO_DIR, f"{key}.mp4")
+
+def video_url(key: str) -> str:
+    return f"{VIDEO_URL_PREFIX}{key}.mp4"
+
+def poster_file(key: str) -> str:
+    return os.path.join(VIDEO_DIR, f"{key}.jpg")
+
+def hls_playlist(key: str) -> str:
+    return os.path.join(HLS_DIR, key, "index.m3u8")
+
+
+def video_links(key: str) -> Dict[str, Optional[str]]:
+    """URLs of a finished video and of whatever delivery variants exist for it"""
+    return {
+        "video_path": video_url(key),
+        "poster_path": f"{VIDEO_URL_PREFIX}{key}.jpg" if os.path.exists(poster_file(key)) else None,
+        "stream_path": f"{HLS_URL_PREFIX}{key}/index.m3u8" if os.path.exists(hls_playlist(key)) else None,
+    }
+
+
+def make_poster(video_path: str, key: str) -> str:
+    """Extract the poster frame of a video (slightly in, past any fade from black)"""
+    path = poster_file(key)
+    if os.path.exists(path):
+        return path
+    fd, tmp_path = tempfile.mkstemp(suffix=".jpg", dir=os.path.dirname(path), prefix=".part-")
+    os.close(fd)
+    try:
+        for offset in (POSTER_AT_SECONDS, 0):
+            try:
+                run_ffmpeg(["-ss", str(offset), "-i", video_path, "-frames:v", "1", "-q:v", "3", tmp_path])
+            except MediaToolError:
+                if offset == 0:
+                    raise
+            if os.path.exists(tmp_path) and os.path.getsize(tmp_path) > 0:
+                break  # a clip shorter than the offset yields no frame; retry from the start
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def make_hls(video_path: str, key: str) -> str:
+    """Segment a video into a VOD HLS playlist by stream copy"""
+    playlist = hls_playlist(key)
+    if os.path.exists(playlist):
+        return playlist
+    os.makedirs(HLS_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=HLS_DIR, prefix=".tmp-")
+    try:
+        run_ffmpeg([
+            "-i", video_path, "-c", "copy", "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(tmp_dir, "segment_%05d.ts"),
+            os.path.join(tmp_dir, "index.m3u8"),
+        ])
+        try:
+            os.rename(tmp_dir, os.path.dirname(playlist))
+        except OSError:
+            if not os.path.exists(playlist):
+                raise
+            shutil.rmtree(tmp_dir)  # segmented concurrently
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return playlist
+
+
+def finish_video(video_path: str, key: str) -> None:
+    """Delivery steps after a video is written; failures only cost the extras, not the video"""
+    try:
+        make_poster(video_path, key)
+        if VIDEO_HLS:
+            make_hls(video_path, key)
+    except MediaToolError as e:
+        print(f"WARN: Post-processing of video {key[:12]} failed: {e}")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte of a single-range `Range` header, None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    units, _, ranges = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in ranges:
+        return None  # other units and multipart ranges are ignored, as RFC 9110 allows
+    start, _, end = (part.strip() for part in ranges.partition("-"))
+    if not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        return None  # malformed: ignore the header
+    if not start:
+        if int(end) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(end)), size - 1
+    first = int(start)
+    if end and int(end) < first:
+        return None  # invalid range: ignore the header
+    if first >= size:
+        raise ValueError("range not satisfiable")
+    last = min(int(end), size - 1) if end else size - 1
+    return first, last
+
+
+def _read_range(path: str, first: int, last: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def media_file_response(request: Request, filename: str) -> Response:
+    """Serve a generated video or poster by name, honouring Range, If-Range and If-None-Match"""
+    match = _MEDIA_NAME.match(filename)
+    path = os.path.join(VIDEO_DIR, filename) if match else None
+    if path is None or not os.path.isfile(path):
+        return Response(status_code=404)
+    size = os.path.getsize(path)
+    etag = f'"{match.group(1)}"'
+    headers = {"accept-ranges": "bytes", "etag": etag, "cache-control": IMMUTABLE_CACHE_CONTROL}
+    media_type = MEDIA_TYPES[match.group(2)]
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+    first, last = byte_range or (0, size - 1)
+    headers["content-length"] = str(last - first + 1)
+    status_code = 200
+    if byte_range is not None:
+        status_code = 206
+        headers["content-range"] = f"bytes {first}-{last}/{size}"
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(_read_range(path, first, last), status_code=status_code, headers=headers, media_type=media_type)
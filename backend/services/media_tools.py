@@ -0,0 +1,108 @@
+"""
+Shared helpers for the audio and video stages: locating ffmpeg, running it,
+and reading/writing the PCM WAV format all speech audio is normalised to.
+"""
+
+from typing import List, Optional, Tuple
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATIC_DIR = os.path.join(PROJECT_ROOT, "frontend", "static")
+MEDIA_DATA_DIR = os.getenv("MEDIA_DATA_DIR", os.path.join(PROJECT_ROOT, "backend", "data", "media"))
+
+# All synthesized speech is mono 16-bit PCM at this rate, so tracks can be
+# joined by concatenating samples and muxed into video without resampling
+PCM_SAMPLE_RATE = int(os.getenv("TTS_SAMPLE_RATE", "22050"))
+PCM_CHANNELS = 1
+PCM_SAMPLE_WIDTH = 2
+
+
+class MediaToolError(RuntimeError):
+    pass
+
+
+def ffmpeg_binary() -> str:
+    """Path of the ffmpeg executable: FFMPEG_BINARY, then PATH, then the one bundled with imageio-ffmpeg (moviepy)"""
+    configured = os.getenv("FFMPEG_BINARY")
+    if configured:
+        return configured
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        raise MediaToolError("ffmpeg not found; install it or set FFMPEG_BINARY")
+
+
+def run_ffmpeg(args: List[str], input_bytes: Optional[bytes] = None) -> bytes:
+    """Run ffmpeg quietly with the given arguments and return its stdout"""
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"]
+    if input_bytes is None:
+        cmd.append("-nostdin")
+    cmd += args
+    result = subprocess.run(cmd, input=input_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise MediaToolError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A temp file per call: pool threads may write the same shared segment at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    """Wrap raw samples in the standard speech WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(PCM_CHANNELS)
+        w.setsampwidth(PCM_SAMPLE_WIDTH)
+        w.setframerate(PCM_SAMPLE_RATE)
+        w.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def audio_to_pcm(data: bytes) -> bytes:
+    """Raw samples of any audio file in the standard speech format.
+
+    WAV input that already matches is unpacked directly; anything else
+    (MP3 from online engines, other rates) is converted once with ffmpeg.
+    """
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            if (w.getnchannels(), w.getsampwidth(), w.getframerate()) == (PCM_CHANNELS, PCM_SAMPLE_WIDTH, PCM_SAMPLE_RATE):
+                return w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        pass
+    return run_ffmpeg([
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(PCM_CHANNELS), "-ar", str(PCM_SAMPLE_RATE),
+        "pipe:1",
+    ], input_bytes=data)
+
+
+def wav_duration(path: str) -> float:
+    with wave.open(path, "rb") as w:
+        return w.getnframes() / float(w.getframerate())
+
+
+def wav_params(path: str) -> Tuple[int, int, int]:
+    with wave.open(path, "rb") as w:
+        return w.getnchannels(), w.getsampwidth(), w.getframerate()
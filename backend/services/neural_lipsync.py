@@ -0,0 +1,242 @@
+"""
+Neural lip-sync (Wav2Lip-style) with batched CPU inference.
+
+The model takes a 16-frame window of an 80-band mel spectrogram per video
+frame, plus a 96x96 face crop with its lower half masked next to the
+unmasked reference, and predicts the lower face for that frame. Running it
+one frame at a time on a CPU spends most of the time in per-call overhead, so
+`LipSyncEngine`:
+
+- runs batches of `LIPSYNC_BATCH_SIZE` frames under `torch.inference_mode`,
+- sets torch's intra-op threads per render worker (`LIPSYNC_THREADS`, by
+  default the cores divided by the render slots the pool actually runs) and
+  a single inter-op thread, so parallel renders do not oversubscribe the cores,
+- fills the same preallocated mel and face tensors for every batch; avatars
+  are stills, so the face batch is filled once per render,
+- yields each batch as soon as it is predicted, and the renderer pastes and
+  pipes it into ffmpeg while the next batch is computed.
+
+The model is loaded from a TorchScript file at `LIPSYNC_CHECKPOINT` (export
+the network with `torch.jit.trace(model, (mel, faces))`); the architecture
+itself is not part of this repository. torch is optional: without it or a
+checkpoint, the "neural" renderer fails with a clear error and the viseme
+renderer remains the default.
+"""
+
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+from backend.services.face_analysis import analyze_avatar, canvas_box, square_box
+from backend.services.render_service import RenderContext, RenderSpec, render_scheduler
+from backend.services.video_encoder import FFmpegVideoWriter, fit_image
+from backend.services.viseme_renderer import load_samples
+
+try:
+    import torch
+except ImportError:  # optional dependency
+    torch = None
+
+LIPSYNC_CHECKPOINT = os.getenv("LIPSYNC_CHECKPOINT", "")
+LIPSYNC_BATCH_SIZE = int(os.getenv("LIPSYNC_BATCH_SIZE", "16"))
+LIPSYNC_THREADS = int(os.getenv("LIPSYNC_THREADS", "0"))  # 0: cores / render slots
+
+# Audio features the Wav2Lip family is trained on
+MEL_SAMPLE_RATE = 16000
+MEL_N_FFT = 800
+MEL_HOP = 200  # 80 mel frames per second
+MEL_BANDS = 80
+MEL_FMIN, MEL_FMAX = 55.0, 7600.0
+MEL_PREEMPHASIS = 0.97
+MEL_MIN_DB, MEL_REF_DB, MEL_MAX_ABS = -100.0, 20.0, 4.0
+MEL_STEP = 16  # mel frames per video frame window
+FACE_SIZE = 96
+
+
+class LipSyncUnavailable(RuntimeError):
+    pass
+
+
+def _hz_to_mel(hz: np.ndarray) -> np.ndarray:
+    """Slaney mel scale: linear below 1 kHz, logarithmic above"""
+    hz = np.asarray(hz, np.float64)
+    linear = hz * 3.0 / 200.0
+    log_part = 15.0 + np.log(np.maximum(hz, 1e-10) / 1000.0) / (np.log(6.4) / 27.0)
+    return np.where(hz >= 1000.0, log_part, linear)
+
+
+def _mel_to_hz(mel: np.ndarray) -> np.ndarray:
+    mel = np.asarray(mel, np.float64)
+    linear = mel * 200.0 / 3.0
+    log_part = 1000.0 * np.exp((mel - 15.0) * (np.log(6.4) / 27.0))
+    return np.where(mel >= 15.0, log_part, linear)
+
+
+@lru_cache(maxsize=4)
+def mel_filterbank(rate: int = MEL_SAMPLE_RATE, n_fft: int = MEL_N_FFT, bands: int = MEL_BANDS) -> np.ndarray:
+    """Slaney-normalised triangular filters, bands x (n_fft // 2 + 1)"""
+    fft_freqs = np.linspace(0, rate / 2, n_fft // 2 + 1)
+    edges = _mel_to_hz(np.linspace(_hz_to_mel(MEL_FMIN), _hz_to_mel(MEL_FMAX), bands + 2))
+    lower = (fft_freqs[None, :] - edges[:-2, None]) / (edges[1:-1] - edges[:-2])[:, None]
+    upper = (edges[2:, None] - fft_freqs[None, :]) / (edges[2:] - edges[1:-1])[:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (edges[2:] - edges[:-2]))[:, None]
+    return weights.astype(np.float32)
+
+
+def mel_spectrogram(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Normalised log-mel spectrogram (bands x frames, values in [-4, 4]) as the model expects"""
+    if rate != MEL_SAMPLE_RATE:
+        positions = np.arange(int(len(samples) * MEL_SAMPLE_RATE / rate)) * (rate / MEL_SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    emphasised = np.append(samples[:1], samples[1:] - MEL_PREEMPHASIS * samples[:-1])
+    padded = np.pad(emphasised, MEL_N_FFT // 2, mode="reflect")
+    frames = np.lib.stride_tricks.sliding_window_view(padded, MEL_N_FFT)[::MEL_HOP]
+    window = np.hanning(MEL_N_FFT + 1)[:-1].astype(np.float32)  # periodic Hann
+    magnitude = np.abs(np.fft.rfft(frames * window, axis=1)).astype(np.float32)
+    mel = mel_filterbank() @ magnitude.T
+    db = 20 * np.log10(np.maximum(1e-5, mel)) - MEL_REF_DB
+    return np.clip(2 * MEL_MAX_ABS * (db - MEL_MIN_DB) / -MEL_MIN_DB - MEL_MAX_ABS, -MEL_MAX_ABS, MEL_MAX_ABS)
+
+
+def mel_windows(mel: np.ndarray, fps: int, frames: Optional[int] = None) -> np.ndarray:
+    """The MEL_STEP-frame mel window of every video frame: N x bands x MEL_STEP float32"""
+    mel_per_second = MEL_SAMPLE_RATE / MEL_HOP
+    if frames is None:
+        frames = max(1, int(mel.shape[1] / mel_per_second * fps))
+    if mel.shape[1] < MEL_STEP:
+        mel = np.pad(mel, ((0, 0), (0, MEL_STEP - mel.shape[1])), constant_values=-MEL_MAX_ABS)
+    starts = np.minimum((np.arange(frames) * mel_per_second / fps).astype(np.int64), mel.shape[1] - MEL_STEP)
+    windows = np.lib.stride_tricks.sliding_window_view(mel, MEL_STEP, axis=1)  # bands x positions x MEL_STEP
+    return np.ascontiguousarray(windows[:, starts].transpose(1, 0, 2), dtype=np.float32)
+
+
+def face_input(face_patch: np.ndarray) -> np.ndarray:
+    """6 x 96 x 96 float32: the face with its lower half masked, then the reference face"""
+    face = cv2.resize(np.asarray(face_patch), (FACE_SIZE, FACE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+    masked = face.copy()
+    masked[FACE_SIZE // 2:] = 0
+    return np.concatenate([masked, face], axis=2).transpose(2, 0, 1)
+
+
+def lipsync_threads() -> int:
+    """Torch threads per render; read when an engine is built, after the worker set its render slots"""
+    return LIPSYNC_THREADS or max(1, (os.cpu_count() or 1) // max(1, render_scheduler.workers))
+
+
+def configure_threads(threads: int) -> None:
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before the first parallel op in the process
+
+
+@lru_cache(maxsize=4)
+def _file_sha256(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_fingerprint(path: str = LIPSYNC_CHECKPOINT) -> str:
+    """Content hash of the model, part of neural render keys; hashed again only when the file changes"""
+    if not path or not os.path.exists(path):
+        return ""
+    stat = os.stat(path)
+    return _file_sha256(path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=2)
+def load_model(path: str = LIPSYNC_CHECKPOINT):
+    """The TorchScript lip-sync network, loaded once per worker process"""
+    if torch is None:
+        raise LipSyncUnavailable("The neural renderer needs torch")
+    if not path or not os.path.exists(path):
+        raise LipSyncUnavailable("Set LIPSYNC_CHECKPOINT to a TorchScript export of the lip-sync model")
+    try:
+        model = torch.jit.load(path, map_location="cpu")
+    except RuntimeError as e:
+        raise LipSyncUnavailable(f"{path} is not a TorchScript model ({e}); export it with torch.jit.trace")
+    return model.eval()
+
+
+class LipSyncEngine:
+    """Batched inference with input tensors allocated once and reused for every batch"""
+
+    def __init__(self, model, batch_size: int = LIPSYNC_BATCH_SIZE, threads: Optional[int] = None):
+        configure_threads(threads or lipsync_threads())
+        self.model = model
+        self.batch_size = batch_size
+        self._mel = torch.empty((batch_size, 1, MEL_BANDS, MEL_STEP), dtype=torch.float32)
+        self._faces = torch.empty((batch_size, 6, FACE_SIZE, FACE_SIZE), dtype=torch.float32)
+
+    def set_face(self, face_patch: np.ndarray) -> None:
+        """Fill every row of the face batch with the (still) avatar's face"""
+        self._faces.copy_(torch.from_numpy(face_input(face_patch)).expand_as(self._faces))
+
+    def run(self, windows: np.ndarray) -> Iterator[np.ndarray]:
+        """Predicted faces for the mel windows, one B x 96 x 96 x 3 uint8 BGR batch at a time"""
+        with torch.inference_mode():
+            for start in range(0, len(windows), self.batch_size):
+                count = min(self.batch_size, len(windows) - start)
+                self._mel[:count, 0].copy_(torch.from_numpy(windows[start:start + count]))
+                predicted = self.model(self._mel[:count], self._faces[:count])
+                yield predicted.permute(0, 2, 3, 1).mul(255).clamp_(0, 255).to(torch.uint8).numpy()
+
+
+def _paste_mask(size: int) -> np.ndarray:
+    """Feathered weights for pasting a predicted face: lower half only, soft edges"""
+    mask = np.zeros((size, size), np.float32)
+    mask[size // 2:, size // 8:size - size // 8] = 1.0
+    mask = cv2.GaussianBlur(mask, (0, 0), max(1.0, size / 24))
+    return mask[:, :, None]
+
+
+class FacePaster:
+    """Composites predicted faces onto the avatar frame, reusing one frame buffer"""
+
+    def __init__(self, base: np.ndarray, box: Tuple[int, int, int, int], batch_size: int):
+        self.base = base
+        self.x, self.y, self.size, _ = box
+        self.mask = _paste_mask(self.size)
+        self.base_region = base[self.y:self.y + self.size, self.x:self.x + self.size].astype(np.float32)
+        self.frames = np.repeat(base[None], batch_size, axis=0)
+
+    def paste(self, faces: np.ndarray) -> np.ndarray:
+        region = self.frames[:len(faces), self.y:self.y + self.size, self.x:self.x + self.size]
+        for index, face in enumerate(faces):
+            resized = cv2.resize(face, (self.size, self.size), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+            region[index] = resized * self.mask + self.base_region * (1.0 - self.mask)
+        return self.frames[:len(faces)]
+
+
+def render_neural(spec: RenderSpec, context: RenderContext) -> None:
+    """Renderer entry point (see render_service.RENDERERS)"""
+    model = load_model()
+    image = cv2.imread(spec.avatar_file, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Could not read avatar {spec.avatar_file}")
+    base = fit_image(image, spec.width, spec.height)
+    face = analyze_avatar(spec.avatar_file, spec.avatar_sha256)
+    box = canvas_box(square_box(face.face_box), face.image_size, spec.width, spec.height)
+
+    samples, rate = load_samples(spec.audio_file)
+    windows = mel_windows(mel_spectrogram(samples, rate), spec.fps, max(1, int(round(len(samples) / rate * spec.fps))))
+    engine = LipSyncEngine(model)
+    engine.set_face(face.face_patch)
+    paster = FacePaster(base, box, engine.batch_size)
+    context.report(0.1)
+
+    done, total = 0, len(windows)
+    with FFmpegVideoWriter(spec.output_path, spec.width, spec.height, spec.fps, audio_path=spec.audio_file) as writer:
+        for faces in engine.run(windows):
+            writer.write_many(paster.paste(faces))
+            done += len(faces)
+            context.report(0.1 + 0.9 * done / total)
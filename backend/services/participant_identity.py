@@ -0,0 +1,149 @@
+"""
+Authoritative participant identity resolution.
+
+Participant names are unique (see `Participant.name`), so a name is a stable
+key. Resolved identities are kept in a bounded, thread-safe LRU cache so the
+ingest path does not query the participants table for names it has already
+seen. Every participant write bumps the PARTICIPANTS table version, so each
+resolve first reads that version (one primary-key lookup) and drops the
+cache when it moved: a participant deleted, renamed or given a new avatar in
+another API process is never served from this one. Within a process the
+participant endpoints also invalidate entries directly, and entries expire
+after a TTL.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.database.models import Participant
+from backend.database.table_versions import PARTICIPANTS, get_table_versions
+from backend.database.upsert import insert_ignore
+
+
+class ParticipantIdentity(NamedTuple):
+    id: int
+    avatar_path: Optional[str]
+    created: bool = False  # inserted by this resolve call; never set on cached identities
+
+
+class ParticipantIdentityCache:
+    """Bounded LRU cache of participant name -> identity with a time-to-live."""
+
+    def __init__(self, maxsize: int = 4096, ttl_seconds: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None  # PARTICIPANTS table version the entries were read at
+
+    def sync(self, version: int) -> None:
+        """Drop every entry unless they were read at this PARTICIPANTS table version"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, name: str) -> Optional[ParticipantIdentity]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[name]
+                return None
+            self._entries.move_to_end(name)
+            return identity
+
+    def put(self, name: str, identity: ParticipantIdentity, version: Optional[int] = None) -> None:
+        """Cache an identity; with `version`, only if the cache is still at that table version"""
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[name] = (identity, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: Optional[str] = None, participant_id: Optional[int] = None) -> None:
+        """Drop the entry for a name and/or any entry pointing at a participant id."""
+        with self._lock:
+            if name is not None:
+                self._entries.pop(name, None)
+            if participant_id is not None:
+                stale = [n for n, (identity, _) in self._entries.items() if identity.id == participant_id]
+                for n in stale:
+                    del self._entries[n]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+participant_identity_cache = ParticipantIdentityCache(
+    maxsize=int(os.getenv("PARTICIPANT_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("PARTICIPANT_CACHE_TTL_SECONDS", "300")),
+)
+
+
+def resolve_participants(
+    db: Session, names: Iterable[str], create_missing: bool = False
+) -> Dict[str, ParticipantIdentity]:
+    """Resolve many participant names at once.
+
+    Cached names cost one table-version lookup; the rest are looked up with a single indexed
+    `IN` query. With `create_missing`, unknown names are inserted in the same
+    transaction (concurrent inserts of the same name are ignored, not errors),
+    and the identities of the rows this call inserted have `created` set.
+    The caller owns the transaction and must commit; if it rolls back instead
+    it must invalidate the names it resolved.
+    """
+    version = get_table_versions(db, [PARTICIPANTS])[PARTICIPANTS]
+    participant_identity_cache.sync(version)
+    resolved: Dict[str, ParticipantIdentity] = {}
+    missing = []
+    for name in dict.fromkeys(names):  # de-duplicate, keep order
+        identity = participant_identity_cache.get(name)
+        if identity is not None:
+            resolved[name] = identity
+        else:
+            missing.append(name)
+
+    if not missing:
+        return resolved
+
+    def _load(batch):
+        rows = db.execute(
+            select(Participant.id, Participant.name, Participant.avatar_path).where(Participant.name.in_(batch))
+        ).all()
+        for row in rows:
+            resolved[row.name] = ParticipantIdentity(row.id, row.avatar_path)
+
+    _load(missing)
+    not_found = [name for name in missing if name not in resolved]
+    created = set()
+    if not_found and create_missing:
+        # One row per statement so the rowcount tells which names this call created
+        dialect_name = db.get_bind().dialect.name
+        for name in not_found:
+            if db.execute(insert_ignore(dialect_name, Participant, {"name": name}, index_elements=["name"])).rowcount:
+                created.add(name)
+        _load(not_found)
+
+    for name in missing:
+        if name in resolved:
+            participant_identity_cache.put(name, resolved[name], version)
+            if name in created:
+                resolved[name] = resolved[name]._replace(created=True)
+    return resolved
+
+
+def resolve_participant(db: Session, name: str, create_missing: bool = False) -> Optional[ParticipantIdentity]:
+    """Resolve a single participant name; see `resolve_participants`."""
+    return resolve_participants(db, [name], create_missing=create_missing).get(name)
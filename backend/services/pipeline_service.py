@@ -0,0 +1,551 @@
+"""
+Event-driven processing pipeline from a finished chat to a ready video.
+
+When a chat is stored (`POST /responses/chat`), the participant's stages run
+as a small DAG on a thread pool:
+
+    refine ──> tts ──┐
+                     ├──> render
+    face_prep ───────┘
+
+face_prep (avatar face analysis) does not depend on the speech, so it runs
+while the speech is still being refined and voiced. Once no participant of the
+project has a run in flight, the project stage `reel` assembles the meeting
+reel from the cached clips.
+
+Every stage first computes a hash of its inputs (the original answers, the
+speech key, the avatar's content hash, the render key, the reel key). Each
+stage's last outcome is stored in `pipeline_stages`; a stage whose inputs
+hash to the same value as its last successful run is not run again, so
+re-triggering a pipeline only redoes what changed. Transient errors are
+retried `PIPELINE_MAX_ATTEMPTS` times with exponential backoff; a ValueError
+means the inputs are unusable and fails the stage at once. Stages that find
+nothing to do (no answers, no avatar) are skipped, and so are the stages
+after them.
+
+Runs are de-duplicated per participant: a trigger arriving while a run is in
+flight queues exactly one follow-up run. The process running a run owns its
+rows and renews a lease on them every `PIPELINE_LEASE_SECONDS` / 3. Every
+API process periodically looks for rows still pending or running whose lease
+lapsed (their process stopped or died), claims them with a conditional UPDATE
+and resumes the run with the options stored on the rows, so with several API
+processes each interrupted run is resumed exactly once.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import datetime
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.database.database import SessionLocal
+from backend.database.models import Participant, PipelineStage, Project, Response
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+PIPELINE_MAX_ATTEMPTS = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "3"))
+PIPELINE_RETRY_SECONDS = float(os.getenv("PIPELINE_RETRY_SECONDS", "2"))
+PIPELINE_ON_CHAT = os.getenv("PIPELINE_ON_CHAT", "1").lower() in ("1", "true", "yes")
+PIPELINE_LEASE_SECONDS = float(os.getenv("PIPELINE_LEASE_SECONDS", "30"))
+
+STAGE_STATUSES = ("pending", "running", "done", "skipped", "failed", "blocked")
+_ACTIVE = ("pending", "running")
+_FINISHED = ("done", "skipped", "failed", "blocked")
+
+
+class StageSkipped(Exception):
+    """A stage has nothing to work on; the stages after it are skipped too"""
+
+
+class StageContext:
+    """What a stage function sees: a session of its own, the run's options and earlier outputs"""
+
+    def __init__(self, db: Session, project_id: int, participant_id: Optional[int], options: Dict[str, Optional[str]], outputs: Dict[str, dict]):
+        self.db = db
+        self.project_id = project_id
+        self.participant_id = participant_id
+        self.options = options
+        self.outputs = outputs
+        self.values: Dict[str, object] = {}  # handed from a stage's inputs() to its run()
+
+    def participant(self) -> Participant:
+        participant = self.db.query(Participant).filter(Participant.id == self.participant_id).first()
+        if participant is None:
+            raise StageSkipped(f"Participant {self.participant_id} no longer exists")
+        return participant
+
+    def project(self) -> Project:
+        project = self.db.query(Project).filter(Project.id == self.project_id).first()
+        if project is None:
+            raise StageSkipped(f"Project {self.project_id} no longer exists")
+        return project
+
+
+class Stage(NamedTuple):
+    name: str
+    after: Tuple[str, ...]
+    inputs: Callable[[StageContext], str]  # hash of everything the output depends on
+    run: Callable[[StageContext], dict]  # the stage's work; returns its JSON output
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Stage functions. Services are imported inside them: the response service pulls
+# in the agent framework, which only the refine stage needs.
+
+def _refine_inputs(ctx: StageContext) -> str:
+    answers = ctx.db.query(Response.question, Response.original_response).filter(
+        Response.participant_id == ctx.participant_id,
+        Response.project_id == ctx.project_id,
+        Response.original_response.isnot(None),
+    ).order_by(Response.created_at, Response.id).all()
+    if not answers:
+        raise StageSkipped("No answers to refine")
+    return _digest([tuple(answer) for answer in answers])
+
+
+def _refine_run(ctx: StageContext) -> dict:
+    from backend.services.job_queue import enqueue_job, job_future, use_workers
+    from backend.services.tts_service import TTSService
+
+    latest = ctx.db.query(Response.id).filter(
+        Response.participant_id == ctx.participant_id, Response.project_id == ctx.project_id
+    ).order_by(Response.created_at.desc(), Response.id.desc()).first()
+    if use_workers():
+        job_future(enqueue_job(ctx.db, "llm", f"refine:{latest.id}", {"response_id": latest.id})).result()
+        ctx.db.expire_all()
+        speech = TTSService(ctx.db).get_speech_text(ctx.participant_id, ctx.project_id)
+    else:
+        from backend.services.response_service import ResponseService
+        speech = ResponseService(ctx.db).refine_response(latest.id)
+    if not speech:
+        raise RuntimeError("Refinement produced no speech")
+    return {"speech_sha256": hashlib.sha256(speech.encode("utf-8")).hexdigest(), "characters": len(speech)}
+
+
+def _tts_inputs(ctx: StageContext) -> str:
+    from backend.services.tts_service import TTS_ENGINE, TTS_VOICE, TTSService, speech_cache_key
+
+    text = TTSService(ctx.db).get_speech_text(ctx.participant_id, ctx.project_id)
+    if not text:
+        raise StageSkipped("No refined speech")
+    ctx.values["text"] = text
+    return speech_cache_key(text, ctx.options["voice"] or TTS_VOICE, ctx.options["engine"] or TTS_ENGINE)
+
+
+def _tts_run(ctx: StageContext) -> dict:
+    from backend.services.tts_service import submit_speech
+
+    audio = submit_speech(ctx.values["text"], ctx.options["voice"], ctx.options["engine"]).result()
+    return {"speech_key": audio.key, "audio_path": audio.path, "duration": audio.duration}
+
+
+def _face_prep_inputs(ctx: StageContext) -> str:
+    from backend.services.avatar_service import AVATAR_DIR, AVATAR_URL_PREFIX, avatar_catalog
+    from backend.services.face_analysis import ANALYSIS_VERSION
+
+    avatar_path = ctx.participant().avatar_path
+    if not avatar_path or not avatar_path.startswith(AVATAR_URL_PREFIX):
+        raise StageSkipped("No uploaded avatar")
+    filename = avatar_path[len(AVATAR_URL_PREFIX):]
+    entry = avatar_catalog.get(filename)
+    if entry is None:
+        raise StageSkipped(f"Avatar {filename} not found")
+    ctx.values["avatar"] = (os.path.join(AVATAR_DIR, filename), entry.sha256)
+    return _digest(entry.sha256, ANALYSIS_VERSION)
+
+
+def _face_prep_run(ctx: StageContext) -> dict:
+    from backend.services.face_analysis import analyze_avatar
+
+    avatar_file, avatar_sha256 = ctx.values["avatar"]
+    return {"avatar_sha256": avatar_sha256, "detected": analyze_avatar(avatar_file, avatar_sha256).detected}
+
+
+def _render_inputs(ctx: StageContext) -> str:
+    from backend.services.render_service import RenderService
+    from backend.services.tts_service import TTSService
+
+    participant = ctx.participant()
+    text = TTSService(ctx.db).get_speech_text(ctx.participant_id, ctx.project_id)
+    spec = RenderService(ctx.db).build_spec(participant, text, ctx.options["voice"], ctx.options["engine"], ctx.options["renderer"])
+    ctx.values["render"] = (participant, spec)
+    return spec.key
+
+
+def _render_run(ctx: StageContext) -> dict:
+    from backend.services.job_queue import JobCancelled
+    from backend.services.render_service import RenderCancelled, RenderService, render_future
+
+    participant, spec = ctx.values["render"]
+    RenderService(ctx.db).request_render(ctx.project_id, participant, spec)
+    job = render_future(spec.key)
+    if job is not None:
+        try:
+            job.result()
+        except (RenderCancelled, JobCancelled):
+            raise StageSkipped("The render was cancelled")
+    if not os.path.exists(spec.output_path):
+        raise RuntimeError(f"Render {spec.key[:12]} finished without a video")
+    return {"render_key": spec.key, "renderer": spec.renderer}
+
+
+def _reel_inputs(ctx: StageContext) -> str:
+    from backend.services.reel_service import ReelService
+
+    try:
+        reel_key, _, _ = ReelService(ctx.db).plan_reel(ctx.project(), ctx.options["voice"], ctx.options["engine"], ctx.options["renderer"])
+    except ValueError as e:
+        raise StageSkipped(str(e))
+    return reel_key
+
+
+def _reel_run(ctx: StageContext) -> dict:
+    from backend.services.reel_service import ReelService, reel_future
+
+    row = ReelService(ctx.db).build_reel(ctx.project(), ctx.options["voice"], ctx.options["engine"], ctx.options["renderer"])
+    job = reel_future(row.reel_key)
+    if job is not None:
+        job.result()
+    return {"reel_key": row.reel_key, "segments": len(json.loads(row.segment_keys))}
+
+
+PARTICIPANT_STAGES: List[Stage] = [
+    Stage("refine", (), _refine_inputs, _refine_run),
+    Stage("face_prep", (), _face_prep_inputs, _face_prep_run),
+    Stage("tts", ("refine",), _tts_inputs, _tts_run),
+    Stage("render", ("tts", "face_prep"), _render_inputs, _render_run),
+]
+PROJECT_STAGES: List[Stage] = [
+    Stage("reel", (), _reel_inputs, _reel_run),
+]
+
+
+def _run_rows(db: Session, project_id: int, participant_id: Optional[int]):
+    query = db.query(PipelineStage).filter(PipelineStage.project_id == project_id)
+    if participant_id is None:
+        return query.filter(PipelineStage.participant_id.is_(None))
+    return query.filter(PipelineStage.participant_id == participant_id)
+
+
+def _stage_row(db: Session, project_id: int, participant_id: Optional[int], stage: str) -> Optional[PipelineStage]:
+    return _run_rows(db, project_id, participant_id).filter(PipelineStage.stage == stage).first()
+
+
+def _save_stage(db: Session, project_id: int, participant_id: Optional[int], stage: str, **fields) -> PipelineStage:
+    row = _stage_row(db, project_id, participant_id, stage)
+    if row is None:
+        row = PipelineStage(project_id=project_id, participant_id=participant_id, stage=stage, attempts=0)
+        db.add(row)
+    for name, value in fields.items():
+        setattr(row, name, value)
+    row.updated_at = datetime.datetime.utcnow()
+    db.commit()
+    return row
+
+
+class PipelineRun:
+    """One pass over a participant's (or a project's) stages"""
+
+    def __init__(self, project_id: int, participant_id: Optional[int], stages: List[Stage], options: Dict[str, Optional[str]]):
+        self.project_id = project_id
+        self.participant_id = participant_id
+        self.stages = {stage.name: stage for stage in stages}
+        self.options = options
+        self.status: Dict[str, str] = {}
+        self.outputs: Dict[str, dict] = {}
+        self.rerun = False  # set when triggered again while in flight
+        self.lock = threading.Lock()
+
+    @property
+    def key(self) -> Tuple[int, Optional[int]]:
+        return self.project_id, self.participant_id
+
+    def describe(self) -> str:
+        who = f"participant {self.participant_id}" if self.participant_id is not None else "project"
+        return f"{who} of project {self.project_id}"
+
+    def ready(self) -> List[Tuple[Stage, Optional[str], Optional[str]]]:
+        """Stages whose dependencies have all finished and have not started, marked running.
+
+        For a stage that cannot run because a dependency did not succeed, also
+        returns its status (skipped or blocked) and why. The caller holds the lock.
+        """
+        ready = []
+        for stage in self.stages.values():
+            if stage.name in self.status or any(self.status.get(dep) not in _FINISHED for dep in stage.after):
+                continue
+            self.status[stage.name] = "running"
+            unmet = [dep for dep in stage.after if self.status[dep] != "done"]
+            if not unmet:
+                ready.append((stage, None, None))
+            elif all(self.status[dep] == "skipped" for dep in unmet):
+                ready.append((stage, "skipped", f"{unmet[0]} was skipped"))
+            else:
+                failed = next(dep for dep in unmet if self.status[dep] != "skipped")
+                ready.append((stage, "blocked", f"{failed} {self.status[failed]}"))
+        return ready
+
+    def finished(self) -> bool:
+        return all(self.status.get(name) in _FINISHED for name in self.stages)
+
+
+class PipelineEngine:
+    def __init__(self, workers: int = PIPELINE_WORKERS):
+        self._workers = workers
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._active: Dict[Tuple[int, Optional[int]], PipelineRun] = {}
+        self._reel_wanted = set()  # projects with a new participant video since their last reel run
+        self._lock = threading.Lock()
+        self._lease_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _lease(self) -> datetime.datetime:
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=PIPELINE_LEASE_SECONDS)
+
+    def trigger(
+        self,
+        project_id: int,
+        participant_id: Optional[int] = None,
+        voice: Optional[str] = None,
+        engine: Optional[str] = None,
+        renderer: Optional[str] = None,
+    ) -> bool:
+        """Run a participant's stages (or, without a participant, the project's); False if one more run was queued behind one in flight"""
+        options = {"voice": voice, "engine": engine, "renderer": renderer}
+        stages = PARTICIPANT_STAGES if participant_id is not None else PROJECT_STAGES
+        with self._lock:
+            active = self._active.get((project_id, participant_id))
+            if active is not None:
+                active.rerun = True
+                active.options = options
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="pipeline")
+            run = PipelineRun(project_id, participant_id, stages, options)
+            self._active[run.key] = run
+
+        db = SessionLocal()
+        try:
+            for name in run.stages:
+                _save_stage(
+                    db, project_id, participant_id, name, status="pending", error=None,
+                    options=json.dumps(options), owner_id=self.owner_id, lease_expires_at=self._lease(),
+                )
+        finally:
+            db.close()
+        print(f"INFO: Pipeline started for {run.describe()}")
+        self._advance(run)
+        return True
+
+    def trigger_project(self, project_id: int, **options) -> int:
+        """Run the stages of every participant of a project; the reel follows when they finish"""
+        from backend.database.models import ProjectParticipant
+
+        db = SessionLocal()
+        try:
+            participant_ids = [row.participant_id for row in db.query(ProjectParticipant.participant_id).filter(ProjectParticipant.project_id == project_id)]
+        finally:
+            db.close()
+        for participant_id in participant_ids:
+            self.trigger(project_id, participant_id, **options)
+        return len(participant_ids)
+
+    def _advance(self, run: PipelineRun) -> None:
+        with run.lock:
+            ready = run.ready()
+        for stage, status, reason in ready:
+            if status is None:
+                self._executor.submit(self._execute, run, stage)
+            else:
+                self._finish_stage(run, stage, status, reason)
+
+    def _execute(self, run: PipelineRun, stage: Stage) -> None:
+        db = SessionLocal()
+        status, error, output = "failed", None, None
+        try:
+            ctx = StageContext(db, run.project_id, run.participant_id, run.options, dict(run.outputs))
+            try:
+                input_hash = stage.inputs(ctx)
+            except StageSkipped as e:
+                status, error = "skipped", str(e)
+                return
+            except Exception as e:
+                status, error = "failed", f"Could not read inputs: {e}"
+                return
+
+            previous = _stage_row(db, run.project_id, run.participant_id, stage.name)
+            if previous is not None and previous.input_hash == input_hash and previous.output is not None:
+                # Inputs unchanged since the last successful run (starting an attempt clears the output)
+                status, output = "done", json.loads(previous.output)
+                return
+
+            for attempt in range(1, PIPELINE_MAX_ATTEMPTS + 1):
+                _save_stage(db, run.project_id, run.participant_id, stage.name, status="running", input_hash=input_hash, attempts=attempt, output=None, error=None)
+                started = time.perf_counter()
+                try:
+                    output = stage.run(ctx)
+                    status, error = "done", None  # drop the error of a failed earlier attempt
+                    print(f"INFO: Pipeline stage {stage.name} for {run.describe()} done in {time.perf_counter() - started:.1f}s")
+                    return
+                except StageSkipped as e:
+                    status, error = "skipped", str(e)
+                    return
+                except ValueError as e:
+                    status, error = "failed", str(e)  # unusable inputs: retrying cannot help
+                    return
+                except Exception as e:
+                    status, error = "failed", str(e) or type(e).__name__
+                    if attempt < PIPELINE_MAX_ATTEMPTS:
+                        delay = PIPELINE_RETRY_SECONDS * 2 ** (attempt - 1)
+                        print(f"WARN: Pipeline stage {stage.name} for {run.describe()} failed (attempt {attempt}), retrying in {delay:.0f}s: {error}")
+                        db.rollback()
+                        time.sleep(delay)
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            try:
+                db.rollback()
+                fields = {"status": status, "error": error}
+                if status == "done":
+                    fields["output"] = json.dumps(output)
+                _save_stage(db, run.project_id, run.participant_id, stage.name, **fields)
+            except Exception as e:
+                print(f"ERROR: Could not record pipeline stage {stage.name} for {run.describe()}: {e}")
+            finally:
+                db.close()
+            self._finish_stage(run, stage, status, error, output, persisted=True)
+
+    def _finish_stage(self, run: PipelineRun, stage: Stage, status: str, error: Optional[str], output: Optional[dict] = None, persisted: bool = False) -> None:
+        if not persisted:
+            db = SessionLocal()
+            try:
+                _save_stage(db, run.project_id, run.participant_id, stage.name, status=status, error=error)
+            finally:
+                db.close()
+        if status == "failed":
+            print(f"ERROR: Pipeline stage {stage.name} for {run.describe()} failed: {error}")
+        with run.lock:
+            run.status[stage.name] = status
+            if output is not None:
+                run.outputs[stage.name] = output
+            finished = run.finished()
+        if finished:
+            self._finish_run(run)
+        else:
+            self._advance(run)
+
+    def _finish_run(self, run: PipelineRun) -> None:
+        with self._lock:
+            self._active.pop(run.key, None)
+            start_reel = False
+            if run.participant_id is not None:
+                if run.status.get("render") == "done":
+                    self._reel_wanted.add(run.project_id)
+                # The reel waits for the last participant run of the project in flight
+                if not run.rerun and run.project_id in self._reel_wanted and not any(
+                    project_id == run.project_id and participant_id is not None for project_id, participant_id in self._active
+                ):
+                    self._reel_wanted.discard(run.project_id)
+                    start_reel = True
+        print(f"INFO: Pipeline finished for {run.describe()}: {', '.join(f'{name} {status}' for name, status in run.status.items())}")
+        if run.rerun:
+            self.trigger(run.project_id, run.participant_id, **run.options)
+        elif start_reel:
+            self.trigger(run.project_id, None, **run.options)
+
+    def stages(self, db: Session, project_id: int) -> List[PipelineStage]:
+        return db.query(PipelineStage).filter(PipelineStage.project_id == project_id).order_by(
+            PipelineStage.participant_id, PipelineStage.id
+        ).all()
+
+    def resume(self) -> int:
+        """Resume the runs whose owner is gone, and keep doing so; called once at startup"""
+        if self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name="pipeline-lease", daemon=True)
+            self._lease_thread.start()
+        return self._resume_orphans()
+
+    def _lease_loop(self) -> None:
+        while not self._stopping.wait(PIPELINE_LEASE_SECONDS / 3):
+            try:
+                self._renew_leases()
+                self._resume_orphans()
+            except Exception as e:
+                print(f"WARN: Pipeline lease upkeep failed: {e}")
+
+    def _renew_leases(self) -> None:
+        with self._lock:
+            keys = list(self._active)
+        if not keys:
+            return
+        db = SessionLocal()
+        try:
+            lease = self._lease()
+            for project_id, participant_id in keys:
+                _run_rows(db, project_id, participant_id).filter(PipelineStage.owner_id == self.owner_id).update(
+                    {PipelineStage.lease_expires_at: lease}, synchronize_session=False
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    def _resume_orphans(self) -> int:
+        """Claim and restart the unfinished runs whose owner's lease lapsed"""
+        db = SessionLocal()
+        resumed = []
+        try:
+            now = datetime.datetime.utcnow()
+            orphaned = or_(PipelineStage.owner_id.is_(None), PipelineStage.lease_expires_at.is_(None), PipelineStage.lease_expires_at < now)
+            keys = {
+                (row.project_id, row.participant_id)
+                for row in db.query(PipelineStage.project_id, PipelineStage.participant_id).filter(PipelineStage.status.in_(_ACTIVE), orphaned)
+            }
+            for project_id, participant_id in sorted(keys, key=lambda key: (key[0], key[1] is None, key[1] or 0)):
+                # Conditional claim: only one process wins an orphaned run
+                claimed = _run_rows(db, project_id, participant_id).filter(PipelineStage.status.in_(_ACTIVE), orphaned).update(
+                    {PipelineStage.owner_id: self.owner_id, PipelineStage.lease_expires_at: self._lease()}, synchronize_session=False
+                )
+                db.commit()
+                if claimed:
+                    row = _run_rows(db, project_id, participant_id).filter(PipelineStage.options.isnot(None)).first()
+                    options = json.loads(row.options) if row is not None else {}
+                    resumed.append((project_id, participant_id, options))
+        finally:
+            db.close()
+        for project_id, participant_id, options in resumed:
+            self.trigger(project_id, participant_id, **options)
+        if resumed:
+            print(f"INFO: Resumed {len(resumed)} interrupted pipeline runs")
+        return len(resumed)
+
+    def shutdown(self) -> None:
+        """Stop, and hand this process's unfinished runs to the other API processes at once"""
+        self._stopping.set()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        db = SessionLocal()
+        try:
+            db.query(PipelineStage).filter(PipelineStage.owner_id == self.owner_id, PipelineStage.status.in_(_ACTIVE)).update(
+                {PipelineStage.owner_id: None, PipelineStage.lease_expires_at: None}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            print(f"WARN: Could not release pipeline runs: {e}")
+        finally:
+            db.close()
+
+
+pipeline = PipelineEngine()
@@ -0,0 +1,359 @@
+"""
+Meeting reels: one video per project for the retro meeting.
+
+A reel is a sequence of segments - a title card with the summary's title and
+key themes, then for every participant a name card and their avatar video,
+and a closing card with the action items. Participant videos are requested
+from the render pool all at once, so they render in parallel; cards are
+small silent clips encoded with the same settings.
+
+Because every segment is encoded by `video_encoder` with identical stream
+parameters, the reel is joined with ffmpeg's concat demuxer and stream copy
+(no re-encoding). The stream parameters are still compared first, and the
+reel falls back to a re-encode if a segment differs.
+
+Every segment is cached under its own key (cards by their text, clips by
+their render key), and the reel by the list of segment keys. When one
+participant's avatar or speech changes, only that clip is rendered again;
+the rebuild is then just a stream copy of cached segments.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import datetime
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.database.database import SessionLocal
+from backend.database.models import MeetingReel, Participant, Project, ProjectParticipant
+from backend.services.archive_service import read_summary
+from backend.services.media_tools import MEDIA_DATA_DIR, MediaToolError, ffmpeg_binary, run_ffmpeg
+from backend.services.media_streaming import finish_video, video_file, video_url
+from backend.services.render_service import INTERRUPTED_ERROR, RenderService, RenderSpec, render_future
+from backend.services.tts_service import TTSService
+from backend.services.video_encoder import VIDEO_FPS, VIDEO_SIZE, FFmpegVideoWriter, encoder_fingerprint, output_args
+
+CARD_DIR = os.path.join(MEDIA_DATA_DIR, "cards")
+CARD_SECONDS = float(os.getenv("REEL_CARD_SECONDS", "3"))
+PARTICIPANT_CARD_SECONDS = float(os.getenv("REEL_PARTICIPANT_CARD_SECONDS", "1.5"))
+CARD_MAX_LINES = 6
+REEL_VERSION = 1
+CARD_VERSION = 1
+
+
+class TitleCard(NamedTuple):
+    heading: str
+    lines: Tuple[str, ...]
+    seconds: float
+
+
+class Segment(NamedTuple):
+    key: str
+    path: str
+    card: Optional[TitleCard] = None  # None for participant clips
+
+
+def _markdown_items(markdown: str) -> List[str]:
+    """Bullet or numbered items of a markdown block; its non-empty lines if it has none"""
+    lines = [line.strip() for line in (markdown or "").splitlines() if line.strip()]
+    items = [re.sub(r"^([-*+]|\d+[.)])\s+", "", line) for line in lines if re.match(r"^([-*+]|\d+[.)])\s+", line)]
+    items = items or [line.lstrip("#").strip() for line in lines]
+    return [re.sub(r"[*_`]", "", item) for item in items if item]
+
+
+def card_key(card: TitleCard, width: int = VIDEO_SIZE, height: int = VIDEO_SIZE, fps: int = VIDEO_FPS) -> str:
+    payload = json.dumps([CARD_VERSION, card.heading, list(card.lines), card.seconds, width, height, fps, encoder_fingerprint()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _card_file(key: str) -> str:
+    return os.path.join(CARD_DIR, key[:2], f"{key}.mp4")
+
+
+def _wrap(text: str, scale: float, thickness: int, max_width: int) -> List[str]:
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and cv2.getTextSize(candidate, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)[0][0] > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+def draw_card(card: TitleCard, width: int, height: int) -> np.ndarray:
+    """The still frame of a title card"""
+    frame = np.full((height, width, 3), (48, 32, 24), np.uint8)
+    unit = width / 512
+    margin = int(32 * unit)
+    y = int(height * 0.22)
+    for line in _wrap(card.heading, 1.0 * unit, max(1, int(2 * unit)), width - 2 * margin)[:3]:
+        cv2.putText(frame, line, (margin, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0 * unit, (255, 255, 255), max(1, int(2 * unit)), cv2.LINE_AA)
+        y += int(40 * unit)
+    y += int(16 * unit)
+    wrapped = [wrapped_line for line in card.lines for wrapped_line in _wrap(f"- {line}", 0.55 * unit, 1, width - 2 * margin)]
+    for line in wrapped[:CARD_MAX_LINES * 2]:
+        cv2.putText(frame, line, (margin, y), cv2.FONT_HERSHEY_SIMPLEX, 0.55 * unit, (215, 220, 225), 1, cv2.LINE_AA)
+        y += int(26 * unit)
+    return frame
+
+
+def render_card(card: TitleCard, path: str, width: int = VIDEO_SIZE, height: int = VIDEO_SIZE, fps: int = VIDEO_FPS) -> str:
+    """Encode a title card as a silent clip (cached by its key)"""
+    if os.path.exists(path):
+        return path
+    frame = draw_card(card, width, height)
+    with FFmpegVideoWriter(path, width, height, fps) as writer:
+        for _ in range(max(1, int(round(card.seconds * fps)))):
+            writer.write(frame)
+    return path
+
+
+_STREAM = re.compile(r"Stream #\d+:\d+.*?: (Video|Audio): (\w+)(.*)")
+
+def stream_signature(path: str) -> Tuple[str, ...]:
+    """Codec and format of each stream in a file, as far as stream copy cares"""
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-nostdin", "-i", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    signature = []
+    for kind, codec, rest in _STREAM.findall(result.stderr.decode("utf-8", "replace")):
+        if kind == "Video":
+            size = re.search(r"(\d{2,5}x\d{2,5})", rest)
+            pix_fmt = re.search(r", (yuv\w+|nv12|rgb\w+)", rest)
+            fps = re.search(r"([\d.]+) fps", rest)
+            details = [m.group(1) if m else "" for m in (size, pix_fmt, fps)]
+        else:
+            rate = re.search(r"(\d+) Hz", rest)
+            layout = re.search(r"Hz, (\w+)", rest)
+            details = [m.group(1) if m else "" for m in (rate, layout)]
+        signature.append(":".join([kind, codec] + details))
+    if not signature:
+        raise MediaToolError(f"Could not read the streams of {path}")
+    return tuple(signature)
+
+
+def concat_segments(paths: List[str], output_path: str) -> bool:
+    """Join clips into output_path; returns True if stream copy was possible"""
+    signatures = {stream_signature(path) for path in paths}
+    copy = len(signatures) == 1
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    fd, list_path = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(output_path), prefix=".concat-")
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(output_path), prefix=".part-")
+    os.close(tmp_fd)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        args = ["-f", "concat", "-safe", "0", "-i", list_path]
+        if copy:
+            args += ["-c", "copy", "-movflags", "+faststart", tmp_path]
+        else:
+            print(f"WARN: Reel segments differ in format ({len(signatures)} kinds), re-encoding {output_path}")
+            args += output_args(tmp_path)
+        run_ffmpeg(args)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_path)
+    finally:
+        os.remove(list_path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return copy
+
+
+def reel_cache_key(segment_keys: List[str]) -> str:
+    return hashlib.sha256(json.dumps([REEL_VERSION] + segment_keys).encode("utf-8")).hexdigest()
+
+
+def assemble_reel(reel_key: str, segments: List[Segment], clip_jobs: List[Future]) -> str:
+    """Wait for the clips, encode missing cards and join everything; runs on the reel thread"""
+    output_path = video_file(reel_key)
+    if os.path.exists(output_path):
+        finish_video(output_path, reel_key)
+        return output_path
+    for segment in segments:
+        if segment.card is not None:
+            render_card(segment.card, segment.path)
+    wait(clip_jobs)
+    for job in clip_jobs:
+        job.result()  # a failed or cancelled clip fails the reel
+    missing = [segment.key for segment in segments if not os.path.exists(segment.path)]
+    if missing:
+        raise MediaToolError(f"Reel segments missing: {', '.join(key[:12] for key in missing)}")
+    copied = concat_segments([segment.path for segment in segments], output_path)
+    finish_video(output_path, reel_key)
+    print(f"INFO: Assembled reel {reel_key[:12]} from {len(segments)} segments ({'stream copy' if copied else 're-encoded'})")
+    return output_path
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+def _record_reel(reel_key: str, error: Optional[BaseException]) -> None:
+    db = SessionLocal()
+    try:
+        db.query(MeetingReel).filter(MeetingReel.reel_key == reel_key, or_(
+            MeetingReel.status == "pending", MeetingReel.error == INTERRUPTED_ERROR,
+        )).update({
+            MeetingReel.status: "ready" if error is None else "failed",
+            MeetingReel.error: None if error is None else str(error),
+            MeetingReel.updated_at: datetime.datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def submit_reel(reel_key: str, segments: List[Segment], clip_jobs: List[Future]) -> Future:
+    """Queue assembly of a reel; a reel with the same key already in flight is shared"""
+    global _executor
+    with _pending_lock:
+        future = _pending.get(reel_key)
+        if future is not None:
+            return future
+        if _executor is None:
+            # Assembly mostly waits on the render pool and ffmpeg
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="reel")
+        future = _executor.submit(assemble_reel, reel_key, segments, clip_jobs)
+        _pending[reel_key] = future
+
+    def _done(done: Future):
+        with _pending_lock:
+            _pending.pop(reel_key, None)
+        error = done.exception()
+        if error is not None:
+            print(f"ERROR: Reel {reel_key[:12]} failed: {error}")
+        _record_reel(reel_key, error)
+    future.add_done_callback(_done)
+    return future
+
+
+def reel_future(reel_key: str) -> Optional[Future]:
+    """The in-flight assembly of a reel, if any"""
+    with _pending_lock:
+        return _pending.get(reel_key)
+
+
+def recover_interrupted_reels(started_at: datetime.datetime) -> int:
+    """At startup: fail the reels a previous run left pending (assembly runs in the API process)"""
+    db = SessionLocal()
+    try:
+        rows = db.query(MeetingReel).filter(MeetingReel.status == "pending", MeetingReel.updated_at < started_at).all()
+        failed = 0
+        for row in rows:
+            if os.path.exists(video_file(row.reel_key)):
+                row.status = "ready"
+            else:
+                row.status, row.error = "failed", INTERRUPTED_ERROR
+                failed += 1
+            row.updated_at = datetime.datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+    if failed:
+        print(f"WARN: Marked {failed} reels interrupted by a restart as failed")
+    return failed
+
+
+class ReelService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _cards(self, project: Project) -> Tuple[TitleCard, Optional[TitleCard]]:
+        summary = read_summary(project.id) or {}
+        themes = _markdown_items(summary.get("key_themes", ""))[:CARD_MAX_LINES]
+        opening = TitleCard(summary.get("title") or project.name, tuple(themes), CARD_SECONDS)
+        actions = [item.get("description", "") for item in summary.get("action_items") or []][:CARD_MAX_LINES]
+        closing = TitleCard("Action items", tuple(a for a in actions if a), CARD_SECONDS) if actions else None
+        return opening, closing
+
+    def plan_reel(
+        self,
+        project: Project,
+        voice: Optional[str] = None,
+        engine: Optional[str] = None,
+        renderer: Optional[str] = None,
+    ) -> Tuple[str, List[Segment], List[Tuple[Participant, RenderSpec]]]:
+        """The reel's key, its segments and the participant renders it needs, without queueing anything"""
+        participants = self.db.query(Participant).join(
+            ProjectParticipant, ProjectParticipant.participant_id == Participant.id
+        ).filter(ProjectParticipant.project_id == project.id).order_by(ProjectParticipant.joined_at, ProjectParticipant.id).all()
+
+        renders, tts = RenderService(self.db), TTSService(self.db)
+        opening, closing = self._cards(project)
+        segments = [Segment(card_key(opening), _card_file(card_key(opening)), opening)]
+        specs = []
+        for participant in participants:
+            text = tts.get_speech_text(participant.id, project.id)
+            if not text:
+                continue
+            try:
+                spec = renders.build_spec(participant, text, voice, engine, renderer)
+            except ValueError as e:
+                print(f"WARN: Leaving {participant.name} out of the reel of project {project.id}: {e}")
+                continue
+            name_card = TitleCard(participant.name, (), PARTICIPANT_CARD_SECONDS)
+            segments.append(Segment(card_key(name_card), _card_file(card_key(name_card)), name_card))
+            segments.append(Segment(spec.key, spec.output_path))
+            specs.append((participant, spec))
+        if closing is not None:
+            segments.append(Segment(card_key(closing), _card_file(card_key(closing)), closing))
+        if not specs:
+            raise ValueError("No participant in this project has both an avatar and a refined speech")
+
+        return reel_cache_key([segment.key for segment in segments]), segments, specs
+
+    def build_reel(
+        self,
+        project: Project,
+        voice: Optional[str] = None,
+        engine: Optional[str] = None,
+        renderer: Optional[str] = None,
+    ) -> MeetingReel:
+        """Request every participant's video and queue the reel; cached segments are reused"""
+        reel_key, segments, specs = self.plan_reel(project, voice, engine, renderer)
+        renders = RenderService(self.db)
+        segment_keys = [segment.key for segment in segments]
+        cached = os.path.exists(video_file(reel_key))
+
+        clip_jobs = []
+        if not cached:
+            for participant, spec in specs:
+                renders.request_render(project.id, participant, spec)
+                job = render_future(spec.key)
+                if job is not None:
+                    clip_jobs.append(job)
+
+        row = self.get_reel(project.id)
+        if row is None:
+            row = MeetingReel(project_id=project.id)
+            self.db.add(row)
+        row.reel_key = reel_key
+        row.segment_keys = json.dumps(segment_keys)
+        row.status = "ready" if cached else "pending"
+        row.video_path = video_url(reel_key)
+        row.error = None
+        row.updated_at = datetime.datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(row)
+
+        if not cached:
+            submit_reel(reel_key, segments, clip_jobs)
+        return row
+
+    def get_reel(self, project_id: int) -> Optional[MeetingReel]:
+        return self.db.query(MeetingReel).filter(MeetingReel.project_id == project_id).first()
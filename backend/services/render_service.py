@@ -0,0 +1,457 @@
+"""
+Avatar video rendering on a separate process pool.
+
+A render takes a participant's avatar and speech and produces an MP4 in
+frontend/static/videos, plus its poster frame (see media_streaming.py). Renders run in worker processes (`RENDER_WORKERS`),
+so CPU-heavy frame work never competes with the API event loop for the GIL.
+
+Outputs are cached by a key hashing the avatar's content hash, the speech
+input (text, voice, engine), the renderer and the output settings, so
+repeating a render is free and changing either input yields a new key. The
+`video_renders` table remembers each participant's current render per
+project; when an avatar or a speech changes, exactly the rows built from the
+old input are marked stale.
+
+Progress and cancellation cross the process boundary through a shared
+`multiprocessing.Manager` dict: renderers call `RenderContext.report()`,
+which publishes progress and raises `RenderCancelled` once a cancel was
+requested.
+"""
+
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError
+from typing import Callable, Dict, NamedTuple, Optional
+import datetime
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import threading
+
+import cv2
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.database.database import SessionLocal
+from backend.database.models import Participant, VideoRender
+from backend.services.job_queue import (
+    JobCancelled, JobContext, active_job_future, enqueue_job, find_job, job_future, request_cancel, use_workers,
+)
+from backend.services.media_streaming import finish_video, video_file, video_links, video_url
+from backend.services.video_encoder import VIDEO_FPS, VIDEO_SIZE, FFmpegVideoWriter, encoder_fingerprint, fit_image
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+DEFAULT_RENDERER = os.getenv("VIDEO_RENDERER", "viseme")
+
+# Renderer name -> "module:function", resolved inside the worker process.
+# A renderer is called as fn(spec, context) and must write spec.output_path.
+RENDERERS: Dict[str, str] = {
+    "still": "backend.services.render_service:render_still",
+    "viseme": "backend.services.viseme_renderer:render_viseme",
+    "neural": "backend.services.neural_lipsync:render_neural",
+}
+# Renderer name -> "module:function" returning a fingerprint of what its output
+# depends on besides the code (a model checkpoint), folded into the render key
+RENDERER_FINGERPRINTS: Dict[str, str] = {
+    "neural": "backend.services.neural_lipsync:checkpoint_fingerprint",
+}
+# Bump a renderer's version when its output changes, so cached videos are re-rendered
+RENDERER_VERSIONS: Dict[str, int] = {
+    "still": 1,
+    "viseme": 1,
+    "neural": 1,
+}
+
+RENDER_STATUSES = ("pending", "rendering", "ready", "failed", "cancelled", "stale")
+# Error of renders and reels left pending by a previous run of the API (see recover_interrupted_renders)
+INTERRUPTED_ERROR = "Interrupted by an API restart; request it again"
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderSpec(NamedTuple):
+    key: str
+    avatar_file: str
+    avatar_sha256: str
+    speech_text: str
+    voice: Optional[str]
+    engine: Optional[str]
+    renderer: str
+    width: int
+    height: int
+    fps: int
+    output_path: str
+    audio_file: Optional[str] = None  # set in the worker once the speech is voiced
+
+
+def render_cache_key(
+    avatar_sha256: str, speech_key: str, renderer: str, width: int = VIDEO_SIZE, height: int = VIDEO_SIZE, fps: int = VIDEO_FPS
+) -> str:
+    fingerprint = _resolve(RENDERER_FINGERPRINTS[renderer])() if renderer in RENDERER_FINGERPRINTS else None
+    payload = json.dumps([avatar_sha256, speech_key, renderer, RENDERER_VERSIONS.get(renderer, 0), width, height, fps, encoder_fingerprint()])
+    if fingerprint is not None:
+        payload = json.dumps([payload, fingerprint])  # keys of renderers without one are unchanged
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _resolve(target: str) -> Callable:
+    module_name, _, function_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# --- running inside worker processes ---
+
+class RenderContext:
+    """Handed to renderers: progress reporting and cooperative cancellation"""
+
+    def __init__(self, key: str, shared):
+        self.key = key
+        self._shared = shared
+
+    def report(self, progress: float) -> None:
+        if self._shared is None:
+            return
+        if self._shared.get(("cancel", self.key)):
+            raise RenderCancelled(self.key)
+        self._shared[("progress", self.key)] = round(min(max(progress, 0.0), 1.0), 3)
+
+
+def _resolve_renderer(name: str) -> Callable:
+    return _resolve(RENDERERS[name])
+
+
+def execute_render(spec: RenderSpec, shared=None) -> str:
+    """Worker entry point: voice the speech (cached), then run the renderer"""
+    from backend.services.tts_service import synthesize_speech
+
+    context = RenderContext(spec.key, shared)
+    context.report(0.0)
+    if os.path.exists(spec.output_path):
+        finish_video(spec.output_path, spec.key)
+        return spec.output_path
+    speech = synthesize_speech(spec.speech_text, spec.voice, spec.engine)
+    context.report(0.05)
+    _resolve_renderer(spec.renderer)(spec._replace(audio_file=speech.file_path), context)
+    finish_video(spec.output_path, spec.key)
+    context.report(1.0)
+    return spec.output_path
+
+
+def render_still(spec: RenderSpec, context: RenderContext) -> None:
+    """The avatar as a still picture over the speech"""
+    from backend.services.media_tools import wav_duration
+
+    image = cv2.imread(spec.avatar_file, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Could not read avatar {spec.avatar_file}")
+    frame = fit_image(image, spec.width, spec.height)
+    total = max(1, int(round(wav_duration(spec.audio_file) * spec.fps)))
+    with FFmpegVideoWriter(spec.output_path, spec.width, spec.height, spec.fps, audio_path=spec.audio_file) as writer:
+        for index in range(total):
+            writer.write(frame)
+            if index % spec.fps == 0:
+                context.report(0.05 + 0.95 * index / total)
+
+
+# --- scheduling in the API process ---
+
+def _init_render_process(workers: int) -> None:
+    """Spawned processes re-import this module; give them the pool's real slot count"""
+    render_scheduler.workers = workers
+
+
+class RenderScheduler:
+    """Owns the process pool and the shared progress/cancel state"""
+
+    def __init__(self, workers: int = RENDER_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._shared = None
+        self._jobs: Dict[str, Future] = {}
+        self._outcomes: Dict[str, tuple] = {}  # key -> (status, error) of finished unsuccessful renders
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._shared = self._manager.dict()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_init_render_process, initargs=(self.workers,)
+            )
+
+    def submit(self, spec: RenderSpec, on_done: Optional[Callable[[str, Optional[BaseException]], None]] = None) -> Future:
+        """Queue a render; a render with the same key already in flight is shared"""
+        with self._lock:
+            future = self._jobs.get(spec.key)
+            if future is not None:
+                return future
+            self._ensure_started()
+            self._shared.pop(("cancel", spec.key), None)
+            self._shared[("progress", spec.key)] = 0.0
+            self._outcomes.pop(spec.key, None)
+            future = self._executor.submit(execute_render, spec, self._shared)
+            self._jobs[spec.key] = future
+
+        def _done(done: Future):
+            error = RenderCancelled(spec.key) if done.cancelled() else done.exception()
+            with self._lock:
+                self._jobs.pop(spec.key, None)
+                if isinstance(error, RenderCancelled):
+                    self._outcomes[spec.key] = ("cancelled", None)
+                elif error is not None:
+                    print(f"ERROR: Render {spec.key} failed: {error}")
+                    self._outcomes[spec.key] = ("failed", str(error) or type(error).__name__)
+            if on_done is not None:
+                on_done(spec.key, error)
+        future.add_done_callback(_done)
+        return future
+
+    def future(self, key: str) -> Optional[Future]:
+        """The in-flight render for a key, if any"""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key: str) -> bool:
+        """Cancel a queued render, or ask a running one to stop at its next progress report"""
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None:
+                return False
+            if not future.cancel():
+                self._shared[("cancel", key)] = True
+            return True
+
+    def status(self, key: str) -> Dict[str, object]:
+        if os.path.exists(video_file(key)):
+            return {"status": "ready", "progress": 1.0, "error": None, **video_links(key)}
+        with self._lock:
+            if key in self._jobs:
+                progress = self._shared.get(("progress", key), 0.0)
+                return {"status": "rendering" if progress > 0 else "pending", "progress": progress, "video_path": None, "error": None}
+            if key in self._outcomes:
+                status, error = self._outcomes[key]
+                return {"status": status, "progress": None, "video_path": None, "error": error}
+        return {"status": "unknown", "progress": None, "video_path": None, "error": None}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._manager.shutdown()
+                self._executor = None
+
+
+render_scheduler = RenderScheduler()
+
+
+def _record_outcome(key: str, error: Optional[BaseException]) -> None:
+    """Persist a finished render's outcome; runs on the scheduler's callback thread"""
+    db = SessionLocal()
+    try:
+        status = "ready" if error is None else ("cancelled" if isinstance(error, RenderCancelled) else "failed")
+        # A row marked interrupted at another process's startup may still have been rendering here
+        db.query(VideoRender).filter(VideoRender.render_key == key, or_(
+            VideoRender.status.in_(("pending", "rendering")), VideoRender.error == INTERRUPTED_ERROR,
+        )).update({
+            VideoRender.status: status,
+            VideoRender.error: None if error is None or status == "cancelled" else str(error),
+            VideoRender.updated_at: datetime.datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def recover_interrupted_renders(started_at: datetime.datetime) -> int:
+    """At startup: fail the pending renders of a previous run, so clients see they must ask again.
+
+    Rows whose video exists become ready; with workers, rows with a queued or
+    running job are left alone.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(VideoRender).filter(
+            VideoRender.status.in_(("pending", "rendering")), VideoRender.updated_at < started_at
+        ).all()
+        failed = 0
+        for row in rows:
+            if os.path.exists(video_file(row.render_key)):
+                row.status = "ready"
+            elif use_workers() and render_future(row.render_key) is not None:
+                continue
+            else:
+                row.status, row.error = "failed", INTERRUPTED_ERROR
+                failed += 1
+            row.updated_at = datetime.datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+    if failed:
+        print(f"WARN: Marked {failed} renders interrupted by a restart as failed")
+    return failed
+
+
+def submit_render(spec: RenderSpec) -> Future:
+    """Queue a render on this process's pool, or for a worker process with BACKGROUND_JOBS=worker"""
+    if not use_workers():
+        return render_scheduler.submit(spec, on_done=_record_outcome)
+    db = SessionLocal()
+    try:
+        return job_future(enqueue_job(db, "render", spec.key, spec._asdict()))
+    finally:
+        db.close()
+
+
+def render_future(key: str) -> Optional[Future]:
+    """The in-flight render for a key, wherever it runs"""
+    if not use_workers():
+        return render_scheduler.future(key)
+    db = SessionLocal()
+    try:
+        return active_job_future(db, "render", key)
+    finally:
+        db.close()
+
+
+def render_status(key: str) -> Dict[str, object]:
+    status = render_scheduler.status(key)
+    if status["status"] != "unknown" or not use_workers():
+        return status
+    db = SessionLocal()
+    try:
+        job = find_job(db, "render", key)
+    finally:
+        db.close()
+    if job is None or job.status == "done":
+        return status
+    progress = job.progress or 0.0
+    if job.status in ("queued", "running"):
+        return {"status": "rendering" if progress > 0 else "pending", "progress": progress, "video_path": None, "error": None}
+    return {"status": job.status, "progress": None, "video_path": None, "error": job.error}
+
+
+def cancel_render(key: str) -> bool:
+    if not use_workers():
+        return render_scheduler.cancel(key)
+    db = SessionLocal()
+    try:
+        return request_cancel(db, "render", key)
+    finally:
+        db.close()
+
+
+def run_render_job(payload: dict, context: JobContext) -> dict:
+    """Worker entry point for "render" jobs: run on the worker's own process pool, relaying progress and cancels"""
+    spec = RenderSpec(**payload)
+    db = SessionLocal()
+    try:
+        # A job handed back by a stopped worker runs again: revive the rows its first run marked failed
+        db.query(VideoRender).filter(VideoRender.render_key == spec.key, VideoRender.status.in_(("failed", "cancelled"))).update(
+            {VideoRender.status: "pending", VideoRender.error: None}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    future = render_scheduler.submit(spec, on_done=_record_outcome)
+    while True:
+        try:
+            future.result(timeout=1.0)
+            break
+        except TimeoutError:
+            context.report(render_scheduler.status(spec.key)["progress"] or 0.0)
+            if context.cancelled.is_set():
+                render_scheduler.cancel(spec.key)
+        except (RenderCancelled, CancelledError):
+            raise JobCancelled(spec.key)
+    return {"video_path": video_url(spec.key)}
+
+
+class RenderService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def build_spec(
+        self,
+        participant: Participant,
+        speech_text: str,
+        voice: Optional[str] = None,
+        engine: Optional[str] = None,
+        renderer: Optional[str] = None,
+    ) -> RenderSpec:
+        from backend.services.avatar_service import AVATAR_DIR, AVATAR_URL_PREFIX, avatar_catalog
+        from backend.services.tts_service import TTS_ENGINE, TTS_VOICE, speech_cache_key
+
+        renderer = renderer or DEFAULT_RENDERER
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer '{renderer}'; available: {', '.join(sorted(RENDERERS))}")
+        if not participant.avatar_path or not participant.avatar_path.startswith(AVATAR_URL_PREFIX):
+            raise ValueError(f"Participant {participant.id} has no uploaded avatar")
+        filename = participant.avatar_path[len(AVATAR_URL_PREFIX):]
+        entry = avatar_catalog.get(filename)
+        if entry is None:
+            raise ValueError(f"Avatar {filename} not found")
+
+        speech_key = speech_cache_key(speech_text, voice or TTS_VOICE, engine or TTS_ENGINE)
+        key = render_cache_key(entry.sha256, speech_key, renderer)
+        return RenderSpec(
+            key=key,
+            avatar_file=os.path.join(AVATAR_DIR, filename),
+            avatar_sha256=entry.sha256,
+            speech_text=speech_text,
+            voice=voice,
+            engine=engine,
+            renderer=renderer,
+            width=VIDEO_SIZE,
+            height=VIDEO_SIZE,
+            fps=VIDEO_FPS,
+            output_path=video_file(key),
+        )
+
+    def request_render(self, project_id: int, participant: Participant, spec: RenderSpec) -> VideoRender:
+        """Make `spec` the participant's current render for the project and queue it unless cached"""
+        cached = os.path.exists(spec.output_path)
+        row = self.db.query(VideoRender).filter(
+            VideoRender.project_id == project_id, VideoRender.participant_id == participant.id
+        ).first()
+        if row is None:
+            row = VideoRender(project_id=project_id, participant_id=participant.id)
+            self.db.add(row)
+        row.render_key = spec.key
+        row.avatar_sha256 = spec.avatar_sha256
+        row.renderer = spec.renderer
+        row.status = "ready" if cached else "pending"
+        row.video_path = video_url(spec.key)
+        row.error = None
+        row.updated_at = datetime.datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(row)
+
+        if not cached:
+            submit_render(spec)
+        return row
+
+    def get_render(self, project_id: int, participant_id: int) -> Optional[VideoRender]:
+        return self.db.query(VideoRender).filter(
+            VideoRender.project_id == project_id, VideoRender.participant_id == participant_id
+        ).first()
+
+
+def invalidate_avatar_renders(db: Session, participant_id: int, avatar_sha256: Optional[str]) -> int:
+    """Mark the participant's renders built from a different avatar as stale; the caller commits"""
+    query = db.query(VideoRender).filter(VideoRender.participant_id == participant_id, VideoRender.status != "stale")
+    if avatar_sha256 is not None:
+        query = query.filter(VideoRender.avatar_sha256 != avatar_sha256)
+    return query.update({VideoRender.status: "stale", VideoRender.updated_at: datetime.datetime.utcnow()}, synchronize_session=False)
+
+
+def invalidate_speech_renders(db: Session, participant_id: int, project_id: int) -> int:
+    """Mark the participant's render for a project as stale after their speech changed; the caller commits"""
+    return db.query(VideoRender).filter(
+        VideoRender.participant_id == participant_id,
+        VideoRender.project_id == project_id,
+        VideoRender.status != "stale",
+    ).update({VideoRender.status: "stale", VideoRender.updated_at: datetime.datetime.utcnow()}, synchronize_session=False)
@@ -1,8 +1,17 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from backend.database.database import SessionLocal
 from backend.database.models import Participant, Response, Project, ProjectParticipant
+from backend.database.upsert import insert_ignore
+from backend.database.table_versions import (
+    PARTICIPANTS, PROJECT_PARTICIPANTS, RESPONSES, bump_table_versions,
+)
+from backend.services.participant_identity import participant_identity_cache, resolve_participant
+from backend.services.render_service import invalidate_speech_renders
 from backend.agents.crew import create_agents
 from typing import Dict, Any, List, Optional
 from crewai import Task, Crew
+import datetime
 import os
 import tempfile
 
@@ -19,15 +28,18 @@ class ResponseService:
         return participants
     
     def get_participant_by_name(self, name: str) -> Optional[Participant]:
-        """Get a participant by name"""
-        return self.db.query(Participant).filter(Participant.name == name).first()
+        """Get a participant by name (names are unique)"""
+        identity = resolve_participant(self.db, name)
+        return self.db.get(Participant, identity.id) if identity else None
     
     def create_participant(self, name: str, avatar_path: Optional[str] = None) -> Participant:
         """Create a new participant (not associated with any project yet)"""
         participant = Participant(name=name, avatar_path=avatar_path)
         self.db.add(participant)
+        bump_table_versions(self.db, PARTICIPANTS)
         self.db.commit()
         self.db.refresh(participant)
+        participant_identity_cache.invalidate(name=name)
         return participant
     
     def add_participant_to_project(self, participant_id: int, project_id: int) -> bool:
@@ -46,6 +58,7 @@ class ResponseService:
             project_id=project_id
         )
         self.db.add(association)
+        bump_table_versions(self.db, PROJECT_PARTICIPANTS)
         self.db.commit()
         return True
     
@@ -58,13 +71,15 @@ class ResponseService:
             original_response=response_text
         )
         self.db.add(response)
+        bump_table_versions(self.db, RESPONSES)
         self.db.commit()
         self.db.refresh(response)
         return response
     
-    def refine_response(self, response_id: int):
+    def refine_response(self, response_id: int) -> Optional[str]:
         """
         Refines all responses for a participant in a project by generating a single coherent speech.
+        Returns the generated speech, or None if nothing was refined.
         """
         # Fetch the initial response to get participant and project context
         initial_response = self.db.query(Response).filter(Response.id == response_id).first()
@@ -131,13 +146,17 @@ class ResponseService:
             print(f"INFO: CrewAI task completed for participant {participant.id}. Result:\n{refined_text}")
             
             # 4. Update all of the participant's response entries for this project with the single generated speech
+            if any(r.refined_response != refined_text for r in all_participant_responses):
+                invalidate_speech_renders(self.db, participant.id, project_id)
             updated_count = 0
             for r in all_participant_responses:
                 r.refined_response = refined_text
                 updated_count += 1
             
+            bump_table_versions(self.db, RESPONSES)
             self.db.commit()
             print(f"INFO: Successfully generated and saved refined speech to {updated_count} response entries for participant {participant.id} in project {project_id}")
+            return refined_text
 
         except Exception as e:
             print(f"ERROR: CrewAI kickoff for response tuning failed for participant {participant.id} in project {project_id}: {e}")
@@ -145,37 +164,77 @@ class ResponseService:
             traceback.print_exc() # Print full traceback
             self.db.rollback()
             print("INFO: Database transaction rolled back due to error.")
+            return None
 
-    def process_response_pipeline(self, participant_name: str, project_id: int, question: str, response_text: str) -> Dict[str, Any]:
-        """Process a response through the entire pipeline"""
-        # Get or create participant
-        participant = self.get_participant_by_name(participant_name)
-        if not participant:
-            participant = self.create_participant(name=participant_name)
-        
-        # Add participant to project if not already associated
-        if not self.add_participant_to_project(participant.id, project_id):
-            # Participant is already associated with the project
-            pass
-        
-        # Store the response
-        response = self.store_response(participant.id, project_id, question, response_text)
-        
-        # Refine the response
-        self.refine_response(response.id)
+    def ingest_response(
+        self,
+        participant_name: str,
+        project_id: int,
+        question: str,
+        original_response: str,
+        chat_response_file_path: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Resolve the participant, ensure project membership and store a response in one transaction.
 
-        # Re-fetch the response to ensure we have the latest data, including refined_response
-        updated_response = self.db.query(Response).filter(Response.id == response.id).first()
+        Uses a single commit and returns everything the API needs about the new
+        response, so callers never have to re-query it.
+        """
+        created_at = datetime.datetime.utcnow()
+        try:
+            # Cached name -> id lookup; unknown names are upserted on the unique name index
+            identity = resolve_participant(self.db, participant_name, create_missing=True)
+            participant_id, avatar_path = identity.id, identity.avatar_path
+            
+            # Add participant to project unless already associated
+            joined = self.db.execute(insert_ignore(
+                self.db.get_bind().dialect.name,
+                ProjectParticipant,
+                {"project_id": project_id, "participant_id": participant_id, "joined_at": created_at},
+                index_elements=["project_id", "participant_id"],
+            )).rowcount
+            
+            result = self.db.execute(insert(Response).values(
+                participant_id=participant_id,
+                project_id=project_id,
+                question=question,
+                original_response=original_response,
+                chat_response_file_path=chat_response_file_path,
+                created_at=created_at,
+            ))
+            response_id = result.inserted_primary_key[0]
+            changed = [RESPONSES] + ([PARTICIPANTS] if identity.created else []) + ([PROJECT_PARTICIPANTS] if joined else [])
+            bump_table_versions(self.db, *changed)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            # The participant may have been created in the rolled-back transaction
+            participant_identity_cache.invalidate(name=participant_name)
+            raise
         
         return {
-            "participant_id": participant.id,
-            "response_id": updated_response.id,
-            "question": updated_response.question,
-            "original_response": updated_response.original_response,
-            "refined_response": updated_response.refined_response
+            "id": response_id,
+            "participant_id": participant_id,
+            "project_id": project_id,
+            "question": question,
+            "original_response": original_response,
+            "refined_response": None,
+            "chat_response_file_path": chat_response_file_path,
+            "participant_name": participant_name,
+            "participant_avatar_path": avatar_path,
+            "created_at": created_at,
         }
 
-    def process_chat_response(self, participant_name: str, project_id: int, chat_content: str, question: str = "Chat Response") -> Response:
+    def process_response_pipeline(self, participant_name: str, project_id: int, question: str, response_text: str) -> Dict[str, Any]:
+        """Process a response through the entire pipeline"""
+        # Resolve participant and membership and store the response in one transaction
+        ingested = self.ingest_response(participant_name, project_id, question, response_text)
+        
+        # Refine the response; the generated speech is returned rather than re-fetched
+        ingested["refined_response"] = self.refine_response(ingested["id"])
+        
+        return ingested
+
+    def process_chat_response(self, participant_name: str, project_id: int, chat_content: str, question: str = "Chat Response") -> Dict[str, Any]:
         """Process a full chat response and save it as a markdown file
         
         Args:
@@ -185,16 +244,8 @@ class ResponseService:
             question: Question or topic (defaults to "Chat Response")
             
         Returns:
-            Response object with markdown file path
+            Dictionary describing the stored response, including the markdown file path
         """
-        # Get or create participant
-        participant = self.get_participant_by_name(participant_name)
-        if not participant:
-            participant = self.create_participant(name=participant_name)
-        
-        # Add participant to project if not already associated
-        self.add_participant_to_project(participant.id, project_id)
-        
         # Use ResponseCollectorTool to save chat as markdown file
         response_collector = None
         for agent in self.agents.values():
@@ -216,18 +267,13 @@ class ResponseService:
         )
         
         # Store the response with markdown file path
-        response = Response(
-            participant_id=participant.id,
-            project_id=project_id,
-            question=question,
+        return self.ingest_response(
+            participant_name,
+            project_id,
+            question,
             original_response=chat_content[:1000] + "..." if len(chat_content) > 1000 else chat_content,  # Truncate for database
-            chat_response_file_path=markdown_file_path
+            chat_response_file_path=markdown_file_path,
         )
-        self.db.add(response)
-        self.db.commit()
-        self.db.refresh(response)
-        
-        return response
     
     def get_all_responses(self, project_id: Optional[int] = None) -> List[Response]:
         """Get all responses, optionally filtering by project_id"""
@@ -236,3 +282,15 @@ class ResponseService:
             query = query.filter(Response.project_id == project_id)
         responses = query.all()
         return responses
+
+
+def run_refine_job(payload: Dict[str, Any], context) -> Dict[str, Any]:
+    """Worker entry point for "llm" jobs (see job_queue.py): refine the speech of a response's participant"""
+    db = SessionLocal()
+    try:
+        speech = ResponseService(db).refine_response(payload["response_id"])
+    finally:
+        db.close()
+    if not speech:
+        raise RuntimeError("Refinement produced no speech")
+    return {"characters": len(speech)}
@@ -0,0 +1,201 @@
+"""
+Static file serving with precompressed variants and long-lived caching.
+
+`CachedStaticFiles` is a drop-in replacement for Starlette's `StaticFiles`:
+
+- Text assets (markdown transcripts, JSON, CSS, JS, HTML, SVG) are compressed
+  once per content version with gzip, and brotli when the `brotli` package is
+  installed. Variants live in a content-addressed cache directory and are
+  served according to the request's Accept-Encoding.
+- ETags are strong: the SHA-256 of the content (suffixed per encoding), or the
+  hash already present in the filename of content-hashed files such as avatar
+  uploads and derivatives.
+- Content-hashed files are sent with `Cache-Control: immutable` and a one year
+  max-age; everything else must be revalidated, which is a cheap 304 because
+  the ETag of an unchanged file is answered from memory.
+"""
+
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Dict, NamedTuple
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import tempfile
+import threading
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATIC_CACHE_DIR = os.getenv("STATIC_CACHE_DIR", os.path.join(PROJECT_ROOT, "backend", "data", "static_cache"))
+
+COMPRESSIBLE_EXTENSIONS = (".md", ".txt", ".json", ".css", ".js", ".html", ".svg", ".csv", ".xml", ".vtt", ".m3u8")
+MIN_COMPRESS_BYTES = 512
+# Files above this size get a stat-based ETag instead of being hashed
+MAX_HASH_BYTES = 16 * 1024 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Filenames carrying their own content hash (avatar uploads and derivatives)
+_HASHED_NAME = re.compile(r"^([0-9a-f]{32}|[0-9a-f]{64})\.[A-Za-z0-9]+$")
+
+# Preferred first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class StaticAsset(NamedTuple):
+    digest: str
+    immutable: bool
+    # content-coding -> path of the precompressed file
+    variants: Dict[str, str]
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_asset(full_path: str, stat_result: os.stat_result, cache_dir: str = STATIC_CACHE_DIR) -> StaticAsset:
+    """Hash a static file and make sure its compressed variants exist"""
+    name = os.path.basename(full_path)
+    hashed = _HASHED_NAME.match(name)
+    compressible = name.lower().endswith(COMPRESSIBLE_EXTENSIONS) and stat_result.st_size >= MIN_COMPRESS_BYTES
+
+    if hashed and not compressible:
+        return StaticAsset(hashed.group(1), True, {})
+    if stat_result.st_size > MAX_HASH_BYTES:
+        return StaticAsset(f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}", False, {})
+
+    with open(full_path, "rb") as f:
+        data = f.read()
+    digest = hashed.group(1) if hashed else hashlib.sha256(data).hexdigest()
+
+    variants = {}
+    if compressible:
+        for encoding, suffix in _ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            variant_path = os.path.join(cache_dir, digest[:2], digest + suffix)
+            if not os.path.exists(variant_path):
+                compressed = _compress(data, encoding)
+                if len(compressed) >= len(data) * 0.9:
+                    continue  # not worth it
+                _write_atomic(variant_path, compressed)
+            variants[encoding] = variant_path
+    return StaticAsset(digest, bool(hashed), variants)
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, cache_dir: str = STATIC_CACHE_DIR, max_entries: int = 4096, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._assets: "OrderedDict[tuple, StaticAsset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _asset(self, full_path: str, stat_result: os.stat_result) -> StaticAsset:
+        key = (full_path, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None:
+                self._assets.move_to_end(key)
+                return asset
+        asset = build_asset(full_path, stat_result, self.cache_dir)
+        with self._lock:
+            self._assets[key] = asset
+            while len(self._assets) > self.max_entries:
+                self._assets.popitem(last=False)
+        return asset
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except (OSError, ValueError):
+            full_path, stat_result = None, None
+        if not (stat_result and stat.S_ISREG(stat_result.st_mode)):
+            # Directories, missing files and errors are handled as StaticFiles does
+            return await super().get_response(path, scope)
+
+        asset = await anyio.to_thread.run_sync(self._asset, full_path, stat_result)
+        request_headers = Headers(scope=scope)
+
+        encoding = None
+        if asset.variants:
+            accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+            encoding = next((enc for enc, _ in _ENCODINGS if enc in accepted and enc in asset.variants), None)
+
+        etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+        headers = {
+            "etag": etag,
+            "cache-control": IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL,
+        }
+        if asset.variants:
+            headers["vary"] = "Accept-Encoding"
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag):
+            return NotModifiedResponse(Headers(headers))
+
+        if encoding:
+            # Sent with the original's media type; the encoding is a transport detail
+            response = FileResponse(asset.variants[encoding], media_type=mimetypes.guess_type(full_path)[0] or "text/plain")
+            response.headers["content-encoding"] = encoding
+            # FileResponse dated it by the cache file; clients compare against the asset
+            response.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        else:
+            response = FileResponse(full_path, stat_result=stat_result)
+        if if_none_match is None and self.is_not_modified(response.headers, request_headers):
+            # If-Modified-Since only applies when no If-None-Match was sent
+            return NotModifiedResponse(Headers(headers))
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
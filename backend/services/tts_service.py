@@ -0,0 +1,318 @@
+"""
+Text-to-speech for participants' refined speeches.
+
+Engines are pluggable (`TTSEngine`); "local" runs espeak-ng offline and is the
+default, "gtts" uses Google's online service through the `gTTS` package.
+Whatever an engine returns is normalised once to the PCM WAV format of
+`media_tools`, so every later stage (stitching, video muxing) can treat speech
+audio uniformly.
+
+Speeches are voiced one sentence at a time. Each sentence's samples are
+cached under its normalised hash (with voice and engine), and a track is
+stitched by concatenating cached samples with precomputed silence between
+sentences - no re-encoding - so editing one sentence of a speech only
+synthesizes that sentence again. The finished track is written to
+frontend/static/audio/<key>.wav, keyed by (text hash, voice, engine), along
+with the sentence timings. Synthesis runs on a small thread pool: engines
+spend their time in subprocesses or on the network, not holding the GIL.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from sqlalchemy.orm import Session
+
+from backend.database.database import SessionLocal
+from backend.database.models import Response
+from backend.services.job_queue import JobContext, enqueue_job, find_job, job_future, use_workers
+from backend.services.media_tools import (
+    MEDIA_DATA_DIR, PCM_CHANNELS, PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, STATIC_DIR,
+    audio_to_pcm, pcm_to_wav, wav_duration, write_atomic,
+)
+
+AUDIO_DIR = os.path.join(STATIC_DIR, "audio")
+AUDIO_URL_PREFIX = "/static/audio/"
+TTS_ENGINE = os.getenv("TTS_ENGINE", "local")
+TTS_VOICE = os.getenv("TTS_VOICE", "en")
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+SENTENCE_PAUSE_MS = int(os.getenv("TTS_SENTENCE_PAUSE_MS", "250"))
+SEGMENT_DIR = os.path.join(MEDIA_DATA_DIR, "tts_segments")
+TIMING_DIR = os.path.join(MEDIA_DATA_DIR, "tts_timings")
+
+
+class TTSError(RuntimeError):
+    pass
+
+
+class TTSEngine:
+    """A speech synthesizer. Subclasses return audio bytes in any format ffmpeg can read."""
+
+    name: str = ""
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+
+class LocalTTSEngine(TTSEngine):
+    """Offline synthesis with the espeak-ng (or espeak) command line tool"""
+
+    name = "local"
+
+    def __init__(self, binary: Optional[str] = None, words_per_minute: int = 165):
+        self.binary = binary or os.getenv("ESPEAK_BINARY") or shutil.which("espeak-ng") or shutil.which("espeak")
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        if not self.binary:
+            raise TTSError("The local TTS engine needs espeak-ng (or espeak) on PATH, or ESPEAK_BINARY")
+        result = subprocess.run(
+            [self.binary, "--stdout", "-v", voice, "-s", str(self.words_per_minute)],
+            input=text.encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if result.returncode != 0 or not result.stdout:
+            raise TTSError(f"espeak failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech (needs network access). `voice` is a language code such as "en"."""
+
+    name = "gtts"
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        try:
+            from gtts import gTTS
+        except ImportError:
+            raise TTSError("The gtts engine needs the gTTS package")
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=voice).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+_engines: Dict[str, TTSEngine] = {}
+
+def register_engine(engine: TTSEngine) -> None:
+    _engines[engine.name] = engine
+
+def get_engine(name: Optional[str] = None) -> TTSEngine:
+    name = name or TTS_ENGINE
+    if name not in _engines:
+        raise TTSError(f"Unknown TTS engine '{name}'; available: {', '.join(sorted(_engines))}")
+    return _engines[name]
+
+register_engine(LocalTTSEngine())
+register_engine(GTTSEngine())
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a text, used for cache keys"""
+    return " ".join(text.split())
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?\u2026])\s+|(?<=[.!?\u2026][\"')\]])\s+|\n\s*\n")
+
+def split_sentences(text: str) -> List[str]:
+    """Normalised sentences of a speech, in order; paragraph breaks also end a sentence"""
+    sentences = (normalize_text(part) for part in _SENTENCE_END.split(text.strip()))
+    return [sentence for sentence in sentences if sentence]
+
+
+def speech_cache_key(text: str, voice: str, engine: str) -> str:
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{engine}\0{voice}\0{text_hash}".encode("utf-8")).hexdigest()
+
+
+def sentence_cache_key(sentence: str, voice: str, engine: str) -> str:
+    return hashlib.sha256(f"{engine}\0{voice}\0{normalize_text(sentence)}".encode("utf-8")).hexdigest()
+
+
+class SpeechAudio(NamedTuple):
+    key: str
+    path: str  # URL under /static
+    file_path: str
+    duration: float
+    cached: bool
+    synthesized_sentences: int = 0
+
+
+class SentenceTiming(NamedTuple):
+    text: str
+    start: float
+    end: float
+
+
+def _audio_file(key: str) -> str:
+    return os.path.join(AUDIO_DIR, f"{key}.wav")
+
+def _segment_file(key: str) -> str:
+    return os.path.join(SEGMENT_DIR, key[:2], f"{key}.pcm")
+
+def _timing_file(key: str) -> str:
+    return os.path.join(TIMING_DIR, f"{key}.json")
+
+
+@lru_cache(maxsize=8)
+def silence(milliseconds: int) -> bytes:
+    """Precomputed silent samples in the speech format"""
+    frames = PCM_SAMPLE_RATE * milliseconds // 1000
+    return b"\0" * (frames * PCM_CHANNELS * PCM_SAMPLE_WIDTH)
+
+
+def sentence_pcm(sentence: str, voice: str, engine_name: str) -> tuple:
+    """(samples, synthesized) for one sentence, synthesizing only on a cache miss"""
+    path = _segment_file(sentence_cache_key(sentence, voice, engine_name))
+    try:
+        with open(path, "rb") as f:
+            return f.read(), False
+    except FileNotFoundError:
+        pass
+    pcm = audio_to_pcm(get_engine(engine_name).synthesize(sentence, voice))
+    write_atomic(path, pcm)
+    return pcm, True
+
+
+def cached_speech(text: str, voice: Optional[str] = None, engine: Optional[str] = None) -> Optional[SpeechAudio]:
+    """The cached track for a text, or None if it has not been synthesized"""
+    voice, engine_name = voice or TTS_VOICE, engine or TTS_ENGINE
+    key = speech_cache_key(text, voice, engine_name)
+    file_path = _audio_file(key)
+    if not os.path.exists(file_path):
+        return None
+    return SpeechAudio(key, f"{AUDIO_URL_PREFIX}{key}.wav", file_path, wav_duration(file_path), True)
+
+
+def speech_timings(key: str) -> Optional[List[SentenceTiming]]:
+    """Start and end time of every sentence in a synthesized track"""
+    try:
+        with open(_timing_file(key), "r", encoding="utf-8") as f:
+            return [SentenceTiming(*entry) for entry in json.load(f)]
+    except FileNotFoundError:
+        return None
+
+
+def synthesize_speech(text: str, voice: Optional[str] = None, engine: Optional[str] = None) -> SpeechAudio:
+    """Voice a text, or return the cached track if this (text, voice, engine) was voiced before.
+
+    Only sentences that were never voiced with this voice and engine are
+    synthesized; the track is stitched from cached samples.
+    """
+    voice, engine_name = voice or TTS_VOICE, engine or TTS_ENGINE
+    cached = cached_speech(text, voice, engine_name)
+    if cached is not None:
+        return cached
+
+    sentences = split_sentences(text)
+    if not sentences:
+        raise TTSError("Nothing to synthesize")
+
+    key = speech_cache_key(text, voice, engine_name)
+    pause = silence(SENTENCE_PAUSE_MS)
+    bytes_per_second = PCM_SAMPLE_RATE * PCM_CHANNELS * PCM_SAMPLE_WIDTH
+    chunks, timings, offset, synthesized = [], [], 0, 0
+    for index, sentence in enumerate(sentences):
+        if index:
+            chunks.append(pause)
+            offset += len(pause)
+        pcm, was_synthesized = sentence_pcm(sentence, voice, engine_name)
+        synthesized += was_synthesized
+        chunks.append(pcm)
+        timings.append((sentence, offset / bytes_per_second, (offset + len(pcm)) / bytes_per_second))
+        offset += len(pcm)
+
+    write_atomic(_timing_file(key), json.dumps(timings).encode("utf-8"))
+    file_path = _audio_file(key)
+    write_atomic(file_path, pcm_to_wav(b"".join(chunks)))
+    print(f"INFO: Stitched speech {key} from {len(sentences)} sentences ({synthesized} synthesized)")
+    return SpeechAudio(key, f"{AUDIO_URL_PREFIX}{key}.wav", file_path, offset / bytes_per_second, False, synthesized)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Dict[str, Future] = {}
+_failed: Dict[str, str] = {}  # key -> error of the last failed attempt
+_pending_lock = threading.Lock()
+
+def submit_speech(text: str, voice: Optional[str] = None, engine: Optional[str] = None) -> Future:
+    """Queue synthesis on the TTS pool; identical requests in flight share one job"""
+    global _executor
+    voice, engine_name = voice or TTS_VOICE, engine or TTS_ENGINE
+    key = speech_cache_key(text, voice, engine_name)
+    if use_workers():
+        db = SessionLocal()
+        try:
+            job = enqueue_job(db, "tts", key, {"text": text, "voice": voice, "engine": engine_name})
+        finally:
+            db.close()
+        return job_future(job, lambda result: cached_speech(text, voice, engine_name))
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+        future = _executor.submit(synthesize_speech, text, voice, engine_name)
+        _pending[key] = future
+
+    def _done(done: Future):
+        with _pending_lock:
+            _pending.pop(key, None)
+            error = done.exception()
+            if error is not None:
+                print(f"ERROR: Speech synthesis {key} failed: {error}")
+                _failed[key] = str(error)
+            else:
+                _failed.pop(key, None)
+    future.add_done_callback(_done)
+    return future
+
+def speech_job_status(key: str) -> Dict[str, Optional[str]]:
+    """Status of a synthesis job: ready, pending, failed or unknown"""
+    file_path = _audio_file(key)
+    if os.path.exists(file_path):
+        return {"status": "ready", "audio_path": f"{AUDIO_URL_PREFIX}{key}.wav", "error": None}
+    with _pending_lock:
+        if key in _pending:
+            return {"status": "pending", "audio_path": None, "error": None}
+        if key in _failed:
+            return {"status": "failed", "audio_path": None, "error": _failed[key]}
+    if use_workers():
+        db = SessionLocal()
+        try:
+            job = find_job(db, "tts", key)
+        finally:
+            db.close()
+        if job is not None:
+            status = {"queued": "pending", "running": "pending"}.get(job.status, job.status)
+            return {"status": status, "audio_path": None, "error": job.error}
+    return {"status": "unknown", "audio_path": None, "error": None}
+
+
+def run_speech_job(payload: dict, context: JobContext) -> dict:
+    """Worker entry point for "tts" jobs (see job_queue.py)"""
+    audio = synthesize_speech(payload["text"], payload["voice"], payload["engine"])
+    return {"key": audio.key, "duration": audio.duration, "synthesized_sentences": audio.synthesized_sentences}
+
+
+class TTSService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_speech_text(self, participant_id: int, project_id: int) -> Optional[str]:
+        """A participant's refined speech for a project (the same text is stored on each of their responses)"""
+        row = self.db.query(Response.refined_response).filter(
+            Response.participant_id == participant_id,
+            Response.project_id == project_id,
+            Response.refined_response.isnot(None),
+            Response.refined_response != "",
+        ).order_by(Response.created_at.desc()).first()
+        return row.refined_response if row else None
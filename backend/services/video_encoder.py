@@ -0,0 +1,134 @@
+"""
+Video encoding through an ffmpeg pipe.
+
+Renderers produce frames as NumPy arrays and write them straight into
+ffmpeg's stdin as raw BGR24, so no frame ever touches the disk. All generated
+videos share one format (H.264 yuv420p, AAC at the speech sample rate, fixed
+fps), which is what lets the meeting reel join clips with stream copy.
+"""
+
+from typing import List, Optional, Tuple
+import os
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from backend.services.media_tools import MediaToolError, PCM_SAMPLE_RATE, ffmpeg_binary
+
+VIDEO_FPS = int(os.getenv("VIDEO_FPS", "25"))
+VIDEO_SIZE = int(os.getenv("VIDEO_SIZE", "512"))  # square output, pixels
+VIDEO_PRESET = os.getenv("VIDEO_PRESET", "veryfast")
+VIDEO_CRF = os.getenv("VIDEO_CRF", "23")
+VIDEO_THREADS = os.getenv("VIDEO_THREADS", "0")  # 0 lets x264 decide
+# Keyframe spacing bounds seek latency and the length of HLS segments cut by stream copy
+VIDEO_KEYFRAME_SECONDS = int(os.getenv("VIDEO_KEYFRAME_SECONDS", "2"))
+
+
+def encoder_fingerprint() -> list:
+    """The settings below that change the encoded output; part of every render and card cache key"""
+    return [VIDEO_PRESET, VIDEO_CRF, VIDEO_KEYFRAME_SECONDS]
+
+
+def output_args(path: str) -> List[str]:
+    """Encoder settings shared by every generated clip"""
+    return [
+        "-c:v", "libx264", "-preset", VIDEO_PRESET, "-crf", VIDEO_CRF, "-pix_fmt", "yuv420p",
+        "-threads", VIDEO_THREADS, "-g", str(VIDEO_FPS * VIDEO_KEYFRAME_SECONDS),
+        "-c:a", "aac", "-b:a", "128k", "-ar", str(PCM_SAMPLE_RATE), "-ac", "1",
+        "-movflags", "+faststart",
+        path,
+    ]
+
+
+def fit_transform(image_width: int, image_height: int, width: int, height: int) -> Tuple[float, int, int]:
+    """(scale, left, top) placing an image on a width x height canvas as `fit_image` does"""
+    scale = min(width / image_width, height / image_height)
+    new_w, new_h = max(1, round(image_width * scale)), max(1, round(image_height * scale))
+    return scale, (width - new_w) // 2, (height - new_h) // 2
+
+
+def fit_image(image: np.ndarray, width: int, height: int, background=(24, 24, 24)) -> np.ndarray:
+    """Scale an image to fit a width x height BGR canvas, centred, keeping its aspect ratio"""
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        alpha = image[:, :, 3:4].astype(np.float32) / 255.0
+        image = (image[:, :, :3] * alpha + np.array(background, np.float32) * (1 - alpha)).astype(np.uint8)
+    h, w = image.shape[:2]
+    scale, left, top = fit_transform(w, h, width, height)
+    new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    resized = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+    canvas = np.empty((height, width, 3), np.uint8)
+    canvas[:] = background
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+
+class FFmpegVideoWriter:
+    """Context manager that encodes raw frames (and an optional audio track) into an MP4.
+
+    The file is written under a temporary name and renamed on a clean exit,
+    so a cancelled or failed render never leaves a partial video behind.
+    """
+
+    def __init__(self, path: str, width: int, height: int, fps: int = VIDEO_FPS, audio_path: Optional[str] = None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.audio_path = audio_path
+        self.tmp_path: Optional[str] = None
+        self.frames_written = 0
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "FFmpegVideoWriter":
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Unique per writer: threads may encode the same key (a shared title card) at once
+        fd, self.tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(self.path), prefix=".part-")
+        os.close(fd)
+        cmd = [
+            ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{self.width}x{self.height}", "-r", str(self.fps),
+            "-i", "pipe:0",
+        ]
+        if self.audio_path:
+            cmd += ["-i", self.audio_path, "-shortest"]
+        else:
+            # Silent track, so every clip has the same streams
+            cmd += ["-f", "lavfi", "-i", f"anullsrc=r={PCM_SAMPLE_RATE}:cl=mono", "-shortest"]
+        cmd += output_args(self.tmp_path)
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        return self
+
+    def write(self, frame: np.ndarray) -> None:
+        """Write one HxWx3 uint8 BGR frame"""
+        self._process.stdin.write(np.ascontiguousarray(frame).data)
+        self.frames_written += 1
+
+    def write_many(self, frames: np.ndarray) -> None:
+        """Write an NxHxWx3 batch of frames in one call"""
+        self._process.stdin.write(np.ascontiguousarray(frames).data)
+        self.frames_written += len(frames)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        process = self._process
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if exc_type is not None:
+            process.kill()
+            process.wait()
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            return
+        stderr = process.stderr.read().decode("utf-8", "replace")
+        if process.wait() != 0:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            raise MediaToolError(f"ffmpeg failed while encoding {self.path}: {stderr.strip()}")
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, self.path)
@@ -0,0 +1,216 @@
+"""
+Background job worker: runs the LLM, TTS and render jobs queued by the API.
+
+Start one or more with `BACKGROUND_JOBS=worker` set for the API as well:
+
+    python -m backend.worker
+    python -m backend.worker --concurrency llm=2,tts=4,render=2 --types tts,render
+
+Each job type has its own number of slots (`--concurrency`, default
+`WORKER_CONCURRENCY`). Render jobs run on the worker's render process pool,
+sized to the render slots, so a box running N workers renders at most
+N x render slots videos at once. Any number of workers can share one
+database; a job is only ever claimed by one of them (see job_queue.py).
+
+SIGTERM or Ctrl+C stops claiming new jobs and waits up to `--grace` seconds
+for the running ones; jobs still running then are handed back to the queue
+for another worker. Repeating the same signal exits at once; a different one
+(Ctrl+C reaches the worker as SIGINT, then the launcher sends SIGTERM) does not.
+"""
+
+import os
+import sys
+
+# Add the project root to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import argparse
+import json
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from backend.database.config import is_sqlite
+from backend.database.database import DATABASE_URL, SessionLocal, engine
+from backend.database.models import Base
+from backend.migrate_db import run_migrations
+from backend.services.job_queue import (
+    JOB_HANDLERS, JOB_HEARTBEAT_SECONDS, JOB_POLL_SECONDS, JobCancelled, JobContext,
+    claim_jobs, finish_job, heartbeat, purge_finished_jobs, release_jobs, requeue_stale_jobs, resolve_handler,
+)
+
+WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY", "llm=1,tts=2,render=2")
+WORKER_SHUTDOWN_GRACE = float(os.getenv("WORKER_SHUTDOWN_GRACE", "60"))
+PURGE_EVERY_SECONDS = 3600
+
+
+def parse_concurrency(text: str) -> Dict[str, int]:
+    """"llm=1,tts=2,render=2" -> {"llm": 1, "tts": 2, "render": 2}"""
+    concurrency = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        job_type, _, count = item.partition("=")
+        if job_type not in JOB_HANDLERS or not count.isdigit():
+            raise ValueError(f"Invalid concurrency '{item}'; expected <type>=<slots> with type one of {', '.join(JOB_HANDLERS)}")
+        concurrency[job_type] = int(count)
+    return concurrency
+
+
+class Worker:
+    def __init__(self, concurrency: Dict[str, int], grace: float = WORKER_SHUTDOWN_GRACE):
+        self.concurrency = {job_type: slots for job_type, slots in concurrency.items() if slots > 0}
+        self.grace = grace
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._pools = {
+            job_type: ThreadPoolExecutor(max_workers=slots, thread_name_prefix=f"job-{job_type}")
+            for job_type, slots in self.concurrency.items()
+        }
+        self._running: Dict[int, Tuple[str, JobContext]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stop_signal: Optional[int] = None
+
+    def _free_slots(self, job_type: str) -> int:
+        with self._lock:
+            busy = sum(1 for running_type, _ in self._running.values() if running_type == job_type)
+        return self.concurrency[job_type] - busy
+
+    def _execute(self, job_id: int, job_type: str, payload: str, context: JobContext) -> None:
+        status, result, error = "failed", None, None
+        started = time.perf_counter()
+        try:
+            result = resolve_handler(job_type)(json.loads(payload), context)
+            status = "done"
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"ERROR: Job {job_id} ({job_type}) failed: {error}")
+        finally:
+            db = SessionLocal()
+            try:
+                finish_job(db, job_id, self.worker_id, status, result, error)
+            except Exception as e:
+                print(f"ERROR: Could not record job {job_id}: {e}")
+            finally:
+                db.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+        print(f"INFO: Job {job_id} ({job_type}) {status} in {time.perf_counter() - started:.1f}s")
+
+    def _claim(self) -> None:
+        db = SessionLocal()
+        try:
+            for job_type in self.concurrency:
+                free = self._free_slots(job_type)
+                if free <= 0 or self._stopping.is_set():
+                    continue
+                for job in claim_jobs(db, job_type, self.worker_id, free):
+                    context = JobContext(job.id)
+                    with self._lock:
+                        self._running[job.id] = (job_type, context)
+                    self._pools[job_type].submit(self._execute, job.id, job_type, job.payload, context)
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self) -> None:
+        """Runs until the process exits, so jobs finishing during the shutdown grace keep their heartbeat"""
+        last_purge = 0.0
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            db = SessionLocal()
+            try:
+                with self._lock:
+                    contexts = {job_id: context for job_id, (_, context) in self._running.items()}
+                for job_id in heartbeat(db, self.worker_id, {job_id: context.progress for job_id, context in contexts.items()}):
+                    contexts[job_id].cancelled.set()
+                requeue_stale_jobs(db)
+                if time.monotonic() - last_purge > PURGE_EVERY_SECONDS:
+                    purge_finished_jobs(db)
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"WARN: Worker heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def stop(self, signum: Optional[int] = None, _frame=None) -> None:
+        if self._stopping.is_set():
+            if signum == self._stop_signal:
+                print("WARN: Second signal, exiting without waiting for running jobs")
+                os._exit(1)
+            return  # already stopping; launchers follow Ctrl+C's SIGINT with SIGTERM
+        self._stop_signal = signum
+        print(f"INFO: Worker {self.worker_id} stopping; waiting up to {self.grace:.0f}s for {len(self._running)} running jobs")
+        self._stopping.set()
+
+    def run(self) -> None:
+        if "render" in self.concurrency:
+            from backend.services.render_service import render_scheduler
+            render_scheduler.workers = self.concurrency["render"]
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        print(f"INFO: Worker {self.worker_id} started with {', '.join(f'{t}={n}' for t, n in self.concurrency.items())}")
+
+        while not self._stopping.is_set():
+            try:
+                self._claim()
+            except Exception as e:
+                print(f"WARN: Could not claim jobs: {e}")
+            self._stopping.wait(JOB_POLL_SECONDS)
+
+        deadline = time.monotonic() + self.grace
+        while self._running and time.monotonic() < deadline:
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            unfinished = list(self._running)
+            for _, context in self._running.values():
+                context.cancelled.set()
+        if unfinished:
+            db = SessionLocal()
+            try:
+                released = release_jobs(db, self.worker_id, unfinished)
+            finally:
+                db.close()
+            print(f"INFO: Handed {released} unfinished jobs back to the queue")
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        if "render" in self.concurrency:
+            from backend.services.render_service import render_scheduler
+            render_scheduler.shutdown()
+        print(f"INFO: Worker {self.worker_id} stopped")
+
+
+def main(args) -> None:
+    try:
+        concurrency = parse_concurrency(args.concurrency)
+    except ValueError as e:
+        sys.exit(str(e))
+    if args.types:
+        concurrency = {job_type: slots for job_type, slots in concurrency.items() if job_type in args.types.split(",")}
+    if not any(concurrency.values()):
+        sys.exit("No job types to run")
+    Base.metadata.create_all(bind=engine)
+    if is_sqlite(DATABASE_URL) and not run_migrations():
+        sys.exit("Database migration failed, see the errors above")
+    Worker(concurrency, args.grace).run()
+    # Handlers that cannot be interrupted (an LLM call) would keep the interpreter
+    # alive; their jobs are already back in the queue
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued LLM, TTS and render jobs")
+    parser.add_argument("--concurrency", default=WORKER_CONCURRENCY, help="Slots per job type, e.g. llm=1,tts=2,render=2 (default: WORKER_CONCURRENCY)")
+    parser.add_argument("--types", help="Only run these job types, e.g. tts,render")
+    parser.add_argument("--grace", type=float, default=WORKER_SHUTDOWN_GRACE, help="Seconds to let running jobs finish on shutdown")
+    main(parser.parse_args())
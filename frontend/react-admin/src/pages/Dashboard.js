@@ -12,7 +12,37 @@ import FolderIcon from '@mui/icons-material/Folder';
 import PeopleIcon from '@mui/icons-material/People';
 import QuestionAnswerIcon from '@mui/icons-material/QuestionAnswer';
 import VideoLibraryIcon from '@mui/icons-material/VideoLibrary';
-import { getProjects } from '../services/api';
+import { getProjects, getMeetingReel, mediaUrl } from '../services/api';
+
+// Native HLS (Safari, iOS); other browsers play the MP4 through byte-range requests
+const canPlayHls = () => document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+
+function ReelPlayer({ projectId }) {
+  const [reel, setReel] = useState(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    getMeetingReel(projectId)
+      .then((response) => { if (!cancelled) setReel(response.data); })
+      .catch(() => { if (!cancelled) setReel(null); }); // 404 until a reel is built
+    return () => { cancelled = true; };
+  }, [projectId]);
+
+  if (!reel || reel.status !== 'ready') {
+    return <FolderIcon sx={{ fontSize: 60, color: 'primary.main' }} />;
+  }
+  const source = reel.stream_path && canPlayHls() ? reel.stream_path : reel.video_path;
+  return (
+    <Box
+      component="video"
+      controls
+      preload="none"
+      poster={mediaUrl(reel.poster_path)}
+      src={mediaUrl(source)}
+      sx={{ width: '100%', borderRadius: 1, bgcolor: 'black' }}
+    />
+  );
+}
 
 function Dashboard({ setCurrentProject }) {
   const [projects, setProjects] = useState([]);
@@ -82,7 +112,7 @@ function Dashboard({ setCurrentProject }) {
               >
                 <CardContent sx={{ flexGrow: 1 }}>
                   <Box sx={{ display: 'flex', justifyContent: 'center', mb: 2 }}>
-                    <FolderIcon sx={{ fontSize: 60, color: 'primary.main' }} />
+                    <ReelPlayer projectId={project.id} />
                   </Box>
                   <Typography variant="h6" component="h2" gutterBottom noWrap>
                     {project.name}
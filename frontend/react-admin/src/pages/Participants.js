@@ -257,7 +257,7 @@ function Participants() {
                   sx={{ '&:last-child td, &:last-child th': { border: 0 } }}
                 >
                   <TableCell component="th" scope="row">
-                    <Avatar src={`http://localhost:8000${participant.avatar_path}`} alt={participant.name} />
+                    <Avatar src={`http://localhost:8000${participant.avatar_thumbnail_path || participant.avatar_path}`} alt={participant.name} />
                   </TableCell>
                   <TableCell>{participant.name}</TableCell>
                   <TableCell align="center">{participant.responses_count}</TableCell>
@@ -369,7 +369,7 @@ function Participants() {
                       <MenuItem key={participant.id} value={participant.id}>
                         <Box sx={{ display: 'flex', alignItems: 'center' }}>
                           <Avatar 
-                            src={`http://localhost:8000${participant.avatar_path}`} 
+                            src={`http://localhost:8000${participant.avatar_thumbnail_path || participant.avatar_path}`} 
                             alt={participant.name}
                             sx={{ width: 24, height: 24, mr: 1 }}
                           />
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import Typography from '@mui/material/Typography';
 import Grid from '@mui/material/Grid';
@@ -31,7 +31,7 @@ import {
   removeParticipantFromProject,
   createParticipant,
   generateChatLink, 
-  getChatLink, 
+  chatEventsUrl, 
   generateSummary, 
   getSummary 
 } from '../services/api';
@@ -50,6 +50,7 @@ function ProjectDetail({ setCurrentProject }) {
   const [snackbarOpen, setSnackbarOpen] = useState(false);
   const [snackbarMessage, setSnackbarMessage] = useState('');
   const [snackbarSeverity, setSnackbarSeverity] = useState('success');
+  const chatEventsRef = useRef(null);
 
   const loadProject = useCallback(async () => {
     setLoading(true);
@@ -93,6 +94,45 @@ function ProjectDetail({ setCurrentProject }) {
     }
   }, [projectId, loadProject]);
 
+  const closeChatEvents = () => {
+    if (chatEventsRef.current) {
+      chatEventsRef.current.close();
+      chatEventsRef.current = null;
+    }
+  };
+
+  useEffect(() => closeChatEvents, []);
+
+  // The server pushes the link the moment the share tunnel is up
+  const listenForChatLink = () => {
+    closeChatEvents();
+    const source = new EventSource(chatEventsUrl(projectId));
+    chatEventsRef.current = source;
+    source.addEventListener('url_ready', (event) => {
+      const data = JSON.parse(event.data);
+      console.log('[ProjectDetail.js] Chat link ready:', data.link);
+      closeChatEvents();
+      setChatLink(data.link);
+      setOpenLinkDialog(true);
+      setSnackbarMessage('Chat link generated successfully!');
+      setSnackbarSeverity('success');
+      setSnackbarOpen(true);
+    });
+    const handleFailure = (event) => {
+      const data = JSON.parse(event.data);
+      closeChatEvents();
+      setSnackbarMessage(data.message);
+      setSnackbarSeverity('error');
+      setSnackbarOpen(true);
+    };
+    source.addEventListener('error', (event) => {
+      // Connection errors carry no data; EventSource reconnects by itself
+      if (event.data) handleFailure(event);
+    });
+    source.addEventListener('stopped', handleFailure);
+    source.addEventListener('other_project', handleFailure);
+  };
+
   const handleGenerateChatLink = async () => {
     try {
       console.log('[ProjectDetail.js] Generating chat link for participants:', participants);
@@ -103,11 +143,11 @@ function ProjectDetail({ setCurrentProject }) {
       }));
       
       const response = await generateChatLink(projectId, participantsForChat);
-      console.log('[ProjectDetail.js] Chat link generated successfully:', response.data);
-      setChatLink(response.data.chat_link);
-      setSnackbarMessage('Chat link generated successfully!');
-      setSnackbarSeverity('success');
+      console.log('[ProjectDetail.js] Chat link requested:', response.data);
+      setSnackbarMessage('Starting the chat interface...');
+      setSnackbarSeverity('info');
       setSnackbarOpen(true);
+      listenForChatLink();
     } catch (error) {
       console.error('[ProjectDetail.js] Error generating chat link:', error);
       setSnackbarMessage('Error generating chat link. Please try again.');
@@ -96,7 +96,7 @@ function Responses() {
               // If it's a chat response, fetch the full content and overwrite original_response
               if (resp.chat_response_file_path) {
                 try {
-                  const fileResponse = await fetch(`http://localhost:8000/static/${resp.chat_response_file_path}`);
+                  const fileResponse = await fetch(`http://localhost:8000/responses/${resp.id}/transcript`);
                   if (fileResponse.ok) {
                     const markdownContent = await fileResponse.text();
                     // Return the response with original_response updated, but keep other fields like refined_response
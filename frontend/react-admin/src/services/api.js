@@ -20,14 +20,19 @@ export const deleteProject = (id) => api.delete(`/projects/${id}/`);
 export const getProjectParticipants = (projectId) => api.get(`/projects/${projectId}/participants/`);
 export const addParticipantToProject = (projectId, participantId) => api.post(`/projects/${projectId}/participants/`, { participant_id: participantId });
 export const removeParticipantFromProject = (projectId, participantId) => api.delete(`/projects/${projectId}/participants/${participantId}/`);
+// Bulk membership changes in one request; the response lists an outcome per participant id
+export const bulkAddParticipantsToProject = (projectId, participantIds) => api.post(`/projects/${projectId}/participants/bulk`, { participant_ids: participantIds });
+export const bulkRemoveParticipantsFromProject = (projectId, participantIds) => api.post(`/projects/${projectId}/participants/bulk-remove`, { participant_ids: participantIds });
 
 // Global Participants API
 export const getAllParticipants = () => api.get('/participants/');
 export const getParticipant = (participantId) => api.get(`/participants/${participantId}/`);
 export const createParticipant = (participantData) => api.post('/participants/', participantData);
 // participantData should be an object like { name: "John Doe", avatar_filename: "optional_avatar.jpg" }
+export const bulkCreateParticipants = (participants) => api.post('/participants/bulk', { participants });
 export const updateParticipant = (participantId, participant) => api.put(`/participants/${participantId}/`, participant);
 export const deleteParticipant = (participantId) => api.delete(`/participants/${participantId}/`);
+export const getAvatarCatalog = (offset = 0, limit = 50) => api.get('/participants/avatars/catalog', { params: { offset, limit } });
 export const uploadAvatar = (formData) => api.post('/participants/avatars/', formData, {
   headers: {
     'Content-Type': 'multipart/form-data',
@@ -47,12 +52,21 @@ export const generateChatLink = (projectId, participants) => api.post('/chat/gen
   participants 
 });
 export const getChatLink = (projectId) => api.get(`/chat/status?projectId=${projectId}`);
+// Server-sent events: starting, url_ready, error, stopped (open with EventSource)
+export const chatEventsUrl = (projectId) => `${API_URL}/chat/events?projectId=${projectId}`;
 
 // Summary API (project-based)
 export const generateSummary = (projectId) => api.post(`/projects/${projectId}/summary/`);
 export const getSummary = (projectId) => api.get(`/projects/${projectId}/summary/`);
 export const updateSummary = (projectId, summaryData) => api.put(`/projects/${projectId}/summary/`, summaryData);
 
+// Media
+export const getParticipantVideo = (projectId, participantId) => api.get(`/media/projects/${projectId}/participants/${participantId}/video`);
+export const renderParticipantVideo = (projectId, participantId, options = {}) => api.post(`/media/projects/${projectId}/participants/${participantId}/video`, options);
+export const getMeetingReel = (projectId) => api.get(`/media/projects/${projectId}/reel`);
+export const buildMeetingReel = (projectId, options = {}) => api.post(`/media/projects/${projectId}/reel`, options);
+export const mediaUrl = (path) => (path ? `${API_URL}${path}` : undefined);
+
 // Topics
 export const generateTopics = (projectId) => api.post(`/projects/${projectId}/topics`);
 export const getResponsesForTopic = (projectId, topic) => api.post(`/projects/${projectId}/topic_responses`, { topic });
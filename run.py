@@ -7,7 +7,10 @@ The application consists of two main components:
 1. FastAPI backend server - Handles data storage, processing, and video generation
 2. Gradio chat interface - Collects responses from participants
 
-Both components should be run separately for stability.
+With BACKGROUND_JOBS=worker, refinement, speech and video jobs run in one or
+more background workers instead of the backend server.
+
+All components should be run separately for stability.
 """
 
 import os
@@ -33,7 +36,10 @@ def print_instructions():
     print("   - Run with: python run_chat.py")
     print("   - Access at: http://localhost:7860")
     print("   - Will generate a shareable link for external participants")
-    print("\nTo run both components, open two terminal windows and run each command separately.")
+    print("\n3. Background Job Worker (with BACKGROUND_JOBS=worker)")
+    print("   - Runs refinement, speech and video jobs outside the backend server")
+    print("   - Run with: python -m backend.worker (start as many as the machine allows)")
+    print("\nTo run the components, open a terminal window for each and run each command separately.")
     print("\nMake sure to activate the virtual environment first:")
     print("source venv/bin/activate")
     print("\n" + "=" * 80)
@@ -58,10 +64,11 @@ if __name__ == "__main__":
     print("\nWhat would you like to run?")
     print("1. FastAPI Backend Server")
     print("2. Gradio Chat Interface")
-    print("3. Both (in separate processes)")
-    print("4. Exit")
+    print("3. Background Job Worker")
+    print("4. All (in separate processes)")
+    print("5. Exit")
     
-    choice = input("\nEnter your choice (1-4): ")
+    choice = input("\nEnter your choice (1-5): ")
     
     if choice == "1":
         # Run FastAPI backend server
@@ -72,24 +79,39 @@ if __name__ == "__main__":
         print("\nStarting Gradio Chat Interface...")
         subprocess.run([sys.executable, "run_chat.py"])
     elif choice == "3":
-        # Run both components in separate processes
-        print("\nStarting both components in separate processes...")
+        # Run a background job worker
+        if os.getenv("BACKGROUND_JOBS") != "worker":
+            print("\nWARNING: BACKGROUND_JOBS is not 'worker'; the backend server will not queue jobs for this worker")
+        print("\nStarting Background Job Worker...")
+        subprocess.run([sys.executable, "-m", "backend.worker"])
+    elif choice == "4":
+        # Run all components in separate processes
+        print("\nStarting all components in separate processes...")
         print("Press Ctrl+C to stop all processes")
         
         # Start FastAPI backend server in a separate process
-        backend_process = subprocess.Popen([sys.executable, "-m", "backend.main"])
+        processes = [subprocess.Popen([sys.executable, "-m", "backend.main"])]
         
         # Start Gradio chat interface in a separate process
-        chat_process = subprocess.Popen([sys.executable, "run_chat.py"])
+        processes.append(subprocess.Popen([sys.executable, "run_chat.py"]))
+        
+        # Start the background job workers when heavy work is moved out of the backend
+        if os.getenv("BACKGROUND_JOBS") == "worker":
+            for _ in range(int(os.getenv("WORKER_PROCESSES", "1"))):
+                processes.append(subprocess.Popen([sys.executable, "-m", "backend.worker"]))
         
         try:
-            # Wait for both processes to complete (or be interrupted)
-            backend_process.wait()
-            chat_process.wait()
+            # Wait for all processes to complete (or be interrupted)
+            for process in processes:
+                process.wait()
         except KeyboardInterrupt:
             print("\nStopping all processes...")
-            backend_process.terminate()
-            chat_process.terminate()
+            # Ctrl+C already sent the children SIGINT; SIGTERM reaches any that missed it.
+            # Workers take either as the request to finish or hand back their jobs.
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
     else:
         print("\nExiting...")
         sys.exit(0)
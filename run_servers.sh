@@ -8,6 +8,16 @@ echo "Starting backend server on http://localhost:8000..."
 python backend/main.py &
 BACKEND_PID=$!
 
+# Start background job workers when heavy work is moved out of the backend
+WORKER_PIDS=""
+if [ "${BACKGROUND_JOBS:-inline}" = "worker" ]; then
+    for i in $(seq 1 "${WORKER_PROCESSES:-1}"); do
+        echo "Starting background job worker $i..."
+        python -m backend.worker &
+        WORKER_PIDS="$WORKER_PIDS $!"
+    done
+fi
+
 # Wait a moment for the backend to initialize
 sleep 3
 
@@ -15,5 +25,7 @@ sleep 3
 echo "Starting Gradio interface on http://localhost:8081..."
 python run_chat.py --port 8081
 
-# If the Gradio interface exits, also kill the backend
-kill $BACKEND_PID
+# If the Gradio interface exits, also kill the backend and the workers
+# (SIGTERM: workers finish or hand back their running jobs, then exit)
+kill $BACKEND_PID $WORKER_PIDS
+wait $WORKER_PIDS
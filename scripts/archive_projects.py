@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Archive transcripts and summaries of closed projects.
+
+A project is considered closed when it has had no responses or chat turns for
+--idle-days days. Each project's transcripts and summary are packed into one
+compressed, indexed archive under backend/data/archives and removed from the
+hot directories; the API keeps serving them from the archive.
+
+Usage:
+    python scripts/archive_projects.py --idle-days 90
+    python scripts/archive_projects.py --project-id 3
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.database.database import SessionLocal
+from backend.services.archive_service import archive_project, find_closed_projects
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack closed projects' transcripts and summaries into archives")
+    parser.add_argument("--idle-days", type=int, default=90, help="Days without activity after which a project is closed")
+    parser.add_argument("--project-id", type=int, action="append", help="Archive this project regardless of activity (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the projects that would be archived")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        project_ids = args.project_id or find_closed_projects(db, args.idle_days)
+        if not project_ids:
+            print("No projects to archive.")
+            sys.exit(0)
+
+        for project_id in project_ids:
+            if args.dry_run:
+                print(f"Would archive project {project_id}")
+                continue
+            result = archive_project(db, project_id)
+            print(f"Archived project {project_id}: {result['transcripts']} transcripts, summary: {'yes' if result['summary'] else 'no'}")
+    finally:
+        db.close()
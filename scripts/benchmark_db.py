@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the SQLite engine profile.
+
+Runs writer threads (response inserts, one commit each) and reader threads
+(latest page of a project's responses) against a throw-away database, once with
+SQLAlchemy's default engine and once with the production profile from
+backend/database/config.py, and prints throughput and lock errors for both.
+
+Usage:
+    python scripts/benchmark_db.py --writers 4 --readers 8 --seconds 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.config import engine_options, configure_engine
+from backend.database.models import Base, Participant, Project, Response
+
+
+def build_engine(url: str, tuned: bool):
+    if tuned:
+        return configure_engine(create_engine(url, **engine_options(url)))
+    return create_engine(url)
+
+
+def seed(Session, projects: int, participants: int):
+    db = Session()
+    try:
+        for p in range(projects):
+            db.add(Project(name=f"Benchmark project {p}"))
+        for i in range(participants):
+            db.add(Participant(name=f"Benchmark participant {i}"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_workload(url: str, tuned: bool, writers: int, readers: int, seconds: float, projects: int = 5):
+    engine = build_engine(url, tuned)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(Session, projects, participants=20)
+
+    stop = threading.Event()
+    counters = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counters[key] += 1
+
+    def writer(worker_id: int):
+        n = 0
+        while not stop.is_set():
+            db = Session()
+            try:
+                db.add(Response(
+                    participant_id=(n % 20) + 1,
+                    project_id=(n % projects) + 1,
+                    question="How was the sprint?",
+                    original_response=f"Answer {worker_id}-{n} " + "lorem ipsum " * 20,
+                ))
+                db.commit()
+                bump("writes")
+            except OperationalError:
+                db.rollback()
+                bump("write_errors")
+            finally:
+                db.close()
+            n += 1
+
+    def reader(worker_id: int):
+        n = 0
+        while not stop.is_set():
+            db = Session()
+            try:
+                # Fixed-size page so read cost does not grow with the write rate
+                db.query(Response).filter(
+                    Response.project_id == (n % projects) + 1
+                ).order_by(Response.id.desc()).limit(50).all()
+                bump("reads")
+            except OperationalError:
+                bump("read_errors")
+            finally:
+                db.close()
+            n += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    with engine.connect() as conn:
+        journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    engine.dispose()
+
+    return {
+        "journal_mode": journal_mode,
+        "writes_per_sec": counters["writes"] / seconds,
+        "reads_per_sec": counters["reads"] / seconds,
+        "write_errors": counters["write_errors"],
+        "read_errors": counters["read_errors"],
+    }
+
+
+def print_result(label: str, result: dict):
+    print(f"\n{label}")
+    print(f"  journal_mode : {result['journal_mode']}")
+    print(f"  writes/sec   : {result['writes_per_sec']:.1f} ({result['write_errors']} lock errors)")
+    print(f"  reads/sec    : {result['reads_per_sec']:.1f} ({result['read_errors']} lock errors)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SQLite read/write throughput before and after tuning")
+    parser.add_argument("--writers", type=int, default=4, help="Number of writer threads")
+    parser.add_argument("--readers", type=int, default=8, help="Number of reader threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    args = parser.parse_args()
+
+    print(f"Benchmarking with {args.writers} writers and {args.readers} readers for {args.seconds:.0f}s per run...")
+
+    results = {}
+    for label, tuned in (("Default engine", False), ("Production profile", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'benchmark.db')}"
+            results[label] = run_workload(url, tuned, args.writers, args.readers, args.seconds)
+        print_result(label, results[label])
+
+    before, after = results["Default engine"], results["Production profile"]
+    if before["writes_per_sec"] and before["reads_per_sec"]:
+        print(f"\nWrite speed-up: {after['writes_per_sec'] / before['writes_per_sec']:.2f}x")
+        print(f"Read speed-up : {after['reads_per_sec'] / before['reads_per_sec']:.2f}x")
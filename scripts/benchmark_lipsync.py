@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the viseme-sprite lip-sync renderer.
+
+Renders a speech track onto an avatar and reports how many seconds of video
+are produced per CPU-second, for the audio analysis, the frame composition
+and the encode (ffmpeg's CPU time is counted through RUSAGE_CHILDREN). A
+ratio above 1 means one core renders faster than real time.
+
+Without --audio a speech-like synthetic track is used; without --avatar, the
+first uploaded avatar or a generated placeholder face.
+
+Usage:
+    python scripts/benchmark_lipsync.py --seconds 60
+    python scripts/benchmark_lipsync.py --avatar face.png --audio speech.wav --no-encode
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import cv2
+import numpy as np
+
+from backend.services.media_tools import PCM_SAMPLE_RATE, MediaToolError, pcm_to_wav
+from backend.services.video_encoder import VIDEO_FPS, VIDEO_SIZE, FFmpegVideoWriter, fit_image
+from backend.services.viseme_renderer import (
+    VISEMES, default_mouth_box, load_samples, viseme_frames, viseme_timeline,
+)
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process and its finished children (ffmpeg)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def synthetic_speech(seconds: float, seed: int = 7) -> bytes:
+    """Syllable-rate voiced bursts, fricative noise and sentence pauses, as PCM WAV bytes"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * PCM_SAMPLE_RATE)) / PCM_SAMPLE_RATE
+    pitch = 120 + 15 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / PCM_SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 0.7
+    fricative = rng.standard_normal(len(t)) * (np.sin(2 * np.pi * 1.3 * t) > 0.93)
+    pauses = (t % 4.0) > 3.6
+    signal = (0.5 * voiced * envelope + 0.15 * fricative) * ~pauses
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes()
+    return pcm_to_wav(pcm)
+
+
+def placeholder_avatar(size: int) -> np.ndarray:
+    image = np.full((size, size, 3), (200, 170, 120), np.uint8)
+    cv2.circle(image, (size // 2, size // 2), int(size * 0.36), (150, 180, 225), -1)
+    for x in (0.4, 0.6):
+        cv2.circle(image, (int(size * x), int(size * 0.42)), max(2, size // 30), (40, 40, 40), -1)
+    return image
+
+
+def default_avatar() -> str:
+    avatar_dir = Path(__file__).parent.parent / "frontend" / "static" / "avatars"
+    for path in sorted(avatar_dir.glob("*")):
+        if path.suffix.lower() in (".png", ".jpg", ".jpeg", ".webp"):
+            return str(path)
+    return ""
+
+
+def main(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="lipsync-bench-")
+    audio_path = args.audio
+    if not audio_path:
+        audio_path = os.path.join(workdir, "speech.wav")
+        with open(audio_path, "wb") as f:
+            f.write(synthetic_speech(args.seconds))
+
+    avatar_path = args.avatar or default_avatar()
+    image = cv2.imread(avatar_path, cv2.IMREAD_UNCHANGED) if avatar_path else None
+    if image is None:
+        avatar_path, image = "(generated)", placeholder_avatar(args.size)
+    base = fit_image(image, args.size, args.size)
+
+    start_cpu, start_wall = cpu_seconds(), time.perf_counter()
+    samples, rate = load_samples(audio_path)
+    timeline = viseme_timeline(samples, rate, args.fps)
+    analysis_cpu = cpu_seconds() - start_cpu
+    video_seconds = len(timeline) / args.fps
+
+    frames = viseme_frames(base, default_mouth_box(args.size, args.size), timeline)
+    if args.no_encode:
+        checksum = 0
+        for frame in frames:
+            checksum += int(frame[0, 0, 0])  # touch every frame so nothing is skipped
+    else:
+        output_path = args.output or os.path.join(workdir, "render.mp4")
+        try:
+            with FFmpegVideoWriter(output_path, args.size, args.size, args.fps, audio_path=audio_path) as writer:
+                for frame in frames:
+                    writer.write(frame)
+        except MediaToolError as e:
+            sys.exit(f"Encoding failed ({e}); rerun with --no-encode to measure composition only")
+    total_cpu = cpu_seconds() - start_cpu
+    wall = time.perf_counter() - start_wall
+
+    counts = np.bincount(timeline, minlength=len(VISEMES))
+    print(f"Avatar: {avatar_path}")
+    print(f"Audio: {audio_path} ({video_seconds:.1f}s, {len(timeline)} frames at {args.fps} fps, {args.size}x{args.size})")
+    print("Visemes: " + ", ".join(f"{name} {count}" for name, count in zip(VISEMES, counts)))
+    print(f"Analysis CPU: {analysis_cpu:.3f}s")
+    print(f"Total CPU:    {total_cpu:.3f}s ({'composition only' if args.no_encode else 'including ffmpeg'})")
+    print(f"Wall time:    {wall:.3f}s")
+    print(f"Video seconds per CPU-second: {video_seconds / max(total_cpu, 1e-9):.1f}")
+    if not args.no_encode:
+        print(f"Output: {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the viseme lip-sync renderer in video seconds per CPU-second")
+    parser.add_argument("--avatar", help="Avatar image (default: first uploaded avatar, else a placeholder)")
+    parser.add_argument("--audio", help="16-bit WAV speech track (default: synthetic speech)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic track")
+    parser.add_argument("--size", type=int, default=VIDEO_SIZE, help="Square output size in pixels")
+    parser.add_argument("--fps", type=int, default=VIDEO_FPS, help="Output frame rate")
+    parser.add_argument("--output", help="Where to write the MP4 (default: a temporary directory)")
+    parser.add_argument("--no-encode", action="store_true", help="Skip ffmpeg and measure analysis and composition only")
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Batch-size benchmark for the neural lip-sync engine on CPU.
+
+Runs the TorchScript model from --checkpoint (or LIPSYNC_CHECKPOINT) over the
+mel windows of a speech track at each batch size and prints frames per
+second, for inference alone and including pasting the predicted faces onto
+the avatar frame. Encoding is left out; see benchmark_lipsync.py for that.
+
+Usage:
+    python scripts/benchmark_neural_lipsync.py --checkpoint wav2lip.pt --batch-sizes 1,4,8,16,32
+    python scripts/benchmark_neural_lipsync.py --checkpoint wav2lip.pt --threads 4 --frames 500
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import cv2
+import numpy as np
+
+from backend.services.face_analysis import analyze_face, square_box
+from backend.services.media_tools import PCM_SAMPLE_RATE
+from backend.services.neural_lipsync import (
+    LIPSYNC_CHECKPOINT, FacePaster, LipSyncEngine, LipSyncUnavailable,
+    lipsync_threads, load_model, mel_spectrogram, mel_windows,
+)
+from backend.services.video_encoder import VIDEO_FPS, VIDEO_SIZE, fit_image
+from backend.services.viseme_renderer import load_samples
+
+
+def synthetic_samples(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * PCM_SAMPLE_RATE)) / PCM_SAMPLE_RATE
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None)
+    return (0.4 * np.sin(2 * np.pi * 140 * t) * envelope).astype(np.float32)
+
+
+def run(engine: LipSyncEngine, windows: np.ndarray, paster=None) -> float:
+    """Frames per second over all windows"""
+    start = time.perf_counter()
+    for faces in engine.run(windows):
+        if paster is not None:
+            paster.paste(faces)
+    return len(windows) / (time.perf_counter() - start)
+
+
+def main(args) -> None:
+    try:
+        model = load_model(args.checkpoint)
+    except LipSyncUnavailable as e:
+        sys.exit(str(e))
+
+    if args.audio:
+        samples, rate = load_samples(args.audio)
+    else:
+        samples, rate = synthetic_samples(args.frames / args.fps + 1), PCM_SAMPLE_RATE
+    windows = mel_windows(mel_spectrogram(samples, rate), args.fps, args.frames)
+
+    image = cv2.imread(args.avatar, cv2.IMREAD_COLOR) if args.avatar else None
+    if image is None:
+        image = np.full((args.size, args.size, 3), (150, 180, 225), np.uint8)
+    base = fit_image(image, args.size, args.size)
+    face = analyze_face(base)
+    x, y, side, _ = square_box(face["geometry"][1])
+    x, y = min(max(x, 0), args.size - side), min(max(y, 0), args.size - side)
+
+    threads = args.threads or lipsync_threads()
+    print(f"{len(windows)} frames, {threads} intra-op threads, {args.size}x{args.size} output")
+    print(f"{'batch':>6} {'inference fps':>14} {'with paste fps':>15} {'ms/frame':>9}")
+    for batch_size in args.batch_sizes:
+        engine = LipSyncEngine(model, batch_size=batch_size, threads=threads)
+        engine.set_face(face["face_patch"])
+        run(engine, windows[:batch_size])  # warm-up: first calls pay for graph optimisation
+        inference = run(engine, windows)
+        pasted = run(engine, windows, FacePaster(base, (x, y, side, side), batch_size))
+        print(f"{batch_size:>6} {inference:>14.1f} {pasted:>15.1f} {1000 / pasted:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark neural lip-sync inference by batch size")
+    parser.add_argument("--checkpoint", default=LIPSYNC_CHECKPOINT, help="TorchScript model (default: LIPSYNC_CHECKPOINT)")
+    parser.add_argument("--batch-sizes", type=lambda s: [int(v) for v in s.split(",")], default=[1, 4, 8, 16, 32])
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: LIPSYNC_THREADS, or cores / render slots)")
+    parser.add_argument("--frames", type=int, default=250, help="Frames per run")
+    parser.add_argument("--fps", type=int, default=VIDEO_FPS)
+    parser.add_argument("--size", type=int, default=VIDEO_SIZE, help="Square output size in pixels")
+    parser.add_argument("--avatar", help="Avatar image (default: a flat placeholder)")
+    parser.add_argument("--audio", help="16-bit WAV speech track (default: synthetic)")
+    main(parser.parse_args())